@@ -0,0 +1,296 @@
+"""
+Columnar archive of historical packets for analytics.
+
+Complete UTC days of `packets` are sealed into per-day segments: one typed
+NumPy array per column (.npy, memory-mapped on read) plus a small meta.json
+holding the row count, devices and min/max of time, latitude and longitude.
+Queries use that index to skip segments that cannot match, then scan the
+surviving columns as memory maps, so analytical passes over months of data
+run on contiguous arrays instead of SQLite rows and Python dicts.
+
+Segments are written to a temporary directory and renamed into place, so a
+reader never sees a half-written segment. Re-sealing a day writes a new
+directory (<day>-<sealed at>) rather than replacing files that open memory
+maps may still hold (Windows refuses to delete those); the superseded one is
+removed once possible, and on load only the newest seal of each day counts.
+Sealing happens before retention deletes raw rows, and retention only deletes
+rows a completed sealing pass has covered (retention_bound); sealed segments
+are kept after that.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db import connection
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_SEAL_DELAY_DAYS = float(os.getenv("ARCHIVE_SEAL_DELAY_DAYS", "1"))  # grace for store-and-forward backfill
+
+# column -> (SQL expression, dtype); NULLs become NaN in the float columns (integral
+# satellites/rssi fit float32 exactly)
+COLUMNS = {
+    "id": ("id", np.int64),
+    "timestamp": ("timestamp", "datetime64[us]"),
+    "latitude": ("latitude", np.float64),
+    "longitude": ("longitude", np.float64),
+    "altitude": ("altitude", np.float64),
+    "speed": ("speed", np.float64),
+    "satellites": ("satellites", np.float32),
+    "battery": ("battery", np.float64),
+    "rssi": ("rssi", np.float32),
+    "device": ("device_id", None),  # int32 codes into meta["devices"]
+}
+
+
+def _to_array(values, dtype):
+    if dtype == "datetime64[us]":
+        return np.array(values, dtype=dtype)
+    if np.issubdtype(np.dtype(dtype), np.floating):
+        return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    return np.array(values, dtype=dtype)
+
+
+class Segment:
+    """One sealed day; column arrays are memory-mapped on first access"""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self._columns = {}
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def release(self):
+        """Drop cached memory maps (readers still holding arrays keep theirs open)"""
+        self._columns = {}
+
+    def column(self, name):
+        array = self._columns.get(name)
+        if array is None:
+            array = self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return array
+
+    def overlaps(self, since=None, until=None, bbox=None, device_id=None):
+        m = self.meta
+        if since is not None and m["max_timestamp"] < since:
+            return False
+        if until is not None and m["min_timestamp"] >= until:
+            return False
+        if bbox is not None and m["rows"]:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            if (m["max_latitude"] is None or m["max_latitude"] < min_lat or m["min_latitude"] > max_lat
+                    or m["max_longitude"] < min_lon or m["min_longitude"] > max_lon):
+                return False
+        if device_id is not None and device_id not in m["devices"]:
+            return False
+        return True
+
+    def mask(self, since=None, until=None, bbox=None, device_id=None):
+        """Boolean row mask for the filters, or None when every row matches"""
+        mask = None
+
+        def both(m):
+            return m if mask is None else mask & m
+
+        if since is not None and self.meta["min_timestamp"] < since:
+            mask = both(self.column("timestamp") >= np.datetime64(since))
+        if until is not None and self.meta["max_timestamp"] >= until:
+            mask = both(self.column("timestamp") < np.datetime64(until))
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            lat, lon = self.column("latitude"), self.column("longitude")
+            mask = both((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon))
+        if device_id is not None:
+            mask = both(self.column("device") == self.meta["devices"].index(device_id))
+        return mask
+
+
+class Archive:
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._segments = {}  # day -> Segment
+        self._lock = threading.Lock()
+        # Set by the last complete seal_pending: every row stored up to sealed_max_id
+        # with a timestamp before sealed_before is in a segment
+        self.sealed_before = None
+        self.sealed_max_id = None
+        self.load()
+
+    def load(self):
+        segments, stale = {}, []
+        if os.path.isdir(self.root):
+            for name in sorted(os.listdir(self.root)):
+                path = os.path.join(self.root, name)
+                meta_path = os.path.join(path, "meta.json")
+                if name.startswith(".") or not os.path.isfile(meta_path):
+                    continue  # unfinished temporary directory
+                with open(meta_path) as f:
+                    segment = Segment(path, json.load(f))
+                current = segments.get(segment.meta["day"])
+                if current is not None and current.meta["sealed_at"] > segment.meta["sealed_at"]:
+                    segment, current = current, segment
+                if current is not None:
+                    stale.append(current.path)
+                segments[segment.meta["day"]] = segment
+        with self._lock:
+            self._segments = segments
+        for path in stale:
+            shutil.rmtree(path, ignore_errors=True)  # superseded seals left by an earlier run
+
+    def segments(self, since=None, until=None, bbox=None, device_id=None):
+        """Sealed segments that may hold matching rows, oldest first"""
+        with self._lock:
+            segments = list(self._segments.values())
+        return [s for s in sorted(segments, key=lambda s: s.meta["day"])
+                if s.overlaps(since, until, bbox, device_id)]
+
+    # ---------- sealing ----------
+    def seal_day(self, day):
+        """Write one day of packets as a segment (replacing an older seal); returns rows"""
+        start = datetime.fromisoformat(day)
+        since, until = start.isoformat(), (start + timedelta(days=1)).isoformat()
+        select = ", ".join(sql for sql, _ in COLUMNS.values())
+        with connection() as conn:
+            rows = conn.execute(f"SELECT {select} FROM packets WHERE timestamp >= ? AND timestamp < ? "
+                                "ORDER BY timestamp, id", (since, until)).fetchall()
+        if not rows:
+            return 0
+        values = list(zip(*rows))
+        devices = sorted({d for d in values[-1] if d is not None})
+        codes = {d: i for i, d in enumerate(devices)}
+        devices.append(None)  # code for packets without a device id
+        arrays = {}
+        for (name, (_, dtype)), column in zip(COLUMNS.items(), values):
+            if name == "device":
+                arrays[name] = np.array([codes.get(d, len(devices) - 1) for d in column], dtype=np.int32)
+            else:
+                arrays[name] = _to_array(column, dtype)
+
+        lat, lon = arrays["latitude"], arrays["longitude"]
+        has_position = bool(np.isfinite(lat).any())
+        meta = {
+            "day": day,
+            "rows": len(rows),
+            "min_id": int(arrays["id"].min()),
+            "max_id": int(arrays["id"].max()),
+            "min_timestamp": rows[0][1],
+            "max_timestamp": rows[-1][1],
+            "min_latitude": float(np.nanmin(lat)) if has_position else None,
+            "max_latitude": float(np.nanmax(lat)) if has_position else None,
+            "min_longitude": float(np.nanmin(lon)) if has_position else None,
+            "max_longitude": float(np.nanmax(lon)) if has_position else None,
+            "devices": devices,
+            "sealed_at": datetime.utcnow().isoformat()
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{day}-{datetime.fromisoformat(meta['sealed_at']):%Y%m%dT%H%M%S%f}"
+        final = os.path.join(self.root, name)
+        tmp = os.path.join(self.root, f".{name}.{os.getpid()}.tmp")
+        os.makedirs(tmp)
+        for column, array in arrays.items():
+            np.save(os.path.join(tmp, f"{column}.npy"), array)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp, final)
+        with self._lock:
+            old = self._segments.get(day)
+            self._segments[day] = Segment(final, meta)
+        if old is not None:
+            old.release()
+            # Fails while a reader still maps its files (Windows); load() retries later
+            shutil.rmtree(old.path, ignore_errors=True)
+        return len(rows)
+
+    def seal_pending(self, now=None):
+        """Seal complete days older than the grace period that are new or gained rows; returns days sealed.
+
+        The first pass counts every day. Later passes only count the days that
+        became complete since and the days of rows stored since (late backfill).
+        """
+        now = now or datetime.utcnow()
+        cutoff = (now - timedelta(days=ARCHIVE_SEAL_DELAY_DAYS)).date().isoformat()
+        with connection() as conn:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM packets").fetchone()[0]
+            if self.sealed_max_id is None:
+                counts = conn.execute("SELECT substr(timestamp, 1, 10) AS day, COUNT(*) FROM packets "
+                                      "WHERE timestamp < ? GROUP BY day", (cutoff,)).fetchall()
+            else:
+                days = conn.execute("SELECT substr(timestamp, 1, 10) FROM packets "
+                                    "WHERE id > ? AND timestamp < ? "
+                                    "UNION SELECT substr(timestamp, 1, 10) FROM packets "
+                                    "WHERE timestamp >= ? AND timestamp < ?",
+                                    (self.sealed_max_id, cutoff, self.sealed_before, cutoff)).fetchall()
+                counts = [(day, self._count_day(conn, day)) for (day,) in days]
+        sealed = []
+        for day, count in counts:
+            segment = self._segments.get(day)
+            # Fewer rows than sealed means retention has started deleting that day: keep the seal
+            if segment is None or count > segment.meta["rows"]:
+                self.seal_day(day)
+                sealed.append(day)
+        # Only a pass that sealed every day moves the bound retention deletes up to
+        self.sealed_before, self.sealed_max_id = cutoff, max_id
+        return sealed
+
+    @staticmethod
+    def _count_day(conn, day):
+        until = (datetime.fromisoformat(day) + timedelta(days=1)).isoformat()
+        return conn.execute("SELECT COUNT(*) FROM packets WHERE timestamp >= ? AND timestamp < ?",
+                            (day, until)).fetchone()[0]
+
+    def retention_bound(self):
+        """(timestamp cutoff, max id) of the raw rows known to be sealed, or None before any pass"""
+        if self.sealed_max_id is None:
+            return None
+        return self.sealed_before, self.sealed_max_id
+
+    # ---------- queries ----------
+    def scan(self, since=None, until=None, bbox=None, device_id=None, columns=None):
+        """Yield (segment, {column: array}) for matching rows, one segment at a time.
+
+        Segments fully inside the filters yield their memory maps as-is (zero
+        copy); partially matching ones yield the filtered rows.
+        """
+        columns = list(columns or COLUMNS)
+        for segment in self.segments(since, until, bbox, device_id):
+            mask = segment.mask(since, until, bbox, device_id)
+            if mask is not None and not mask.any():
+                continue
+            yield segment, {c: segment.column(c) if mask is None else segment.column(c)[mask] for c in columns}
+
+    def query(self, since=None, until=None, bbox=None, device_id=None, columns=None):
+        """Matching rows as one array per column (concatenated across segments)"""
+        columns = list(columns or COLUMNS)
+        parts = {c: [] for c in columns}
+        device_tables = []
+        for segment, arrays in self.scan(since, until, bbox, device_id, columns):
+            for c in columns:
+                parts[c].append(arrays[c])
+            device_tables.append(np.array(segment.meta["devices"], dtype=object))
+        result = {}
+        for c in columns:
+            if c == "device":
+                # Segment-local codes -> device id strings
+                names = [table[codes] for table, codes in zip(device_tables, parts[c])]
+                result[c] = np.concatenate(names) if names else np.empty(0, dtype=object)
+            elif parts[c]:
+                result[c] = np.concatenate(parts[c])
+            else:
+                result[c] = np.empty(0, dtype=COLUMNS[c][1])
+        return result
+
+    def stats(self):
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "rows": sum(len(s) for s in segments),
+            "bytes": sum(os.path.getsize(os.path.join(s.path, f)) for s in segments for f in os.listdir(s.path)),
+            "first_day": segments[0].meta["day"] if segments else None,
+            "last_day": segments[-1].meta["day"] if segments else None
+        }
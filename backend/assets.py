@@ -0,0 +1,118 @@
+"""
+Cached, pre-compressed serving of the frontend files.
+
+Every file is read (and, for templated files such as index.html, rendered)
+once, then kept in memory with gzip/brotli variants and a strong ETag. An
+asset is rebuilt only when its file mtime/size or its render key (e.g. the
+Google Maps API key) changes. Clients revalidate with If-None-Match and get a
+304 when nothing changed.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # brotli is optional; gzip is always available
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 512  # bytes; smaller bodies are not worth compressing
+
+
+class Asset:
+    __slots__ = ("key", "mimetype", "bodies", "etag")
+
+    def __init__(self, key, mimetype, body):
+        self.key = key
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.bodies["gzip"] = gz
+            if brotli is not None:
+                br = brotli.compress(body)
+                if len(br) < len(body):
+                    self.bodies["br"] = br
+
+    def tag(self, encoding):
+        # Strong ETags must differ between encodings of the same resource
+        return self.etag if encoding == "identity" else f"{self.etag}-{encoding}"
+
+
+class AssetCache:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._assets = {}
+        self._templates = {}  # name -> (render, render_key)
+        self._lock = threading.Lock()
+
+    def register_template(self, name, render, render_key):
+        """Serve `name` as render(text); re-render whenever render_key() changes"""
+        self._templates[name] = (render, render_key)
+
+    def get(self, name):
+        """Return the cached Asset for `name`, rebuilding it if the file changed"""
+        render, render_key = self._templates.get(name, (None, None))
+        if render_key is not None:
+            render_key = render_key()
+        path = safe_join(self.root, name)
+        if path is None or not os.path.isfile(path):
+            return None
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size, render_key)
+        asset = self._assets.get(name)
+        if asset is None or asset.key != key:
+            with self._lock:
+                asset = self._assets.get(name)
+                if asset is None or asset.key != key:
+                    asset = self._assets[name] = self._build(path, key, render)
+        return asset
+
+    @staticmethod
+    def _build(path, key, render):
+        with open(path, "rb") as f:
+            body = f.read()
+        if render is not None:
+            body = render(body.decode("utf-8")).encode("utf-8")
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if mimetype.startswith("text/") or mimetype == "application/javascript":
+            mimetype += "; charset=utf-8"
+        return Asset(key, mimetype, body)
+
+    def warm(self):
+        """Load (and render) every file under the root ahead of the first request"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                self.get(os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/"))
+
+    def serve(self, name, content_type=None):
+        """Flask response for `name`, honouring If-None-Match and Accept-Encoding"""
+        asset = self.get(name)
+        if asset is None:
+            abort(404)
+
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.bodies and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        if_none_match = request.if_none_match
+        if if_none_match and any(if_none_match.contains(asset.tag(e)) for e in asset.bodies):
+            response = Response(status=304)
+        else:
+            response = Response(asset.bodies[encoding], content_type=content_type or asset.mimetype)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(asset.tag(encoding))
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = "no-cache"  # always revalidate; 304s are cheap
+        return response
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Asyncio ingest front end for high receiver fan-in.
+
+A small HTTP/1.1 server on asyncio streams that serves only the gateway-facing
+endpoints (/api/upload, /api/upload_batch, /api/receiver_heartbeat). Each
+connection is a coroutine rather than a thread, so thousands of idle
+keep-alive gateways cost a few KB each; request bodies are read without
+blocking and the shared accept_* functions from main.py (the same validation
+the Flask routes use) run on a small thread pool, off the event loop.
+
+Runs next to the Flask app when ASYNC_INGEST_PORT is set, or standalone:
+
+    python async_ingest.py --port 5001
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+log = logging.getLogger("tracker")
+
+ASYNC_INGEST_HOST = os.getenv("ASYNC_INGEST_HOST", "0.0.0.0")
+ASYNC_INGEST_PORT = int(os.getenv("ASYNC_INGEST_PORT", "0"))  # 0 disables the front end
+ASYNC_INGEST_WORKERS = int(os.getenv("ASYNC_INGEST_WORKERS", "8"))  # threads running handlers
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+IDLE_TIMEOUT = 75.0  # seconds a keep-alive connection may sit idle
+BODY_TIMEOUT = 30.0  # seconds to receive a declared body
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+class AsyncIngestServer:
+    def __init__(self, routes, host=ASYNC_INGEST_HOST, port=ASYNC_INGEST_PORT,
+                 workers=ASYNC_INGEST_WORKERS, observe=None):
+        """`routes` maps a path to handler(body: bytes, query: dict) -> (JSON-able body, status).
+
+        `observe(route, method, status, seconds)` is called after every request.
+        """
+        self.routes = routes
+        self.host = host
+        self.port = port
+        self.observe = observe
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="async-ingest")
+        self.connections = 0
+        self._server = None
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]  # resolves port 0
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """Run the server on its own event loop thread; returns once it is listening"""
+        ready = threading.Event()
+        errors = []
+
+        async def main():
+            try:
+                await self.start()
+            except OSError as e:
+                errors.append(e)  # e.g. port already in use
+                return
+            finally:
+                ready.set()
+            await self.serve_forever()
+
+        threading.Thread(target=asyncio.run, args=(main(),), name="async-ingest", daemon=True).start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop(self):
+        if self._server is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        self.executor.shutdown(wait=False)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while await self._serve_one(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass  # client went away or stalled
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _serve_one(self, reader, writer):
+        """Handle one request; returns True to keep the connection open"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise
+            return False  # clean close between requests
+        except asyncio.LimitOverrunError:
+            await self._respond(writer, {"success": False, "message": "Headers too large"}, 431, False)
+            return False
+
+        start = time.perf_counter()
+        route, method = "unmatched", "?"
+        keep_alive = body_read = False
+        try:
+            method, target, version, headers = self._parse_head(head)
+            keep_alive = self._keep_alive(version, headers)
+            path, _, query = target.partition("?")
+            handler = self.routes.get(urlsplit(path).path)
+            if handler is None:
+                raise HttpError(404)
+            route = path
+            if method != "POST":
+                raise HttpError(405)
+            body = await self._read_body(reader, writer, headers)
+            body_read = True
+            payload, status = await self._loop.run_in_executor(
+                self.executor, handler, body, dict(parse_qsl(query)))
+        except HttpError as e:
+            payload, status = {"success": False, "message": str(e)}, e.status
+            if not body_read:
+                keep_alive = False  # unread body still on the wire, do not reuse the connection
+        except Exception as e:
+            log.exception("Async ingest error: %s", e)
+            payload, status = {"success": False, "message": "Internal error"}, 500
+
+        await self._respond(writer, payload, status, keep_alive)
+        if self.observe is not None:
+            self.observe(route, method, status, time.perf_counter() - start)
+        return keep_alive
+
+    @staticmethod
+    def _parse_head(head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, version, headers
+
+    @staticmethod
+    def _keep_alive(version, headers):
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    async def _read_body(self, reader, writer, headers):
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "Chunked bodies are not supported; send Content-Length")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413)
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        return await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b""
+
+    @staticmethod
+    async def _respond(writer, payload, status, keep_alive):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def json_body(body):
+    """Decode a request body as JSON, mapping bad input to a 400"""
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise HttpError(400, "Invalid JSON")
+
+
+def ingest_routes(app_module):
+    """Route table over main.py's shared accept_* functions"""
+    return {
+        "/api/upload": lambda body, query: app_module.accept_upload(
+            json_body(body), query.get("ack", app_module.INGEST_ACK)),
+        "/api/upload_batch": lambda body, query: app_module.accept_batch(body.decode("utf-8", "replace")),
+        "/api/receiver_heartbeat": lambda body, query: app_module.accept_heartbeat(json_body(body)),
+    }
+
+
+def create_server(app_module, host=ASYNC_INGEST_HOST, port=ASYNC_INGEST_PORT, workers=ASYNC_INGEST_WORKERS):
+    def observe(route, method, status, seconds):
+        app_module.http_duration.observe(seconds, route, method)
+        app_module.http_requests.inc(route, method, status)
+    return AsyncIngestServer(ingest_routes(app_module), host, port, workers, observe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio ingest front end for gateways")
+    parser.add_argument("--host", default=ASYNC_INGEST_HOST)
+    parser.add_argument("--port", type=int, default=ASYNC_INGEST_PORT or 5001)
+    parser.add_argument("--workers", type=int, default=ASYNC_INGEST_WORKERS)
+    args = parser.parse_args()
+
+    import main as app_module  # sets up the DB, live state and ingest writer
+    server = create_server(app_module, args.host, args.port, args.workers)
+    print(f"Async ingest listening on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nStopping async ingest...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the backend.
+
+Runs main.py against a scratch database in a temporary directory (the real
+lost_person_db.sqlite is never touched), either in-process through the Flask
+test client or over loopback HTTP with a threaded server, and drives it with
+a configurable number of concurrent clients:
+
+  upload     POST /api/upload                 (rows/s, ack=queued or committed)
+  data       GET  /data
+  history    GET  /history?n=...              at each --history-sizes table size
+  heartbeat  POST /api/receiver_heartbeat     (heartbeat storm)
+
+Each scenario reports throughput and p50/p95/p99 latency; the results are
+written to a JSON file that a later run can be compared against:
+
+    python benchmark.py --transport both --concurrency 1,8 --out before.json
+    python benchmark.py --compare before.json --out after.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+USERNAME = PASSWORD = "bench"
+SCENARIOS = ("upload", "data", "history", "heartbeat")
+
+
+def make_packet(i, device_id):
+    return {
+        "device_id": device_id,
+        "latitude": round(12.9692 + random.uniform(-0.01, 0.01), 6),
+        "longitude": round(79.1559 + random.uniform(-0.01, 0.01), 6),
+        "altitude": 310.0,
+        "speed": round(random.uniform(0, 3), 2),
+        "satellites": random.randint(4, 10),
+        "battery": 3.9,
+        "rssi": random.randint(-110, -40)
+    }
+
+
+def make_heartbeat(i):
+    return {"latitude": 12.9692, "longitude": 79.1559, "signal_strength": random.randint(-90, -40)}
+
+
+# --------------------------- CLIENTS ---------------------------------
+class InProcessClient:
+    """Flask test client; the request runs on the calling thread"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.client.post("/api/login", json={"username": USERNAME, "password": PASSWORD})
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """One keep-alive connection per client to the loopback server"""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        self.cookie = None
+        self.request("POST", "/api/login", {"username": USERNAME, "password": PASSWORD})
+
+    def request(self, method, path, body=None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        self.conn.request(method, path, data, headers)
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status
+
+
+def start_http_server(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass  # per-request access logging would dominate the measurement
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --------------------------- RUNNER ----------------------------------
+def percentiles(latencies_ms):
+    if not latencies_ms:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3),
+            "max_ms": round(max(latencies_ms), 3)}
+
+
+def run(clients, total, make_request, rows_per_request=1):
+    """Issue `total` requests spread over the clients; returns throughput and latency figures"""
+    per_client = [total // len(clients) + (1 if i < total % len(clients) else 0) for i in range(len(clients))]
+    start_barrier = threading.Barrier(len(clients))
+
+    def worker(client, count, offset):
+        latencies, errors = [], 0
+        start_barrier.wait()
+        for i in range(count):
+            method, path, body = make_request(offset + i)
+            t0 = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except Exception:
+                status = None
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+        return latencies, errors
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(len(clients)) as pool:
+        offsets = np.cumsum([0] + per_client[:-1])
+        results = list(pool.map(worker, clients, per_client, offsets))
+    elapsed = time.perf_counter() - t0
+
+    latencies = [l for r in results for l in r[0]]
+    errors = sum(r[1] for r in results)
+    ok = total - errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(total / elapsed, 1),
+        "rows_per_s": round(ok * rows_per_request / elapsed, 1),
+        **percentiles(latencies)
+    }
+
+
+def seed_packets(main, target):
+    """Grow the packets table to `target` rows (bulk insert, bypassing the HTTP path)"""
+    from db import connection, save_packets
+    with connection() as conn:
+        current = conn.execute("SELECT COUNT(*) FROM packets").fetchone()[0]
+    start = datetime.utcnow() - timedelta(days=7)
+    chunk = 5000
+    for base in range(current, target, chunk):
+        packets = []
+        for i in range(base, min(target, base + chunk)):
+            packet = make_packet(i, f"seed-{i % 10}")
+            packet["timestamp"] = (start + timedelta(seconds=i * 2.5)).isoformat()
+            packets.append(packet)
+        save_packets(packets)
+    main.recent_history.invalidate()
+    return target
+
+
+def wait_for_writer(main, timeout=60):
+    deadline = time.monotonic() + timeout
+    while main.ingest_writer.depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def benchmark(main, args):
+    results = []
+    transports = ("inprocess", "http") if args.transport == "both" else (args.transport,)
+    server = start_http_server(main.app) if "http" in transports else None
+
+    def clients_for(transport, n):
+        if transport == "http":
+            return [HttpClient(server.server_port) for _ in range(n)]
+        return [InProcessClient(main.app) for _ in range(n)]
+
+    def record(scenario, transport, concurrency, figures, **extra):
+        entry = {"scenario": scenario, "transport": transport, "concurrency": concurrency, **extra, **figures}
+        results.append(entry)
+        label = " ".join(f"{k}={v}" for k, v in extra.items())
+        print(f"{scenario:<10} {transport:<9} c={concurrency:<3} {label:<14} "
+              f"{figures['requests_per_s']:>9.1f} req/s {figures['rows_per_s']:>9.1f} rows/s  "
+              f"p50={figures['p50_ms']}ms p95={figures['p95_ms']}ms p99={figures['p99_ms']}ms "
+              f"errors={figures['errors']}")
+
+    for transport in transports:
+        for concurrency in args.concurrency:
+            clients = clients_for(transport, concurrency)
+
+            if "upload" in args.scenarios:
+                devices = [f"bench-{d}" for d in range(args.devices)]
+                path = f"/api/upload?ack={args.ack}"
+                figures = run(clients, args.requests,
+                              lambda i: ("POST", path, make_packet(i, devices[i % len(devices)])))
+                wait_for_writer(main)
+                record("upload", transport, concurrency, figures, ack=args.ack)
+
+            if "data" in args.scenarios:
+                record("data", transport, concurrency, run(clients, args.requests, lambda i: ("GET", "/data", None)))
+
+            if "history" in args.scenarios:
+                for size in args.history_sizes:
+                    seed_packets(main, size)
+                    for n in args.history_n:
+                        figures = run(clients, args.requests, lambda i: ("GET", f"/history?n={n}", None),
+                                      rows_per_request=n)
+                        record("history", transport, concurrency, figures, table_rows=size, n=n)
+
+            if "heartbeat" in args.scenarios:
+                figures = run(clients, args.requests,
+                              lambda i: ("POST", "/api/receiver_heartbeat", make_heartbeat(i)))
+                record("heartbeat", transport, concurrency, figures)
+
+    if server is not None:
+        server.shutdown()
+    return results
+
+
+def compare(results, baseline_path):
+    """Print throughput and p95 changes against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    def key(r):
+        return tuple(sorted((k, v) for k, v in r.items()
+                            if k in ("scenario", "transport", "concurrency", "ack", "table_rows", "n")))
+
+    before = {key(r): r for r in baseline}
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        b = before.get(key(r))
+        if b is None or not b["requests_per_s"] or not b["p95_ms"]:
+            continue
+        throughput = (r["requests_per_s"] / b["requests_per_s"] - 1) * 100
+        p95 = (r["p95_ms"] / b["p95_ms"] - 1) * 100
+        print(f"  {r['scenario']:<10} {r['transport']:<9} c={r['concurrency']:<3} "
+              f"throughput {throughput:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the tracking backend")
+    parser.add_argument("--transport", choices=("inprocess", "http", "both"), default="inprocess")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8], help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario run")
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS),
+                        help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--ack", choices=("queued", "committed"), default="queued")
+    parser.add_argument("--devices", type=int, default=10, help="distinct device ids in the upload run")
+    parser.add_argument("--history-sizes", type=int_list, default=[10000, 100000],
+                        help="packets table sizes for the history scenario")
+    parser.add_argument("--history-n", type=int_list, default=[100, 2000], help="?n= values for /history")
+    parser.add_argument("--seed-db", help="copy this database as the starting point instead of an empty one")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    out_path = os.path.abspath(args.out)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix="tracker-bench-")
+    if args.seed_db:
+        src = sqlite3.connect(args.seed_db)
+        dst = sqlite3.connect(os.path.join(workdir, "lost_person_db.sqlite"))
+        src.backup(dst)
+        src.close()
+        dst.close()
+    # main.py opens lost_person_db.sqlite relative to the working directory
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    print(f"Scratch database in {workdir}")
+
+    import main as backend
+    from db import create_user
+    create_user(USERNAME, PASSWORD, role="admin")
+
+    results = benchmark(backend, args)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results
+    }
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out_path}")
+
+    if compare_path:
+        compare(results, compare_path)
+
+    backend.ingest_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,9 @@
-from db import init_db, create_user
-from werkzeug.security import generate_password_hash
-import sqlite3
-from db import DB_PATH
+from db import init_db, create_user, set_user_password
 
 init_db()
 # Try to create; if exists, update password to 'admin'
 ok = create_user("admin", "admin", role="admin")
 if not ok:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET password_hash = ? WHERE username = ?", (generate_password_hash("admin"), "admin"))
-    conn.commit()
-    conn.close()
-    ok = True
+    # Bumps the auth epoch, so a running server drops its cached sessions
+    ok = set_user_password("admin", "admin")
 print("Created/updated admin:", ok)
@@ -1,56 +1,219 @@
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from metrics import db_timed
+
 DB_PATH = "lost_person_db.sqlite"
 
+# Connection settings (override via environment)
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()  # OFF, NORMAL, FULL or EXTRA
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5.0"))  # seconds
+DB_STATEMENT_CACHE = 128
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds
+USER_CACHE_EPOCH_CHECK = 2.0  # seconds between checks for user changes made by other processes
+
+# ---------- connection pool ----------
+# Flask's threaded dev server runs each request on a new thread, so connections
+# are pooled instead of thread-local. Every pooled connection keeps its own
+# compiled statement cache, so the SQL below is prepared once per connection.
+class _Connection(sqlite3.Connection):
+    generation = 0
+
+_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+_pool_generation = 0
+_pool_lock = threading.Lock()
+
+def _open_connection():
+    if DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        raise ValueError(f"Invalid DB_SYNCHRONOUS level: {DB_SYNCHRONOUS}")
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=DB_STATEMENT_CACHE, factory=_Connection)
+    # WAL lets readers (/history, /receiver_status) run alongside the ingest writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    conn.generation = _pool_generation
+    return conn
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection; wrap writes in `with conn:` to commit"""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if conn.generation != _pool_generation:
+            conn.close()
+        else:
+            try:
+                _pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+def close_db():
+    """Close every pooled connection (shutdown hook)"""
+    global _pool_generation
+    with _pool_lock:
+        # Connections still borrowed are closed when they are handed back
+        _pool_generation += 1
+        while True:
+            try:
+                conn = _pool.get_nowait()
+            except queue.Empty:
+                break
+            # Closing the last connection also checkpoints the WAL into the main file
+            conn.close()
+
+# ---------- schema ----------
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS packets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        latitude REAL,
-        longitude REAL,
-        altitude REAL,
-        speed REAL,
-        satellites INTEGER,
-        battery REAL,
-        rssi INTEGER
-    );
-    """)
-    # Users table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        role TEXT DEFAULT 'user',
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    # Receiver status table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS receiver_status (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        latitude REAL,
-        longitude REAL,
-        signal_strength INTEGER,
-        is_online INTEGER DEFAULT 1
-    );
-    """)
-    conn.commit()
-    conn.close()
-
-def save_packet(data: dict):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO packets (timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    with connection() as conn:
+        cursor = conn.cursor()
+        # Lets retention hand freed pages back without a blocking VACUUM. Once a
+        # file has tables (and the pool has switched it to WAL) the mode only
+        # changes through a VACUUM, so an older database gets one, once
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # INCREMENTAL
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS packets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            altitude REAL,
+            speed REAL,
+            satellites INTEGER,
+            battery REAL,
+            rssi INTEGER,
+            device_id TEXT,
+            receiver_id TEXT           -- gateway whose copy was kept
+        );
+        """)
+        # Databases created before multi-device/multi-gateway support lack these columns
+        columns = [r[1] for r in cursor.execute("PRAGMA table_info(packets)")]
+        if "device_id" not in columns:
+            cursor.execute("ALTER TABLE packets ADD COLUMN device_id TEXT")
+        if "receiver_id" not in columns:
+            cursor.execute("ALTER TABLE packets ADD COLUMN receiver_id TEXT")
+        # Users table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        # Receiver status table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS receiver_status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            signal_strength INTEGER,
+            is_online INTEGER DEFAULT 1,
+            receiver_id TEXT
+        );
+        """)
+        # Databases created before multi-gateway support lack the receiver column
+        columns = [r[1] for r in cursor.execute("PRAGMA table_info(receiver_status)")]
+        if "receiver_id" not in columns:
+            cursor.execute("ALTER TABLE receiver_status ADD COLUMN receiver_id TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_receiver_status_receiver ON receiver_status (receiver_id)")
+        # Time-range and keyset queries on history seek through this index
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_packets_timestamp ON packets (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_packets_device_timestamp ON packets (device_id, timestamp)")
+        # /history?after_id=&device= walks one device's rows in id order
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_packets_device_id ON packets (device_id, id)")
+        # Bumped by triggers whenever a user row changes, so cached sessions in any
+        # process (e.g. after create_admin.py resets a password) get dropped
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS auth_epoch (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch INTEGER NOT NULL
+        );
+        """)
+        cursor.execute("INSERT OR IGNORE INTO auth_epoch (id, epoch) VALUES (1, 0)")
+        for event in ("UPDATE", "DELETE"):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS users_epoch_{event.lower()} AFTER {event} ON users
+            BEGIN
+                UPDATE auth_epoch SET epoch = epoch + 1 WHERE id = 1;
+            END
+            """)
+        conn.commit()
+    init_spatial_index()
+
+# ---------- spatial index ----------
+# R*Tree over packet positions, kept in sync by triggers so every insert path
+# (single upload, batch, simulator) and every delete maintains it.
+spatial_index_enabled = False
+
+def init_spatial_index():
+    """Create the packets R*Tree (if SQLite supports it) and backfill existing rows once"""
+    global spatial_index_enabled
+    with connection() as conn:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'packets_rtree'").fetchone()
+        try:
+            with conn:
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS packets_rtree
+                    USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS packets_rtree_insert AFTER INSERT ON packets
+                    WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+                    BEGIN
+                        INSERT INTO packets_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+                    END
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS packets_rtree_delete AFTER DELETE ON packets
+                    BEGIN
+                        DELETE FROM packets_rtree WHERE id = OLD.id;
+                    END
+                """)
+        except sqlite3.OperationalError as e:
+            # SQLite built without RTREE: bbox queries fall back to a table scan
+            print("Spatial index unavailable:", e)
+            return
+        spatial_index_enabled = True
+    if not exists:
+        backfill_spatial_index()
+
+def backfill_spatial_index():
+    """Index every packet not yet in the R*Tree; returns the number of rows added"""
+    with connection() as conn, conn:
+        cur = conn.execute("""
+            INSERT INTO packets_rtree
+            SELECT id, latitude, latitude, longitude, longitude FROM packets
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+              AND id NOT IN (SELECT id FROM packets_rtree)
+        """)
+        return cur.rowcount
+
+# ---------- packet helpers ----------
+INSERT_PACKET_SQL = """
+    INSERT INTO packets (timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi, device_id,
+                         receiver_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _packet_row(data: dict):
+    return (
         data.get("timestamp", datetime.utcnow().isoformat()),
         data.get("latitude"),
         data.get("longitude"),
@@ -58,51 +221,150 @@ def save_packet(data: dict):
         data.get("speed"),
         data.get("satellites"),
         data.get("battery"),
-        data.get("rssi")
-    ))
-    conn.commit()
-    conn.close()
-
-def get_latest(n=100):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi FROM packets ORDER BY id DESC LIMIT ?", (n,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [
-        {
-            "timestamp": r[0],
-            "latitude": r[1],
-            "longitude": r[2],
-            "altitude": r[3],
-            "speed": r[4],
-            "satellites": r[5],
-            "battery": r[6],
-            "rssi": r[7]
-        } for r in rows
-    ]
+        data.get("rssi"),
+        data.get("device_id"),
+        data.get("receiver_id")  # after PACKET_COLUMNS, so stored rows still index the same
+    )
+
+@db_timed
+def save_packets(packets):
+    """Insert many packets in a single transaction; returns the stored rows with their ids"""
+    rows = [_packet_row(p) for p in packets]
+    if not rows:
+        return []
+    with connection() as conn, conn:
+        conn.executemany(INSERT_PACKET_SQL, rows)
+        # The write lock is held for the whole transaction, so the new ids are consecutive
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    first_id = last_id - len(rows) + 1
+    return [(first_id + i,) + row for i, row in enumerate(rows)]
+
+PACKET_COLUMNS = "id, timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi, device_id"
+
+def packet_dict(r):
+    return {
+        "id": r[0],
+        "timestamp": r[1],
+        "latitude": r[2],
+        "longitude": r[3],
+        "altitude": r[4],
+        "speed": r[5],
+        "satellites": r[6],
+        "battery": r[7],
+        "rssi": r[8],
+        "device_id": r[9]
+    }
+
+@db_timed
+def get_history(since=None, until=None, cursor=None, limit=100, device_id=None, raw=False, bbox=None):
+    """Newest-first page of packets in [since, until), keyset-paginated on (timestamp, id).
+
+    `cursor` is the (timestamp, id) of the last row of the previous page and
+    `bbox` an optional (min_lat, min_lon, max_lat, max_lon) area. Returns
+    (rows, next_cursor); next_cursor is None once the range is exhausted. With
+    raw=True rows are plain tuples in PACKET_COLUMNS order instead of dicts.
+    """
+    clauses, params = [], []
+    if device_id is not None:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    if cursor is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(cursor)
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        if spatial_index_enabled:
+            # R*Tree boxes are widened to 32-bit floats, so match by overlap and
+            # let the exact test below trim the edges
+            clauses.append("id IN (SELECT id FROM packets_rtree WHERE max_lat >= ? AND min_lat <= ? "
+                           "AND max_lon >= ? AND min_lon <= ?)")
+            params.extend((min_lat, max_lat, min_lon, max_lon))
+        clauses.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+        params.extend((min_lat, max_lat, min_lon, max_lon))
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+    with connection() as conn:
+        rows = conn.execute(f"SELECT {PACKET_COLUMNS} FROM packets{where} "
+                            "ORDER BY timestamp DESC, id DESC LIMIT ?", params).fetchall()
+    next_cursor = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+    if raw:
+        return rows, next_cursor
+    return [packet_dict(r) for r in rows], next_cursor
+
+@db_timed
+def get_packets_after(after_id, limit=100, device_id=None):
+    """Packets stored after `after_id`, in insertion (id) order, for incremental polling.
+
+    Ids grow with every insert, so this also returns late-arriving rows whose
+    timestamps are older than ones the client already holds.
+    """
+    clauses, params = ["id > ?"], [after_id]
+    if device_id is not None:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    params.append(limit)
+    with connection() as conn:
+        rows = conn.execute(f"SELECT {PACKET_COLUMNS} FROM packets WHERE {' AND '.join(clauses)} "
+                            "ORDER BY id LIMIT ?", params).fetchall()
+    return [packet_dict(r) for r in rows]
+
+@db_timed
+def get_latest_packet_id():
+    """Highest stored packet id (0 when empty); moves whenever any process inserts"""
+    with connection() as conn:
+        return conn.execute("SELECT max(id) FROM packets").fetchone()[0] or 0
+
+def iter_packets(since=None, until=None, device_id=None, by_device=False, batch=1000):
+    """Stream packets in [since, until) oldest first as PACKET_COLUMNS tuples.
+
+    Rows come from one cursor in `batch`-sized fetches, so memory stays flat
+    however large the range; by_device=True groups rows per device (for GPX
+    tracks). The pooled connection is held until the generator is exhausted
+    or closed.
+    """
+    clauses, params = [], []
+    if device_id is not None:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "device_id, timestamp, id" if by_device else "timestamp, id"
+    with connection() as conn:
+        cur = conn.execute(f"SELECT {PACKET_COLUMNS} FROM packets{where} ORDER BY {order}", params)
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            yield from rows
 
 # ---------- user helpers ----------
+@db_timed
 def create_user(username: str, password: str, role: str = "user"):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     password_hash = generate_password_hash(password)
-    try:
-        cursor.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                       (username, password_hash, role))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
+    with connection() as conn:
+        try:
+            with conn:
+                conn.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                             (username, password_hash, role))
+            return True
+        except sqlite3.IntegrityError:
+            return False
 
+@db_timed
 def verify_user(username: str, password: str):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, password_hash, role FROM users WHERE username = ?", (username,))
-    row = cursor.fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT id, password_hash, role FROM users WHERE username = ?", (username,)).fetchone()
     if not row:
         return None
     uid, password_hash, role = row
@@ -110,45 +372,124 @@ def verify_user(username: str, password: str):
         return {"id": uid, "username": username, "role": role}
     return None
 
+@db_timed
 def get_user_by_id(uid):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, role FROM users WHERE id = ?", (uid,))
-    r = cursor.fetchone()
-    conn.close()
+    with connection() as conn:
+        r = conn.execute("SELECT id, username, role FROM users WHERE id = ?", (uid,)).fetchone()
     if r:
         return {"id": r[0], "username": r[1], "role": r[2]}
     return None
 
-# ---------- receiver status helpers ----------
-def save_receiver_status(data: dict):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO receiver_status (timestamp, latitude, longitude, signal_strength, is_online)
-        VALUES (?, ?, ?, ?, ?)
-    """, (
-        data.get("timestamp", datetime.utcnow().isoformat()),
-        data.get("latitude"),
-        data.get("longitude"),
-        data.get("signal_strength", 0),
-        data.get("is_online", 1)
-    ))
-    conn.commit()
-    conn.close()
-
-def get_last_receiver_status():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, latitude, longitude, signal_strength, is_online FROM receiver_status ORDER BY id DESC LIMIT 1")
-    row = cursor.fetchone()
-    conn.close()
-    if row:
+@db_timed
+def set_user_password(username: str, password: str):
+    """Reset a user's password; returns False if the user does not exist"""
+    with connection() as conn, conn:
+        cur = conn.execute("UPDATE users SET password_hash = ? WHERE username = ?",
+                           (generate_password_hash(password), username))
+    user_cache.clear()
+    return cur.rowcount > 0
+
+@db_timed
+def set_user_role(username: str, role: str):
+    """Change a user's role; returns False if the user does not exist"""
+    with connection() as conn, conn:
+        cur = conn.execute("UPDATE users SET role = ? WHERE username = ?", (role, username))
+    user_cache.clear()
+    return cur.rowcount > 0
+
+class UserCache:
+    """TTL cache in front of get_user_by_id for Flask-Login session loading.
+
+    Entries are dropped explicitly (logout, role/password changes in this
+    process) and wholesale whenever auth_epoch moves, which catches changes
+    made by other processes; the epoch is read at most every couple of seconds.
+    """
+    def __init__(self, ttl=USER_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # uid -> (expires_at, user dict)
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._epoch_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_epoch(self, now):
+        with self._lock:
+            if now - self._epoch_checked < USER_CACHE_EPOCH_CHECK:
+                return
+            self._epoch_checked = now
+            with connection() as conn:
+                row = conn.execute("SELECT epoch FROM auth_epoch WHERE id = 1").fetchone()
+            epoch = row[0] if row else None
+            if epoch != self._epoch:
+                if self._epoch is not None:
+                    self.invalidations += 1
+                self._epoch = epoch
+                self._entries.clear()
+
+    def get(self, uid):
+        now = time.monotonic()
+        if now - self._epoch_checked >= USER_CACHE_EPOCH_CHECK:
+            self._check_epoch(now)
+        entry = self._entries.get(uid)
+        if entry and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        user = get_user_by_id(uid)
+        if user:
+            self._entries[uid] = (now + self.ttl, user)
+        return user
+
+    def invalidate(self, uid):
+        self.invalidations += 1
+        self._entries.pop(uid, None)
+
+    def clear(self):
+        self.invalidations += 1
+        self._entries.clear()
+
+    def stats(self):
         return {
-            "timestamp": row[0],
-            "latitude": row[1],
-            "longitude": row[2],
-            "signal_strength": row[3],
-            "is_online": row[4]
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
         }
-    return None
+
+user_cache = UserCache()
+
+# ---------- receiver status helpers ----------
+RECEIVER_STATUS_COLUMNS = ("timestamp", "latitude", "longitude", "signal_strength", "is_online", "receiver_id")
+
+@db_timed
+def save_receiver_status(data: dict):
+    with connection() as conn, conn:
+        conn.execute("""
+            INSERT INTO receiver_status (timestamp, latitude, longitude, signal_strength, is_online, receiver_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            data.get("timestamp", datetime.utcnow().isoformat()),
+            data.get("latitude"),
+            data.get("longitude"),
+            data.get("signal_strength", 0),
+            data.get("is_online", 1),
+            data.get("receiver_id")
+        ))
+
+@db_timed
+def get_receiver_statuses():
+    """Latest stored status of every receiver (receiver_id is None for pre-gateway rows)"""
+    with connection() as conn:
+        rows = conn.execute(f"SELECT {', '.join(RECEIVER_STATUS_COLUMNS)} FROM receiver_status "
+                            "WHERE id IN (SELECT max(id) FROM receiver_status GROUP BY receiver_id) "
+                            "ORDER BY id").fetchall()
+    return [dict(zip(RECEIVER_STATUS_COLUMNS, row)) for row in rows]
+
+@db_timed
+def update_packet_rssi(updates):
+    """Raise stored RSSI (and never lower it) for (packet id, rssi, receiver id) triples"""
+    with connection() as conn, conn:
+        conn.executemany("UPDATE packets SET rssi = ?, receiver_id = ? WHERE id = ? AND (rssi IS NULL OR rssi < ?)",
+                         [(rssi, receiver_id, packet_id, rssi) for packet_id, rssi, receiver_id in updates])
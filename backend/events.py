@@ -0,0 +1,51 @@
+"""
+Publish/subscribe hub behind the /stream Server-Sent Events endpoint.
+
+Producers (uploads, heartbeats, the simulator) publish state changes once;
+every connected dashboard receives the same pre-encoded message, and a short
+history lets a reconnecting client resume from its Last-Event-ID.
+"""
+import json
+import threading
+from collections import deque
+
+EVENT_HISTORY = 256
+
+
+class EventHub:
+    def __init__(self, history=EVENT_HISTORY):
+        self._events = deque(maxlen=history)  # (id, encoded SSE message)
+        self._cond = threading.Condition()
+        self.last_id = 0
+
+    def publish(self, event, data):
+        """Record an event and wake every subscriber; returns the event id"""
+        payload = json.dumps(data, separators=(",", ":"))
+        with self._cond:
+            self.last_id += 1
+            message = f"id: {self.last_id}\nevent: {event}\ndata: {payload}\n\n"
+            self._events.append((self.last_id, message))
+            self._cond.notify_all()
+            return self.last_id
+
+    def can_resume(self, after_id):
+        """True if every event after `after_id` is still in the history"""
+        with self._cond:
+            if after_id > self.last_id:
+                return False  # id from before a server restart
+            if after_id == self.last_id:
+                return True
+            return bool(self._events) and self._events[0][0] <= after_id + 1
+
+    def wait(self, after_id, timeout=None):
+        """Block until events newer than `after_id` exist; returns [(id, message)]"""
+        with self._cond:
+            if self.last_id <= after_id:
+                self._cond.wait(timeout)
+            return [e for e in self._events if e[0] > after_id]
+
+
+def format_event(event, data, event_id=None):
+    """Encode a one-off SSE message (used for snapshots sent on connect)"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -0,0 +1,112 @@
+"""
+Streaming track export as CSV, GPX or GeoJSON.
+
+Every format is a generator over packet tuples (PACKET_COLUMNS order) that
+yields text in ~64 KB chunks, and gzip_stream compresses those chunks on the
+fly, so an export of millions of points never materialises the result set or
+the response body in memory.
+"""
+import csv
+import io
+import json
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+from db import PACKET_COLUMNS
+
+COLUMNS = PACKET_COLUMNS.split(", ")
+CHUNK_SIZE = 64 * 1024  # characters buffered before a chunk is yielded
+
+FORMATS = {
+    # format: (mimetype, file extension)
+    "csv": ("text/csv", "csv"),
+    "gpx": ("application/gpx+xml", "gpx"),
+    "geojson": ("application/geo+json", "geojson"),
+}
+
+
+def _chunked(pieces):
+    """Join small strings into roughly CHUNK_SIZE pieces"""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    yield out.getvalue()
+    for row in rows:
+        out.seek(0)
+        out.truncate()
+        writer.writerow(row)
+        yield out.getvalue()
+
+
+def _gpx_time(timestamp):
+    # Stored timestamps are naive UTC
+    return timestamp + "Z" if timestamp and not timestamp.endswith("Z") else timestamp
+
+
+def _gpx_lines(rows):
+    """One <trk> per device; rows must be grouped by device (iter_packets(by_device=True))"""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<gpx version="1.1" creator="Internet-Free-Tracking-System" '
+           'xmlns="http://www.topografix.com/GPX/1/1">\n')
+    start = current = object()  # sentinel: no track open yet
+    for _, timestamp, lat, lon, alt, speed, sats, battery, rssi, device_id in rows:
+        if lat is None or lon is None:
+            continue
+        if device_id != current:
+            if current is not start:
+                yield "</trkseg></trk>\n"
+            yield f"<trk><name>{escape(device_id or 'unknown')}</name><trkseg>\n"
+            current = device_id
+        ele = f"<ele>{alt}</ele>" if alt is not None else ""
+        sat = f"<sat>{sats}</sat>" if sats is not None else ""
+        yield (f"<trkpt lat={quoteattr(str(lat))} lon={quoteattr(str(lon))}>{ele}"
+               f"<time>{escape(_gpx_time(timestamp))}</time>{sat}</trkpt>\n")
+    if current is not start:
+        yield "</trkseg></trk>\n"
+    yield "</gpx>\n"
+
+
+def _geojson_lines(rows):
+    yield '{"type":"FeatureCollection","features":['
+    first = True
+    for row in rows:
+        packet_id, timestamp, lat, lon, alt, speed, sats, battery, rssi, device_id = row
+        if lat is None or lon is None:
+            continue
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat] if alt is None else [lon, lat, alt]},
+            "properties": {"id": packet_id, "timestamp": timestamp, "device_id": device_id, "speed": speed,
+                           "satellites": sats, "battery": battery, "rssi": rssi}
+        }
+        yield ("" if first else ",") + json.dumps(feature, separators=(",", ":"))
+        first = False
+    yield "]}\n"
+
+
+def stream_export(fmt, rows):
+    """Text chunks of `rows` rendered as `fmt` (a FORMATS key)"""
+    lines = {"csv": _csv_lines, "gpx": _gpx_lines, "geojson": _geojson_lines}[fmt](rows)
+    return _chunked(lines)
+
+
+def gzip_stream(chunks, level=6):
+    """gzip-compress a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
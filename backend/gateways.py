@@ -0,0 +1,282 @@
+"""
+Multi-gateway fan-in: duplicate suppression and per-receiver state.
+
+With several LoRa receivers covering an area, one transmission is often
+heard, and uploaded, by more than one gateway. DedupCache remembers every
+packet that names its receiver_id, keyed on the device plus its frame
+counter (`seq`) for DEDUP_WINDOW seconds or, without one, on a hash of the
+radio payload (position, altitude, speed, satellites, battery; not RSSI or
+the arrival time). A payload with a device timestamp (store-and-forward
+batches) includes that timestamp in the key and is kept for DEDUP_WINDOW;
+one timed on arrival is kept for DEDUP_PAYLOAD_WINDOW seconds. That window
+must stay below the transmit interval, or a stationary tracker's next real
+fix would look like a copy of the last one.
+
+The first copy goes through the normal pipeline; later copies are dropped,
+and a copy heard with a stronger signal replaces the kept RSSI/receiver, in
+the stored row (packets.rssi and packets.receiver_id) as soon as the writer
+has committed it. The caller reports whether the first copy was accepted
+(accept) or refused by the writer (discard); a refused copy is forgotten so
+the gateway's retry is not taken for a duplicate.
+
+With several worker processes (LIVE_STATE_SHARED) gateways may reach
+different workers, so a shared cache also claims each fingerprint in the
+gateway_seen table: only the worker whose claim succeeds stores the packet.
+Upgrading the RSSI from a copy that reached another worker is per-process
+and does not happen in that case.
+
+ReceiverRegistry holds each receiver's latest heartbeat and reception
+counters in memory, so status reads never scan receiver_status (per worker
+process, like the counters).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from db import connection
+from ingest import DEFAULT_RECEIVER_ID
+
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "5"))  # seconds a packet counts as a possible duplicate
+DEDUP_PAYLOAD_WINDOW = float(os.getenv("DEDUP_PAYLOAD_WINDOW", "1.5"))  # same, for packets without seq
+DEDUP_MAX_KEYS = int(os.getenv("DEDUP_MAX_KEYS", "100000"))
+
+NEW, DUPLICATE, UPGRADED = "new", "duplicate", "upgraded"
+
+
+def fingerprint(packet, device_time=False):
+    """Dedup key; `device_time` means packet["timestamp"] came from the tracker, not arrival"""
+    if packet.get("seq") is not None:
+        return packet["device_id"], "seq", packet["seq"]
+    key = (packet["device_id"], packet["latitude"], packet["longitude"], packet["altitude"],
+           packet["speed"], packet["satellites"], packet["battery"])
+    return key + (packet["timestamp"],) if device_time else key
+
+
+def init_shared_dedup():
+    with connection() as conn, conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS gateway_seen (
+            key TEXT PRIMARY KEY,      -- fingerprint
+            expires REAL NOT NULL      -- epoch seconds
+        );
+        """)
+
+
+class _Entry:
+    __slots__ = ("key", "queued", "best", "expires", "row_id", "copies", "accepted")
+
+    def __init__(self, packet, expires):
+        self.key = None
+        self.queued = packet  # the copy handed to the writer
+        self.best = packet    # strongest copy heard so far
+        self.expires = expires
+        self.row_id = None    # packets.id once the writer has committed it
+        self.copies = 1
+        self.accepted = False  # the writer took the queued copy, so it is live
+
+
+class DedupCache:
+    def __init__(self, update_rssi, window=DEDUP_WINDOW, payload_window=DEDUP_PAYLOAD_WINDOW,
+                 max_keys=DEDUP_MAX_KEYS, shared=False):
+        """`update_rssi([(packet id, rssi, receiver id), ...])` upgrades stored rows;
+        `shared` claims fingerprints in the DB so other workers see them too"""
+        self.update_rssi = update_rssi
+        self.window = window
+        self.payload_window = payload_window
+        self.max_keys = max_keys
+        self.shared = shared
+        self._entries = OrderedDict()  # fingerprint -> _Entry, oldest first
+        self._queued = {}  # id(queued packet) -> _Entry, for as long as the entry lives
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+        if shared:
+            init_shared_dedup()
+
+    def _evict(self, now):
+        # Called with the lock held
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires > now and len(self._entries) <= self.max_keys:
+                break
+            del self._entries[key]
+            self._queued.pop(id(entry.queued), None)
+
+    def offer(self, packet, device_time=False):
+        """Classify a gateway copy; returns (NEW | DUPLICATE | UPGRADED, kept copy, replaced copy).
+
+        For UPGRADED the kept copy is None while the first copy is not yet
+        accepted: accept() returns the stronger copy for publishing instead.
+        """
+        now = time.monotonic()
+        key = fingerprint(packet, device_time)
+        window = self.window if packet.get("seq") is not None or device_time else self.payload_window
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is None and not self.shared:
+                return self._add(key, packet, now + window)
+        if entry is None:
+            claimed = self._claim(key, window)  # a DB write, so outside the lock
+        with self._lock:
+            if entry is None:
+                entry = self._entries.get(key)
+                if entry is None:
+                    if not claimed:
+                        return DUPLICATE, packet, None  # another worker has it
+                    return self._add(key, packet, now + window)
+            entry.copies += 1
+            if packet["rssi"] <= entry.best["rssi"]:
+                return DUPLICATE, entry.best, None
+            # Stronger copy: keep the first copy's timestamp so it stays the same fix
+            replaced = entry.best
+            entry.best = dict(replaced, rssi=packet["rssi"], receiver_id=packet["receiver_id"])
+            row_id, best, accepted = entry.row_id, entry.best, entry.accepted
+        if row_id is not None:
+            self.update_rssi([(row_id, best["rssi"], best["receiver_id"])])
+        return UPGRADED, best if accepted else None, replaced
+
+    def _add(self, key, packet, expires):
+        # Called with the lock held
+        entry = self._entries[key] = _Entry(packet, expires)
+        entry.key = key
+        self._queued[id(packet)] = entry
+        return NEW, packet, None
+
+    def _claim(self, key, window):
+        """Record the fingerprint in gateway_seen; False if another worker holds it"""
+        now = time.time()
+        with connection() as conn, conn:
+            if now >= self._next_purge:
+                conn.execute("DELETE FROM gateway_seen WHERE expires < ?", (now,))
+                self._next_purge = now + self.window
+            cursor = conn.execute("INSERT INTO gateway_seen (key, expires) VALUES (?, ?) "
+                                  "ON CONFLICT (key) DO UPDATE SET expires = excluded.expires "
+                                  "WHERE gateway_seen.expires < ?", (repr(key), now + window, now))
+            return cursor.rowcount == 1
+
+    def _entry(self, packet):
+        # Called with the lock held: the entry whose first copy is `packet`
+        entry = self._queued.get(id(packet))
+        return entry if entry is not None and entry.queued is packet else None
+
+    def accept(self, packets):
+        """The writer took these NEW copies; returns the copies to publish (strongest heard)"""
+        kept = []
+        with self._lock:
+            for packet in packets:
+                entry = self._entry(packet)
+                if entry is not None:
+                    entry.accepted = True
+                    packet = entry.best
+                kept.append(packet)
+        return kept
+
+    def discard(self, packets):
+        """The writer refused these NEW copies: forget them so a retry counts as new"""
+        keys = []
+        with self._lock:
+            for packet in packets:
+                entry = self._entry(packet)
+                if entry is not None:
+                    keys.append(entry.key)
+                    del self._entries[entry.key]
+                    del self._queued[id(packet)]
+        if self.shared and keys:
+            with connection() as conn, conn:
+                conn.executemany("DELETE FROM gateway_seen WHERE key = ?", [(repr(k),) for k in keys])
+
+    def committed(self, packets, rows):
+        """Writer callback: note stored ids and fix rows upgraded while they were queued"""
+        fixes = []
+        with self._lock:
+            for packet, row in zip(packets, rows):
+                entry = self._entry(packet)
+                if entry is None or entry.row_id is not None:
+                    continue
+                entry.row_id = row[0]
+                if entry.best["rssi"] != packet["rssi"]:
+                    fixes.append((row[0], entry.best["rssi"], entry.best["receiver_id"]))
+        if fixes:
+            self.update_rssi(fixes)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ReceiverStats:
+    __slots__ = ("receiver_id", "status", "packets", "duplicates", "best", "rssi_sum", "last_packet")
+
+    def __init__(self, receiver_id):
+        self.receiver_id = receiver_id
+        self.status = None  # latest heartbeat
+        self.packets = 0     # packets this gateway forwarded, duplicates included
+        self.duplicates = 0  # copies another gateway had already delivered
+        self.best = 0        # times this gateway supplied the kept (strongest) copy
+        self.rssi_sum = 0
+        self.last_packet = None
+
+    def summary(self):
+        return {
+            "receiver_id": self.receiver_id,
+            "status": self.status,
+            "packets": self.packets,
+            "duplicates": self.duplicates,
+            "best": self.best,
+            "avg_rssi": round(self.rssi_sum / self.packets, 1) if self.packets else None,
+            "last_packet": self.last_packet.isoformat() if self.last_packet else None
+        }
+
+
+class ReceiverRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._receivers = {}
+
+    def _get(self, receiver_id):
+        # Called with the lock held
+        record = self._receivers.get(receiver_id)
+        if record is None:
+            record = self._receivers[receiver_id] = ReceiverStats(receiver_id)
+        return record
+
+    def load(self, statuses):
+        """Seed latest statuses from the DB (get_receiver_statuses) at startup"""
+        with self._lock:
+            for status in statuses:
+                receiver_id = status.get("receiver_id") or DEFAULT_RECEIVER_ID
+                self._get(receiver_id).status = dict(status, receiver_id=receiver_id)
+
+    def heartbeat(self, status):
+        with self._lock:
+            self._get(status["receiver_id"]).status = status
+
+    def packet(self, receiver_id, rssi, outcome):
+        with self._lock:
+            record = self._get(receiver_id)
+            record.packets += 1
+            record.rssi_sum += rssi
+            record.last_packet = datetime.utcnow()
+            if outcome != NEW:
+                record.duplicates += 1
+            if outcome != DUPLICATE:
+                record.best += 1
+
+    def superseded(self, receiver_id):
+        """A stronger copy from another gateway replaced this gateway's kept copy"""
+        with self._lock:
+            self._get(receiver_id).best -= 1
+
+    def status(self, receiver_id=None):
+        """Latest heartbeat of one receiver, or the most recent across all of them"""
+        with self._lock:
+            if receiver_id is not None:
+                record = self._receivers.get(receiver_id)
+                return record.status if record else None
+            statuses = [r.status for r in self._receivers.values() if r.status]
+        return max(statuses, key=lambda s: s["timestamp"]) if statuses else None
+
+    def summaries(self):
+        with self._lock:
+            return [r.summary() for r in self._receivers.values()]
@@ -0,0 +1,242 @@
+"""
+Geofences evaluated on every ingested packet.
+
+Fences (polygons or circles, tagged as safe zones or hazard areas) live in
+SQLite and are compiled into flat NumPy arrays: one bounding box per fence and
+every polygon edge of every fence in a single edge table. A packet is tested
+against all fences at once - a vectorised bounding-box prefilter, then one
+ray-casting pass over the edges of the surviving fences - and each device's
+membership is diffed against its previous fix to produce enter/exit events.
+Fixes older than the last one evaluated for a device (store-and-forward
+backfill, late gateway uploads) are skipped: they say nothing about where the
+device is now.
+"""
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from db import connection
+
+ZONES = ("safe", "hazard")
+EARTH_RADIUS_M = 6371000.0
+
+
+def init_geofences():
+    with connection() as conn, conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS geofences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            zone TEXT NOT NULL DEFAULT 'safe',   -- 'safe' or 'hazard'
+            kind TEXT NOT NULL,                  -- 'polygon' or 'circle'
+            geometry TEXT NOT NULL,              -- JSON: [[lat, lon], ...] or {"center": [lat, lon], "radius_m": r}
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS geofence_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            device_id TEXT,
+            geofence_id INTEGER NOT NULL,
+            geofence_name TEXT,
+            zone TEXT,
+            event TEXT NOT NULL,                 -- 'enter' or 'exit'
+            latitude REAL,
+            longitude REAL
+        );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_geofence_events_timestamp ON geofence_events (timestamp)")
+
+
+def validate_geofence(data):
+    """Normalise an API payload into (name, zone, kind, geometry); raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    name = str(data.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    zone = data.get("zone", "safe")
+    if zone not in ZONES:
+        raise ValueError("zone must be 'safe' or 'hazard'")
+    try:
+        if "points" in data:
+            points = [[float(lat), float(lon)] for lat, lon in data["points"]]
+            if len(points) < 3:
+                raise ValueError("a polygon needs at least 3 points")
+            return name, zone, "polygon", points
+        if "center" in data:
+            lat, lon = (float(v) for v in data["center"])
+            radius = float(data["radius_m"])
+            if radius <= 0:
+                raise ValueError("radius_m must be positive")
+            return name, zone, "circle", {"center": [lat, lon], "radius_m": radius}
+    except (TypeError, KeyError) as e:
+        raise ValueError(f"invalid geometry: {e}")
+    raise ValueError("give either points (polygon) or center + radius_m (circle)")
+
+
+def create_geofence(name, zone, kind, geometry):
+    with connection() as conn, conn:
+        cur = conn.execute("INSERT INTO geofences (name, zone, kind, geometry) VALUES (?, ?, ?, ?)",
+                           (name, zone, kind, json.dumps(geometry)))
+        return cur.lastrowid
+
+
+def delete_geofence(fence_id):
+    with connection() as conn, conn:
+        return conn.execute("DELETE FROM geofences WHERE id = ?", (fence_id,)).rowcount > 0
+
+
+def list_geofences():
+    with connection() as conn:
+        rows = conn.execute("SELECT id, name, zone, kind, geometry, created_at FROM geofences ORDER BY id").fetchall()
+    return [{"id": r[0], "name": r[1], "zone": r[2], "kind": r[3], "geometry": json.loads(r[4]),
+             "created_at": r[5]} for r in rows]
+
+
+def save_events(events):
+    with connection() as conn, conn:
+        conn.executemany("""
+            INSERT INTO geofence_events (timestamp, device_id, geofence_id, geofence_name, zone, event, latitude, longitude)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(e["timestamp"], e["device_id"], e["geofence_id"], e["geofence_name"], e["zone"], e["event"],
+               e["latitude"], e["longitude"]) for e in events])
+
+
+def get_events(since=None, device_id=None, limit=100):
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if device_id is not None:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+    with connection() as conn:
+        cur = conn.execute(f"SELECT * FROM geofence_events{where} ORDER BY timestamp DESC, id DESC LIMIT ?", params)
+        columns = [c[0] for c in cur.description]
+        return [dict(zip(columns, r)) for r in cur.fetchall()]
+
+
+class _Compiled:
+    """Immutable array form of the fence set; swapped whole on reload"""
+
+    def __init__(self, fences):
+        self.fences = fences
+        n = len(fences)
+        self.ids = np.array([f["id"] for f in fences], dtype=np.int64)
+        self.bbox = np.empty((n, 4))  # min_lat, min_lon, max_lat, max_lon
+        self.is_circle = np.zeros(n, dtype=bool)
+        self.center = np.zeros((n, 2))
+        self.radius = np.zeros(n)
+        edges = []
+        for i, f in enumerate(fences):
+            g = f["geometry"]
+            if f["kind"] == "circle":
+                lat, lon = g["center"]
+                r = g["radius_m"]
+                dlat = np.degrees(r / EARTH_RADIUS_M)
+                dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+                self.bbox[i] = (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+                self.is_circle[i] = True
+                self.center[i] = (lat, lon)
+                self.radius[i] = r
+            else:
+                pts = np.asarray(g, dtype=np.float64)
+                self.bbox[i] = (pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max())
+                nxt = np.roll(pts, -1, axis=0)
+                edges.append(np.column_stack([pts, nxt, np.full(len(pts), i)]))
+        e = np.vstack(edges) if edges else np.empty((0, 5))
+        # Edge table columns: lat1, lon1, lat2, lon2, fence index
+        self.e_lat1, self.e_lon1, self.e_lat2, self.e_lon2 = e[:, 0], e[:, 1], e[:, 2], e[:, 3]
+        self.e_fence = e[:, 4].astype(np.int64)
+
+    def contains(self, lat, lon):
+        """Boolean array: is (lat, lon) inside each fence"""
+        n = len(self.fences)
+        cand = ((self.bbox[:, 0] <= lat) & (lat <= self.bbox[:, 2]) &
+                (self.bbox[:, 1] <= lon) & (lon <= self.bbox[:, 3]))
+        inside = np.zeros(n, dtype=bool)
+        if not cand.any():
+            return inside
+
+        circles = cand & self.is_circle
+        if circles.any():
+            c = self.center[circles]
+            dy = np.radians(lat - c[:, 0])
+            dx = np.radians(lon - c[:, 1]) * np.cos(np.radians(lat))
+            inside[circles] = np.hypot(dx, dy) * EARTH_RADIUS_M <= self.radius[circles]
+
+        if (cand & ~self.is_circle).any():
+            sel = cand[self.e_fence]  # edges of candidate polygons only
+            y1, y2 = self.e_lat1[sel], self.e_lat2[sel]
+            x1, x2 = self.e_lon1[sel], self.e_lon2[sel]
+            straddles = (y1 > lat) != (y2 > lat)
+            x_cross = np.zeros_like(x1)
+            np.divide((lat - y1) * (x2 - x1), (y2 - y1), out=x_cross, where=straddles)
+            hits = straddles & (lon < x1 + x_cross)
+            crossings = np.bincount(self.e_fence[sel][hits], minlength=n)
+            inside |= (crossings % 2 == 1) & ~self.is_circle
+        return inside
+
+
+class GeofenceEngine:
+    def __init__(self):
+        self._compiled = _Compiled([])
+        self._membership = {}  # device_id -> frozenset of fence ids the device is inside
+        self._last_fix = {}    # device_id -> timestamp of the fix that membership is from
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """Recompile from the database (after fences are created or deleted)"""
+        compiled = _Compiled(list_geofences())
+        with self._lock:
+            self._compiled = compiled
+            valid = set(compiled.ids.tolist())
+            self._membership = {d: m & valid for d, m in self._membership.items()}
+
+    def membership(self):
+        with self._lock:
+            return {d: sorted(m) for d, m in self._membership.items()}
+
+    def evaluate(self, packet):
+        """Return enter/exit events for one packet (the first fix of a device only sets a baseline;
+        fixes older than the device's last evaluated one are ignored)"""
+        compiled = self._compiled
+        lat, lon = packet.get("latitude"), packet.get("longitude")
+        if lat is None or lon is None:
+            return []
+        inside = compiled.contains(lat, lon)
+        now_in = frozenset(compiled.ids[inside].tolist())
+        device_id = packet.get("device_id")
+        timestamp = packet.get("timestamp")
+        with self._lock:
+            last = self._last_fix.get(device_id)
+            if timestamp is not None and last is not None and timestamp < last:
+                return []
+            if timestamp is not None:
+                self._last_fix[device_id] = timestamp
+            before = self._membership.get(device_id)
+            self._membership[device_id] = now_in
+        if before is None or before == now_in:
+            return []
+        by_id = {f["id"]: f for f in compiled.fences}
+        events = []
+        for event, fence_ids in (("enter", now_in - before), ("exit", before - now_in)):
+            for fid in sorted(fence_ids):
+                f = by_id[fid]
+                events.append({
+                    "timestamp": packet.get("timestamp") or datetime.utcnow().isoformat(),
+                    "device_id": device_id,
+                    "geofence_id": fid,
+                    "geofence_name": f["name"],
+                    "zone": f["zone"],
+                    "event": event,
+                    "latitude": lat,
+                    "longitude": lon
+                })
+        return events
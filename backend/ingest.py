@@ -0,0 +1,328 @@
+"""
+Group-commit ingest writer.
+
+Packets from /api/upload and the simulator are queued here and a single
+background thread writes them to SQLite in batches, one transaction per batch,
+so a burst of uploads costs one commit instead of one per packet.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from db import save_packets
+from state import DEFAULT_DEVICE_ID
+
+log = logging.getLogger("tracker")
+
+# Ingest settings (override via environment)
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.05"))  # seconds
+INGEST_OVERFLOW = os.getenv("INGEST_OVERFLOW", "block")  # block, drop_oldest or reject
+INGEST_BLOCK_TIMEOUT = float(os.getenv("INGEST_BLOCK_TIMEOUT", "2.0"))  # seconds
+INGEST_ACK = os.getenv("INGEST_ACK", "queued")  # queued or committed
+INGEST_ACK_TIMEOUT = float(os.getenv("INGEST_ACK_TIMEOUT", "10.0"))  # seconds
+
+MAX_DEVICE_ID_LENGTH = 64
+DEFAULT_RECEIVER_ID = "default"  # heartbeats from a receiver that does not name itself
+FLOAT_FIELDS = ("latitude", "longitude", "altitude", "speed", "battery", "temperature", "humidity")
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "reject")
+ACK_MODES = ("queued", "committed")
+
+
+class IngestQueueFull(Exception):
+    """Raised when a packet cannot be queued (reject policy or block timeout)"""
+
+
+class IngestWriteError(Exception):
+    """Raised to callers waiting on a commit when the batch write failed"""
+
+
+class IngestAckTimeout(Exception):
+    """Raised when the commit was not confirmed in time; the packets are still queued"""
+
+
+def parse_timestamp(value):
+    """Normalise a device timestamp (ISO 8601 or epoch seconds) to naive UTC ISO format"""
+    if isinstance(value, bool):
+        raise ValueError("invalid timestamp")
+    if isinstance(value, str):
+        try:
+            value = float(value)  # epoch seconds passed as text (e.g. query strings)
+        except ValueError:
+            pass
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.utcfromtimestamp(value).isoformat()
+        except (OverflowError, OSError):
+            raise ValueError("invalid timestamp")
+    if isinstance(value, str):
+        ts = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts.isoformat()
+    raise ValueError("invalid timestamp")
+
+
+def _clean_id(value, name):
+    """Validate an optional device/receiver id; returns None when absent"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value or len(value) > MAX_DEVICE_ID_LENGTH:
+        raise ValueError(f"invalid {name}")
+    return value
+
+
+def build_packet(data, keep_timestamp=False):
+    """Build the canonical hardware packet from an upload; raises ValueError if invalid"""
+    if not isinstance(data, dict) or "latitude" not in data or "longitude" not in data:
+        raise ValueError("missing lat/lon")
+    device_id = _clean_id(data.get("device_id"), "device_id")
+    # Gateway that forwarded the packet, and the tracker's frame counter if it sends one
+    receiver_id = _clean_id(data.get("receiver_id"), "receiver_id")
+    timestamp = datetime.utcnow().isoformat()
+    if keep_timestamp and data.get("timestamp") is not None:
+        timestamp = parse_timestamp(data["timestamp"])
+    try:
+        # Only the fields sent by the Arduino receiver should be required
+        packet = {
+            "device_id": device_id or DEFAULT_DEVICE_ID,
+            "timestamp": timestamp,
+            "receiver_id": receiver_id,
+            "seq": int(data["seq"]) if data.get("seq") is not None else None,
+            "latitude": float(data.get("latitude")),
+            "longitude": float(data.get("longitude")),
+            "altitude": float(data.get("altitude", 0.0)),
+            "speed": float(data.get("speed", 0.0)),
+            "satellites": int(data.get("satellites", 0)),
+            "battery": float(data.get("battery", 0.0)),
+            "rssi": int(data.get("rssi", 0)),
+            # These fields are not sent by the Arduino receiver, so we set defaults
+            "temperature": float(data.get("temperature", 0.0)),
+            "humidity": float(data.get("humidity", 0.0)),
+            "mode": "live",
+            "data_rate": 15,  # packets per minute
+            "packet_loss": int(data.get("packet_loss", 0)),
+            "latency": int(data.get("latency", 0))
+        }
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("invalid field value")
+    # float() takes "nan"/"inf", which would poison the stats and the map
+    if not all(math.isfinite(packet[k]) for k in FLOAT_FIELDS) \
+            or abs(packet["latitude"]) > 90 or abs(packet["longitude"]) > 180:
+        raise ValueError("invalid field value")
+    return packet
+
+
+def parse_batch(body):
+    """Decode a batch upload body (JSON array or NDJSON) into a list of items.
+
+    An NDJSON line that is not valid JSON becomes a ValueError in its place,
+    so one garbled line (e.g. radio noise) fails only that item. A JSON array
+    is all or nothing: an invalid one raises ValueError.
+    """
+    stripped = body.lstrip()
+    if stripped.startswith('['):
+        return json.loads(stripped)
+    # newline-delimited JSON, one packet per line
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(ValueError("invalid JSON"))
+    return items
+
+
+def build_heartbeat(data):
+    """Build a receiver status record from a heartbeat; raises ValueError if invalid"""
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    receiver_id = _clean_id(data.get("receiver_id"), "receiver_id") or DEFAULT_RECEIVER_ID
+    try:
+        return {
+            "receiver_id": receiver_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "latitude": float(data.get("latitude", 0)),
+            "longitude": float(data.get("longitude", 0)),
+            "signal_strength": int(data.get("signal_strength", 0)),
+            "is_online": 1
+        }
+    except (TypeError, ValueError):
+        raise ValueError("invalid field value")
+
+
+class _Ticket:
+    """Lets a caller wait until its packets have been committed"""
+    __slots__ = ("event", "error", "pending")
+
+    def __init__(self, pending=1):
+        self.event = threading.Event()
+        self.error = None
+        self.pending = pending
+
+    def wait(self, timeout=None):
+        if not self.event.wait(timeout):
+            raise IngestAckTimeout("Timed out waiting for commit")  # not a failure: don't resend
+        if isinstance(self.error, IngestQueueFull):
+            raise IngestQueueFull(str(self.error))  # dropped before the write, safe to retry
+        if self.error:
+            raise IngestWriteError(str(self.error))
+
+
+class IngestWriter:
+    def __init__(self, write_batch=save_packets, max_queue=INGEST_QUEUE_SIZE,
+                 batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 overflow=INGEST_OVERFLOW, block_timeout=INGEST_BLOCK_TIMEOUT):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {overflow}")
+        self.write_batch = write_batch
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+
+        self._items = deque()  # (packet, ticket or None)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        # Counters for monitoring
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Flush whatever is queued and stop the writer thread"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def depth(self):
+        return len(self._items)
+
+    def submit(self, packet, ack=INGEST_ACK, timeout=None):
+        """Queue one packet; with ack='committed' block until it is on disk"""
+        self.submit_many([packet], ack, timeout)
+
+    def submit_many(self, packets, ack=INGEST_ACK, timeout=None):
+        """Queue packets in order, all or none; with ack='committed' block until all are on disk"""
+        if ack not in ACK_MODES:
+            raise ValueError(f"Invalid ack mode: {ack}")
+        if not packets:
+            return
+        ticket = _Ticket(len(packets)) if ack == "committed" else None
+        with self._cond:
+            self._make_room(len(packets))
+            self._items.extend((packet, ticket) for packet in packets)
+            self.enqueued += len(packets)
+            self._cond.notify_all()
+        if ticket:
+            ticket.wait(INGEST_ACK_TIMEOUT if timeout is None else timeout)
+
+    def _make_room(self, n):
+        # Called with self._cond held. Room is made for the whole batch before any
+        # of it is queued, so a caller that gets IngestQueueFull can retry it all.
+        if n > self.max_queue:
+            self.rejected += n
+            raise IngestQueueFull("Batch is larger than the ingest queue")
+        if len(self._items) + n <= self.max_queue:
+            return
+        if self.overflow == "reject":
+            self.rejected += n
+            raise IngestQueueFull("Ingest queue is full")
+        if self.overflow == "drop_oldest":
+            while len(self._items) + n > self.max_queue:
+                _, old_ticket = self._items.popleft()
+                self.dropped += 1
+                if old_ticket:
+                    self._settle(old_ticket, IngestQueueFull("Dropped from full ingest queue"))
+            return
+        deadline = time.monotonic() + self.block_timeout
+        while len(self._items) + n > self.max_queue:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping:
+                self.rejected += n
+                raise IngestQueueFull("Ingest queue is full")
+            self._cond.wait(remaining)
+
+    @staticmethod
+    def _settle(ticket, error=None):
+        if error:
+            ticket.error = error
+        ticket.pending -= 1
+        if ticket.pending <= 0 or error:
+            ticket.event.set()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._items and not self._stopping:
+                self._cond.wait()
+            # Give the batch a short window to fill up before committing it
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._items) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self._items and len(batch) < self.batch_size:
+                batch.append(self._items.popleft())
+            self._cond.notify_all()  # wake producers blocked on a full queue
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stopping:
+                    return
+                continue
+            error = None
+            try:
+                self.write_batch([packet for packet, _ in batch])
+                self.written += len(batch)
+            except Exception as e:
+                error = e
+                self.errors += 1
+                log.exception("DB batch save error: %s", e)
+            self.batches += 1
+            with self._cond:
+                for _, ticket in batch:
+                    if ticket:
+                        self._settle(ticket, error)
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "queue_capacity": self.max_queue,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "errors": self.errors
+        }
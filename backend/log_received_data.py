@@ -2,94 +2,208 @@
 """
 Script to log data received by the backend from the Arduino receiver.
 This will create a file with timestamped entries of all GPS data received.
+
+The logger tails the packets table incrementally: it keeps one read
+connection open, only queries when `PRAGMA data_version` says another
+connection committed, and remembers the last logged packet id in a checkpoint
+file so a restart picks up exactly where it stopped. The log file is kept
+open with buffered writes and rotated (and gzip-compressed) by size or age.
 """
-import sqlite3
+import argparse
+import gzip
 import json
-from datetime import datetime
-import time
 import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
 
 DB_PATH = "lost_person_db.sqlite"
 LOG_FILE = "received_gps_data.log"
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+POLL_INTERVAL = 0.5     # seconds between data_version checks (no query when idle)
+FLUSH_INTERVAL = 1.0    # seconds; buffered lines are flushed at least this often
+BATCH_SIZE = 1000       # rows fetched per query while catching up
+ROTATE_BYTES = 10 * 1024 * 1024
+ROTATE_SECONDS = 24 * 3600
+KEEP_ROTATED = 10
+
+COLUMNS = "id, timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi, device_id, receiver_id"
+
+
+def format_text(row):
+    _, timestamp, lat, lon, alt, spd, sats, bat, rssi, device_id, receiver_id = row
+    # ID:/RX: as in the serial Key:Value frames; RX only for packets forwarded by a named gateway
+    rx = f", RX:{receiver_id}" if receiver_id is not None else ""
+    return (f"[{timestamp}] ID:{device_id}{rx}, LAT:{lat}, LON:{lon}, ALT:{alt}, SPD:{spd}, SAT:{sats}, "
+            f"BAT:{bat}, RSSI:{rssi}\n")
+
+
+def format_json(row):
+    return json.dumps(dict(zip(COLUMNS.split(", "), row)), separators=(",", ":")) + "\n"
+
+
+class RotatingLog:
+    """Append-only log file with buffered writes and size/age-based gzip rotation"""
+
+    def __init__(self, path, rotate_bytes=ROTATE_BYTES, rotate_seconds=ROTATE_SECONDS, keep=KEEP_ROTATED):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.keep = keep
+        self._open()
+
+    def _open(self):
+        self.file = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+        self.size = self.file.tell()
+        self.opened = time.time()
+        self.last_flush = time.monotonic()
+
+    def write_lines(self, lines):
+        data = "".join(lines)
+        self.file.write(data)
+        self.size += len(data.encode())  # bytes, not characters: device ids may be non-ASCII
+        if self.size >= self.rotate_bytes or time.time() - self.opened >= self.rotate_seconds:
+            self.rotate()
+
+    def flush(self):
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def rotate(self):
+        self.file.close()
+        if self.size > 0:
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            rotated = f"{self.path}.{stamp}.gz"
+            with open(self.path, "rb") as src, gzip.open(rotated, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+            self._prune()
+        self._open()
+
+    def _prune(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + "."
+        rotated = sorted(f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith(".gz"))
+        for name in rotated[:-self.keep] if self.keep else rotated:
+            os.remove(os.path.join(directory, name))
+
+    def close(self):
+        self.file.close()
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path, last_id):
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(str(last_id))
+    os.replace(tmp, path)
+
+
+def open_db(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def data_version(conn):
+    """Changes whenever another connection commits to the database"""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def select_columns(conn):
+    """COLUMNS, reading NULL for any the database lacks (not yet migrated by the backend)"""
+    present = {r[1] for r in conn.execute("PRAGMA table_info(packets)")}
+    return ", ".join(c if c in present else f"NULL AS {c}" for c in COLUMNS.split(", "))
+
+
+def fetch_after(conn, last_id, limit=BATCH_SIZE, columns=COLUMNS):
+    return conn.execute(f"SELECT {columns} FROM packets WHERE id > ? ORDER BY id LIMIT ?",
+                        (last_id, limit)).fetchall()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tail received GPS packets into a log file")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--log", default=LOG_FILE)
+    parser.add_argument("--format", choices=("text", "json"), default="text",
+                        help="text lines (default) or JSON lines")
+    parser.add_argument("--backfill", type=int, default=0,
+                        help="on first start (no checkpoint), also log the last N existing packets")
+    parser.add_argument("--rotate-mb", type=float, default=ROTATE_BYTES / (1024 * 1024))
+    parser.add_argument("--rotate-hours", type=float, default=ROTATE_SECONDS / 3600)
+    parser.add_argument("--keep", type=int, default=KEEP_ROTATED, help="rotated files to keep")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL)
+    return parser.parse_args()
 
-def get_latest_packets(limit=1000):
-    """Get the most recent packets from the database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi FROM packets ORDER BY id DESC LIMIT ?", (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
-
-def log_packets_to_file(packets, append=True):
-    """Log packets to a text file"""
-    mode = 'a' if append else 'w'
-    with open(LOG_FILE, mode) as f:
-        for packet in packets:
-            timestamp, lat, lon, alt, spd, sats, bat, rssi = packet
-            log_entry = f"[{timestamp}] LAT:{lat}, LON:{lon}, ALT:{alt}, SPD:{spd}, SAT:{sats}, BAT:{bat}, RSSI:{rssi}\n"
-            f.write(log_entry)
 
 def main():
+    args = parse_args()
+    formatter = format_json if args.format == "json" else format_text
+    checkpoint_path = args.log + CHECKPOINT_SUFFIX
+
     print("Starting GPS data logger...")
-    print(f"Logging to: {LOG_FILE}")
-    
-    # Create or clear the log file
-    if os.path.exists(LOG_FILE):
-        os.remove(LOG_FILE)
-    
-    # Record initial data
-    initial_packets = get_latest_packets(1000)
-    if initial_packets:
-        log_packets_to_file(initial_packets, append=False)
-        print(f"Logged {len(initial_packets)} existing packets to {LOG_FILE}")
+    print(f"Logging to: {args.log} ({args.format})")
+
+    conn = open_db(args.db)
+    last_id = load_checkpoint(checkpoint_path)
+    if last_id is None:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM packets").fetchone()[0]
+        last_id = max(0, max_id - args.backfill)
+        print(f"No checkpoint found, starting from packet ID: {last_id}")
     else:
-        print("No existing packets found in database")
-    
-    # Continuously monitor for new packets
-    last_id = 0
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(id) FROM packets")
-    result = cursor.fetchone()
-    if result[0]:
-        last_id = result[0]
-    conn.close()
-    
-    print(f"Starting monitoring from packet ID: {last_id}")
-    
-    while True:
-        try:
-            time.sleep(2)  # Check every 2 seconds
-            
-            # Get new packets since last check
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, timestamp, latitude, longitude, altitude, speed, satellites, battery, rssi FROM packets WHERE id > ? ORDER BY id", (last_id,))
-            new_packets = cursor.fetchall()
-            conn.close()
-            
-            if new_packets:
-                # Update last_id to the highest ID processed
-                last_id = max([p[0] for p in new_packets])
-                
-                # Extract just the data (without ID) for logging
-                packet_data = [p[1:] for p in new_packets]  # Skip the ID column
-                
-                log_packets_to_file(packet_data, append=True)
-                print(f"Logged {len(new_packets)} new packets. Last ID: {last_id}")
-                
-                # Print the most recent packet to console
-                if new_packets:
-                    _, timestamp, lat, lon, alt, spd, sats, bat, rssi = new_packets[-1]
-                    print(f"  Latest: [{timestamp}] LAT:{lat}, LON:{lon}, ALT:{alt}, SPD:{spd}, SAT:{sats}, BAT:{bat}, RSSI:{rssi}")
-        
-        except KeyboardInterrupt:
-            print("\nStopping GPS data logger...")
-            break
-        except Exception as e:
-            print(f"Error in logger: {e}")
-            time.sleep(5)  # Wait before retrying
+        print(f"Resuming from checkpoint, packet ID: {last_id}")
+
+    log = RotatingLog(args.log, int(args.rotate_mb * 1024 * 1024), args.rotate_hours * 3600, args.keep)
+    version = None
+    pending_checkpoint = False
+
+    try:
+        while True:
+            try:
+                current = data_version(conn)
+                if current != version:
+                    version = current
+                    columns = select_columns(conn)  # the backend may have migrated the table
+                    # Drain everything committed since the last check
+                    while True:
+                        rows = fetch_after(conn, last_id, columns=columns)
+                        if not rows:
+                            break
+                        log.write_lines([formatter(r) for r in rows])
+                        last_id = rows[-1][0]
+                        pending_checkpoint = True
+                        print(f"Logged {len(rows)} new packets. Last ID: {last_id}")
+                        if len(rows) < BATCH_SIZE:
+                            break
+
+                if pending_checkpoint and time.monotonic() - log.last_flush >= FLUSH_INTERVAL:
+                    # Checkpoint only what has actually reached the file
+                    log.flush()
+                    save_checkpoint(checkpoint_path, last_id)
+                    pending_checkpoint = False
+
+                time.sleep(args.poll)
+            except sqlite3.Error as e:
+                print(f"Error in logger: {e}")
+                time.sleep(5)  # Wait before retrying
+    except KeyboardInterrupt:
+        print("\nStopping GPS data logger...")
+    finally:
+        log.flush()
+        save_checkpoint(checkpoint_path, last_id)
+        log.close()
+        conn.close()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
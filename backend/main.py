@@ -1,10 +1,15 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import threading, time, json
+import atexit
+import hmac
+import logging
+import sys
 from datetime import datetime
 import random
 import math
 import os
+import numpy as np
 
 # Load environment variables
 try:
@@ -14,13 +19,31 @@ except ImportError:
     pass  # dotenv is optional
 
 # local modules
-from db import init_db, save_packet, get_latest, create_user, verify_user, get_user_by_id, save_receiver_status, get_last_receiver_status
+from db import init_db, close_db, save_packets, get_history, get_packets_after, get_latest_packet_id, iter_packets, packet_dict, PACKET_COLUMNS, create_user, verify_user, user_cache, save_receiver_status, get_receiver_statuses, update_packet_rssi
+from events import EventHub, format_event
+from state import LiveState, SIM_DEVICE_ID
+from shared_state import SharedLiveState, LIVE_STATE_SHARED
+from simplify import simplify_rows
+from recent import RecentHistory
+from assets import AssetCache
+from retention import RetentionWorker, init_rollups, get_rollups
+from tripstats import TripStats, init_trip_stats, haversine
+from metrics import registry
+from export import FORMATS, stream_export, gzip_stream
+from archive import Archive
+from gateways import DedupCache, ReceiverRegistry, NEW, UPGRADED
+from geofence import GeofenceEngine, init_geofences, validate_geofence, create_geofence, delete_geofence, list_geofences, save_events, get_events
+from ingest import IngestWriter, IngestQueueFull, IngestWriteError, IngestAckTimeout, INGEST_ACK, ACK_MODES, build_packet, build_heartbeat, parse_batch, parse_timestamp
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 
-# Config
-SERIAL_ENABLED = False
-SERIAL_PORT = "COM5"
-SERIAL_BAUD = 115200
+from serial_ingest import SerialReader, SERIAL_ENABLED, SERIAL_PORT, SERIAL_BAUD
+
+# LOG_LEVEL=DEBUG prints every received packet; the default keeps stdout quiet
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger("tracker")
+
+# /metrics needs a dashboard login, or this bearer token (scrapers carry no session)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='/')
 # Set a strong secret key for sessions
@@ -34,7 +57,34 @@ CORS(app,
      supports_credentials=True, 
      origins=allowed_origins.split(','),
      allow_headers=['Content-Type'],
-     methods=['GET', 'POST'])
+     expose_headers=['X-Next-Cursor'],
+     methods=['GET', 'POST', 'DELETE'])
+
+# --------------------------- METRICS --------------------------------
+http_requests = registry.counter("tracker_http_requests_total", "HTTP requests by route, method and status",
+                                 ("route", "method", "status"))
+http_duration = registry.histogram("tracker_http_request_duration_seconds", "HTTP request latency by route",
+                                   ("route", "method"))
+packets_received = registry.counter("tracker_packets_received_total", "Packets accepted by source and device",
+                                    ("source", "device"))
+heartbeats_received = registry.counter("tracker_receiver_heartbeats_total", "Receiver heartbeats accepted",
+                                       ("receiver",))
+gateway_packets = registry.counter("tracker_gateway_packets_total",
+                                   "Packets forwarded per receiver by dedup outcome (new, duplicate, upgraded)",
+                                   ("receiver", "outcome"))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_duration.observe(time.perf_counter() - start, route, request.method)
+        http_requests.inc(route, request.method, response.status_code)
+    return response
 
 # --------------------------- LOGIN MANAGER --------------------------
 login_manager = LoginManager()
@@ -49,7 +99,8 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    u = get_user_by_id(int(user_id))
+    # Served from an in-memory TTL cache; this runs on every authenticated request
+    u = user_cache.get(int(user_id))
     if u:
         return User(u["id"], u["username"], u["role"])
     return None
@@ -57,7 +108,7 @@ def load_user(user_id):
 # --------------------------- AUTH ROUTES ----------------------------
 @app.route('/login')
 def login_page():
-    return send_from_directory(app.static_folder, 'login.html')
+    return asset_cache.serve('login.html')
 
 @app.route('/api/login', methods=['POST'])
 def api_login():
@@ -78,15 +129,23 @@ def api_login():
 @app.route('/api/logout', methods=['POST'])
 @login_required
 def api_logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
     return jsonify({"success": True})
 
+@app.route('/api/cache_stats')
+@login_required
+def cache_stats():
+    """Hit/miss counters for the in-memory caches"""
+    return jsonify({
+        "users": user_cache.stats(),
+        "history": {"hits": recent_history.hits, "misses": recent_history.misses}
+    })
+
 @app.route('/api/set_data_source', methods=['POST'])
 @login_required
 def set_data_source():
     """Set preferred data source: simulated or hardware"""
-    global preferred_data_source, latest, latest_hardware, latest_simulated
-    
     try:
         data = request.get_json(force=True)
     except:
@@ -97,75 +156,240 @@ def set_data_source():
     if source not in ["simulated", "hardware"]:
         return jsonify({"success": False, "message": "Invalid source"}), 400
     
-    preferred_data_source = source
-    
-    # Immediately update latest with the preferred source
-    if source == "hardware" and latest_hardware:
-        latest = latest_hardware
-    elif source == "simulated":
-        latest = latest_simulated.copy()
-    
+    live_state.preferred_source = source
+
+    event_hub.publish("data", current_data())
+    event_hub.publish("base_station", current_base_station())
+
     return jsonify({"success": True, "source": source})
 
 # --------------------------- DATA UPLOAD ENDPOINT -------------------
-@app.route('/api/upload', methods=['POST'])
-def api_upload():
-    """Endpoint for hardware transmitter (GPS tracker) to upload data"""
+# Ingest logic is kept free of Flask so the asyncio front end (async_ingest.py)
+# runs exactly the same validation and hand-off; each returns (body, status).
+def drop_gateway_duplicates(packets, device_time=False):
+    """Packets no other gateway has delivered yet; only packets naming a receiver_id are checked.
+
+    `device_time` means the timestamps came from the tracker, so they are part of the fix.
+    """
+    fresh = []
+    for packet in packets:
+        receiver_id = packet.get("receiver_id")
+        if receiver_id is None:
+            fresh.append(packet)
+            continue
+        outcome, best, replaced = gateway_dedup.offer(packet, device_time)
+        receivers.packet(receiver_id, packet["rssi"], outcome)
+        gateway_packets.inc(receiver_id, outcome)
+        if outcome == NEW:
+            fresh.append(packet)
+        elif outcome == UPGRADED:
+            receivers.superseded(replaced["receiver_id"])
+            if best is not None:
+                # Same fix, stronger signal: the live copy now reports this gateway's RSSI
+                live_state.update(best, "hardware", count=0)
+    return fresh
+
+def ingest_packets(packets, ack=INGEST_ACK):
+    """Publish live hardware packets and queue them for the DB writer in one hand-off.
+
+    Returns the packets accepted; copies already delivered by another gateway are dropped.
+    IngestAckTimeout is raised after publishing: the packets are queued, not yet on disk.
+    """
+    packets = drop_gateway_duplicates(packets)
+    if not packets:
+        return packets
+    # Queue first: a packet the writer refuses (503/500) must not show up live either,
+    # nor be remembered as delivered, or the gateway's retry would be dropped as a duplicate
+    pending = None
     try:
-        data = request.get_json(force=True)
-    except:
-        return jsonify({"success": False, "message": "Invalid JSON"}), 400
+        ingest_writer.submit_many(packets, ack=ack)
+    except (IngestQueueFull, IngestWriteError):
+        gateway_dedup.discard(packets)
+        raise
+    except IngestAckTimeout as e:
+        pending = e  # still queued, so accepted like ack=queued
+    packets = gateway_dedup.accept(packets)  # a stronger copy may have arrived meanwhile
 
-    # minimal validation
-    if not data or "latitude" not in data or "longitude" not in data:
-        return jsonify({"success": False, "message": "missing lat/lon"}), 400
+    for packet in packets:
+        # Store as hardware data (also marks hardware as connected)
+        live_state.update(packet, "hardware")
+        packets_received.inc("hardware", packet["device_id"])
+
+        event_hub.publish("hardware", packet)
+        if live_state.preferred_source == "hardware":
+            event_hub.publish("data", packet)
+    apply_geofences(packets)
+    if pending:
+        raise pending
+    return packets
+
+def accept_upload(data, ack=INGEST_ACK):
+    """Validate one hardware packet, publish it and queue it for the DB writer"""
+    # Callers that need durability can ask to wait for the commit with ?ack=committed
+    if ack not in ACK_MODES:
+        return {"success": False, "message": "Invalid ack mode"}, 400
 
-    # Mark hardware as connected
-    global last_hardware_update, latest, latest_hardware
-    last_hardware_update = datetime.utcnow()
-    
     # build canonical packet (backend timestamp preferred)
-    # Only the fields sent by the Arduino receiver should be required
-    packet = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "latitude": float(data.get("latitude")),
-        "longitude": float(data.get("longitude")),
-        "altitude": float(data.get("altitude", 0.0)),
-        "speed": float(data.get("speed", 0.0)),
-        "satellites": int(data.get("satellites", 0)),
-        "battery": float(data.get("battery", 0.0)),
-        "rssi": int(data.get("rssi", 0)),
-        # These fields are not sent by the Arduino receiver, so we set defaults
-        "temperature": float(data.get("temperature", 0.0)),
-        "humidity": float(data.get("humidity", 0.0)),
-        "mode": "live",
-        "data_rate": 15,  # packets per minute
-        "packet_loss": int(data.get("packet_loss", 0)),
-        "latency": int(data.get("latency", 0))
+    try:
+        packet = build_packet(data)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+
+    try:
+        if not ingest_packets([packet], ack=ack):
+            return {"success": True, "duplicate": True}, 200
+    except IngestQueueFull:
+        return {"success": False, "message": "Server busy, retry later"}, 503
+    except IngestWriteError as e:
+        log.exception("DB save error: %s", e)
+        return {"success": False, "message": "Database error"}, 500
+    except IngestAckTimeout:
+        # Accepted and queued, but not confirmed on disk: a retry would store it twice
+        return {"success": True, "queued": True}, 202
+
+    # Log received data for debugging (LOG_LEVEL=DEBUG)
+    log.debug("Received packet: LAT=%s, LON=%s, ALT=%s, SPD=%s, SAT=%s, BAT=%s, RSSI=%s",
+              packet['latitude'], packet['longitude'], packet['altitude'], packet['speed'],
+              packet['satellites'], packet['battery'], packet['rssi'])
+
+    return {"success": True}, 200
+
+UPLOAD_BATCH_MAX = int(os.getenv("UPLOAD_BATCH_MAX", "5000"))
+
+def accept_batch(body):
+    """Validate and commit a batch upload body (JSON array or NDJSON), device timestamps kept"""
+    try:
+        items = parse_batch(body)
+    except ValueError:
+        return {"success": False, "message": "Invalid JSON"}, 400
+
+    if not items:
+        return {"success": False, "message": "Empty batch"}, 400
+    if len(items) > UPLOAD_BATCH_MAX:
+        return {"success": False, "message": f"Batch too large (max {UPLOAD_BATCH_MAX})"}, 413
+
+    packets = []
+    results = []
+    duplicates = 0
+    for i, item in enumerate(items):
+        try:
+            if isinstance(item, ValueError):
+                raise item  # line that did not parse
+            packet = build_packet(item, keep_timestamp=True)
+        except ValueError as e:
+            results.append({"index": i, "success": False, "message": str(e)})
+            continue
+        # A stationary tracker's backlog repeats its payload; only the device time tells fixes apart
+        if drop_gateway_duplicates([packet], device_time=item.get("timestamp") is not None):
+            packets.append(packet)
+            results.append({"index": i, "success": True})
+        else:
+            duplicates += 1
+            results.append({"index": i, "success": True, "duplicate": True})
+
+    queued = False
+    if packets:
+        # Through the writer like any upload (one writer thread), waiting for the commit
+        try:
+            ingest_writer.submit_many(packets, ack="committed")
+        except IngestQueueFull:
+            gateway_dedup.discard(packets)
+            return {"success": False, "message": "Server busy, retry later"}, 503
+        except IngestWriteError as e:
+            log.exception("DB batch save error: %s", e)
+            gateway_dedup.discard(packets)
+            return {"success": False, "message": "Database error"}, 500
+        except IngestAckTimeout:
+            queued = True  # still queued: don't invite a resend that would store it twice
+        packets = gateway_dedup.accept(packets)
+
+        # Replay fixes in time order so enter/exit transitions come out in sequence
+        apply_geofences(sorted(packets, key=lambda p: p["timestamp"]))
+
+        # Newest fix per device becomes that device's live position
+        newest, counts = {}, {}
+        for packet in packets:
+            device_id = packet["device_id"]
+            counts[device_id] = counts.get(device_id, 0) + 1
+            current = newest.get(device_id)
+            if current is None or packet["timestamp"] >= current["timestamp"]:
+                newest[device_id] = packet
+        for device_id, packet in newest.items():
+            packets_received.inc("hardware", device_id, amount=counts[device_id])
+            if live_state.update(packet, "hardware", counts[device_id]):
+                event_hub.publish("hardware", packet)
+                if live_state.preferred_source == "hardware" and live_state.latest_hardware() is packet:
+                    event_hub.publish("data", packet)
+
+    rejected = len(items) - len(packets) - duplicates
+    body = {
+        "success": rejected == 0,
+        "accepted": len(packets),
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "results": results
     }
+    if queued:
+        body["queued"] = True
+        return body, 202
+    return body, 200
 
-    # Store as hardware data
-    latest_hardware = packet
-    
-    # Update global latest if hardware is preferred
-    if preferred_data_source == "hardware":
-        latest = packet
-    
+def accept_heartbeat(data):
+    """Record a receiver (base station) location/status report"""
     try:
-        save_packet(packet)
+        receiver_data = build_heartbeat(data)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+
+    # Latest heartbeat from any receiver is the base station shown in hardware mode
+    live_state.receiver_location = receiver_data
+    receivers.heartbeat(receiver_data)
+    heartbeats_received.inc(receiver_data["receiver_id"])
+    if live_state.preferred_source == "hardware":
+        event_hub.publish("base_station", receiver_data)
+
+    try:
+        save_receiver_status(receiver_data)
     except Exception as e:
-        print("DB save error:", e)
-        return jsonify({"success": False, "message": "Database error"}), 500
+        log.exception("Receiver status save error: %s", e)
+        return {"success": False, "message": "Database error"}, 500
 
-    # Log received data for debugging
-    print(f"Received packet: LAT={packet['latitude']}, LON={packet['longitude']}, "
-          f"ALT={packet['altitude']}, SPD={packet['speed']}, SAT={packet['satellites']}, "
-          f"BAT={packet['battery']}, RSSI={packet['rssi']}")
+    return {"success": True}, 200
 
-    return jsonify({"success": True})
+@app.route('/api/upload', methods=['POST'])
+def api_upload():
+    """Endpoint for hardware transmitter (GPS tracker) to upload data"""
+    try:
+        data = request.get_json(force=True)
+    except:
+        return jsonify({"success": False, "message": "Invalid JSON"}), 400
+    body, status = accept_upload(data, request.args.get("ack", INGEST_ACK))
+    return jsonify(body), status
+
+@app.route('/api/upload_batch', methods=['POST'])
+def api_upload_batch():
+    """Bulk upload for store-and-forward receivers: JSON array or NDJSON, device timestamps kept"""
+    body, status = accept_batch(request.get_data(as_text=True))
+    return jsonify(body), status
+
+# --------------------------- LIVE STATE ----------------------------
+HARDWARE_TIMEOUT = 10  # seconds
+
+init_db()
+init_rollups()
+init_geofences()
+init_trip_stats()
+atexit.register(close_db)
 
-# --------------------------- GLOBAL LATEST PACKET -------------------
-latest = {
+# Latest packet per device, data source preference and receiver location;
+# with LIVE_STATE_SHARED=1 it is mirrored through SQLite for multiple workers
+if LIVE_STATE_SHARED:
+    live_state = SharedLiveState()
+    atexit.register(live_state.stop)  # runs before close_db, flushing pending updates
+else:
+    live_state = LiveState()
+live_state.update({
+    "device_id": SIM_DEVICE_ID,
     "timestamp": datetime.utcnow().isoformat(),
     "latitude": 12.9692,   # VIT Vellore SJT default
     "longitude": 79.1559,  # VIT Vellore SJT default
@@ -180,27 +404,97 @@ latest = {
     "latency": 25,
     "temperature": 0.0,    # Not sent by Arduino but included for schema consistency
     "humidity": 0.0        # Not sent by Arduino but included for schema consistency
-}
+}, "simulated")
 
-last_hardware_update = None
-HARDWARE_TIMEOUT = 10  # seconds
+# Several gateways may forward the same transmission: store it once, keeping the
+# strongest copy; per-receiver status and reception counters live in memory
+gateway_dedup = DedupCache(update_packet_rssi, shared=LIVE_STATE_SHARED)
+receivers = ReceiverRegistry()
+receivers.load(get_receiver_statuses())
 
-# Data source preference (per-session or global)
-preferred_data_source = "simulated"  # "simulated" or "hardware"
+# Live updates pushed to dashboards over /stream
+event_hub = EventHub()
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments
+SSE_RETRY_MS = 3000  # browser reconnect delay
 
-# Storage for latest hardware and simulated data
-latest_hardware = None
-latest_simulated = latest.copy()
+def publish_remote_changes(updates, settings):
+    """Shared state picked up another worker's changes: push them to this worker's streams"""
+    preferred = live_state.preferred_source
+    for source, packet in updates:
+        if source == "hardware":
+            event_hub.publish("hardware", packet)
+        if source == preferred:
+            event_hub.publish("data", packet)
+    if settings:
+        event_hub.publish("data", current_data())
+        event_hub.publish("base_station", current_base_station())
 
-# Hardware receiver (base station) location - separate from transmitter
-hardware_receiver_location = None
+if LIVE_STATE_SHARED:
+    live_state.on_change = publish_remote_changes
 
-init_db()
+
+# Geofences compiled to arrays and checked against every incoming fix
+geofence_engine = GeofenceEngine()
+geofence_engine.reload()
+
+def apply_geofences(packets):
+    """Evaluate packets against the geofences; record and publish enter/exit events"""
+    events = []
+    for packet in packets:
+        events.extend(geofence_engine.evaluate(packet))
+    if not events:
+        return events
+    for event in events:
+        event_hub.publish("geofence", event)
+    try:
+        save_events(events)
+    except Exception as e:
+        log.exception("Geofence event save error: %s", e)
+    return events
+
+# Newest packets kept in memory for the common /history reads
+# (other workers' inserts are detected through the newest packet id when shared)
+recent_history = RecentHistory(lambda device_id, limit: get_history(limit=limit, device_id=device_id)[0],
+                               latest_id=get_latest_packet_id if LIVE_STATE_SHARED else None)
+recent_history.warm()
+
+# Sealed per-day columnar segments for analytics over long periods
+archive = Archive()
+
+def seal_archive():
+    """Retention pre-pass; returns the bound of raw rows that are safe to delete"""
+    sealed = archive.seal_pending()
+    if sealed:
+        log.info("Archived days: %s", ", ".join(sealed))
+    return archive.retention_bound()
+
+# Per-device distance/time/battery aggregates, updated as packets are committed
+trip_stats = TripStats()
+trip_stats.load()
+
+def persist_packets(packets):
+    """Commit packets in one transaction and feed the in-memory recent history and trip stats"""
+    rows = save_packets(packets)
+    recent_history.add(rows)
+    try:
+        gateway_dedup.committed(packets, rows)
+    except Exception as e:
+        log.exception("Gateway RSSI update error: %s", e)
+    try:
+        trip_stats.add(packets)
+    except Exception as e:
+        log.exception("Trip stats update error: %s", e)
+    return rows
+
+# Batched writer shared by /api/upload and the simulator
+ingest_writer = IngestWriter(persist_packets)
+ingest_writer.start()
+atexit.register(ingest_writer.stop)  # runs before close_db, flushing the queue
 
 # --------------------------- SIM GENERATOR ---------------------------
+sim_thread = None  # started from __main__
+serial_reader = None  # started from __main__ when SERIAL_ENABLED
 def sim_generator():
-    global latest, latest_simulated, last_hardware_update, preferred_data_source
-    
     # Start near VIT Vellore SJT with slight offset
     lat = 12.9692 + random.uniform(-0.002, 0.002)  # Within VIT campus
     lon = 79.1559 + random.uniform(-0.002, 0.002)
@@ -226,6 +520,7 @@ def sim_generator():
         packet_count += 1
 
         data = {
+            "device_id": SIM_DEVICE_ID,
             "timestamp": datetime.utcnow().isoformat(),
             "latitude": round(lat, 6),
             "longitude": round(lon, 6),
@@ -244,45 +539,316 @@ def sim_generator():
         }
 
         # Store simulated data
-        latest_simulated = data
-        
-        # Update global latest only if simulated is preferred
-        if preferred_data_source == "simulated":
-            latest = data
-            save_packet(data)
+        live_state.update(data, "simulated")
+        packets_received.inc("simulated", SIM_DEVICE_ID)
+
+        # Publish and persist only if simulated is preferred
+        if live_state.preferred_source == "simulated":
+            event_hub.publish("data", data)
+            apply_geofences([data])
+            try:
+                # Never wait on the commit here: a write error would kill this thread
+                ingest_writer.submit(data, ack="queued")
+            except IngestQueueFull:
+                log.warning("Ingest queue full, dropping simulated packet")
         
         time.sleep(2.5)  # Match the Arduino transmitter interval of 2.5 seconds
 
 # --------------------------- PROTECTED API ---------------------------
+def current_data():
+    # Return data based on the preferred source
+    return live_state.current()
+
+def versioned_response(body, version):
+    """JSON response tagged with a live-state version; 304 if the client already holds it"""
+    etag = f"{live_state.epoch}-{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(body)
+    response.set_etag(etag)
+    response.headers['X-State-Version'] = str(version)
+    # Always revalidate, so browsers send If-None-Match on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/data')
 @login_required
 def get_data():
-    # Return data based on the preferred source
-    if preferred_data_source == "hardware" and latest_hardware:
-        return jsonify(latest_hardware)
-    else:
-        return jsonify(latest)
+    device_id = request.args.get('device')
+    if device_id:
+        packet, version = live_state.get_versioned(device_id)
+        if not packet:
+            return jsonify({"success": False, "message": "Unknown device"}), 404
+        return versioned_response(packet, version)
+    packet, version = live_state.current_versioned()
+    return versioned_response(packet, version)
+
+@app.route('/devices')
+@login_required
+def devices():
+    """List every device seen since startup with its latest fix"""
+    return jsonify(live_state.devices())
 
 @app.route('/data/latest_hardware')
 @login_required
 def get_latest_hardware():
     """Return only the latest hardware data, or empty if none available"""
-    if latest_hardware:
-        return jsonify(latest_hardware)
+    device_id = request.args.get('device')
+    packet, version = live_state.get_versioned(device_id) if device_id else live_state.latest_hardware_versioned()
+    if packet:
+        return versioned_response(packet, version)
     else:
         return jsonify({}), 204  # No Content
 
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "5000"))
+HISTORY_SIMPLIFY_MAX_ROWS = int(os.getenv("HISTORY_SIMPLIFY_MAX_ROWS", "200000"))
+
+def parse_bbox(value):
+    """Decode ?bbox=minLat,minLon,maxLat,maxLon"""
+    parts = [float(v) for v in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox needs minLat,minLon,maxLat,maxLon")
+    min_lat, min_lon, max_lat, max_lon = parts
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox min must not exceed max")
+    return min_lat, min_lon, max_lat, max_lon
+
+def parse_cursor(value):
+    """Decode a /history cursor ("<timestamp>,<id>") into a (timestamp, id) tuple"""
+    timestamp, _, packet_id = value.rpartition(',')
+    if not timestamp:
+        raise ValueError("invalid cursor")
+    return timestamp, int(packet_id)
+
 @app.route('/history')
 @login_required
 def history():
-    n = int(request.args.get('n', 100))
-    rows = get_latest(n)
+    """Newest-first packet history; page with ?cursor= from the X-Next-Cursor header.
+
+    ?bbox=minLat,minLon,maxLat,maxLon restricts results to an area (R*Tree backed).
+    With ?max_points= and/or ?tolerance= (metres) the whole selected range is
+    downsampled server-side: Douglas-Peucker on the track by default, or LTTB
+    on ?series=rssi|battery|altitude|speed. Without ?device= each device is
+    simplified separately (?max_points= per device, HISTORY_MAX_LIMIT at most
+    and by default).
+
+    ?after_id= is delta mode for pollers: only packets stored after that id,
+    oldest first; X-Next-After-Id is set when a full page came back.
+    """
+    args = request.args
+    if args.get('after_id'):
+        try:
+            after_id = int(args['after_id'])
+            limit = max(1, min(int(args.get('limit', HISTORY_MAX_LIMIT)), HISTORY_MAX_LIMIT))
+        except ValueError as e:
+            return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+        rows = get_packets_after(after_id, limit, args.get('device') or None)
+        response = jsonify(rows)
+        if len(rows) == limit:
+            response.headers['X-Next-After-Id'] = str(rows[-1]["id"])
+        return response
+
+    try:
+        limit = int(args.get('limit', args.get('n', 100)))
+        since = parse_timestamp(args['since']) if args.get('since') else None
+        until = parse_timestamp(args['until']) if args.get('until') else None
+        cursor = parse_cursor(args['cursor']) if args.get('cursor') else None
+        device_id = args.get('device') or None
+        bbox = parse_bbox(args['bbox']) if args.get('bbox') else None
+        max_points = int(args['max_points']) if args.get('max_points') else None
+        tolerance = float(args['tolerance']) if args.get('tolerance') else None
+        series = args.get('series', 'track')
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+
+    if max_points is not None or tolerance is not None:
+        # A tolerance alone could keep every scanned row, so the page cap still applies
+        max_points = max(2, min(max_points or HISTORY_MAX_LIMIT, HISTORY_MAX_LIMIT))
+        rows, next_cursor = get_history(since, until, cursor, HISTORY_SIMPLIFY_MAX_ROWS, device_id,
+                                        raw=True, bbox=bbox)
+        try:
+            rows = simplify_rows(rows, PACKET_COLUMNS.split(", "), series, max_points, tolerance)
+        except ValueError as e:
+            return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+        rows = [packet_dict(r) for r in rows]
+    else:
+        limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+        rows = None
+        if since is None and until is None and cursor is None and bbox is None:
+            # Plain "latest N" read: serve from memory when the buffer covers it
+            rows = recent_history.get(limit, device_id)
+            if rows is not None:
+                next_cursor = (rows[-1]["timestamp"], rows[-1]["id"]) if len(rows) == limit else None
+        if rows is None:
+            rows, next_cursor = get_history(since, until, cursor, limit, device_id, bbox=bbox)
+    response = jsonify(rows)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = f"{next_cursor[0]},{next_cursor[1]}"
+    return response
+
+@app.route('/history/rollup')
+@login_required
+def history_rollup():
+    """Per-minute or per-hour aggregates kept after raw packets age out"""
+    args = request.args
+    try:
+        since = parse_timestamp(args['since']) if args.get('since') else None
+        until = parse_timestamp(args['until']) if args.get('until') else None
+        limit = max(1, min(int(args.get('limit', 1000)), HISTORY_MAX_LIMIT))
+        rows = get_rollups(args.get('resolution', 'hour'), since, until, args.get('device') or None, limit)
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
     return jsonify(rows)
 
+# --------------------------- GEOFENCES -----------------------------
+@app.route('/api/geofences', methods=['GET'])
+@login_required
+def geofences():
+    """List geofences with each device's current membership"""
+    return jsonify({"geofences": list_geofences(), "membership": geofence_engine.membership()})
+
+@app.route('/api/geofences', methods=['POST'])
+@login_required
+def add_geofence():
+    """Create a polygon ({"points": [[lat, lon], ...]}) or circle ({"center": [lat, lon], "radius_m": r}) fence"""
+    try:
+        data = request.get_json(force=True)
+    except:
+        return jsonify({"success": False, "message": "Invalid JSON"}), 400
+    try:
+        fence = validate_geofence(data)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    fence_id = create_geofence(*fence)
+    geofence_engine.reload()
+    return jsonify({"success": True, "id": fence_id}), 201
+
+@app.route('/api/geofences/<int:fence_id>', methods=['DELETE'])
+@login_required
+def remove_geofence(fence_id):
+    if not delete_geofence(fence_id):
+        return jsonify({"success": False, "message": "Unknown geofence"}), 404
+    geofence_engine.reload()
+    return jsonify({"success": True})
+
+@app.route('/api/geofence_events')
+@login_required
+def geofence_events():
+    """Newest-first enter/exit events, optionally ?since= and ?device="""
+    args = request.args
+    try:
+        since = parse_timestamp(args['since']) if args.get('since') else None
+        limit = max(1, min(int(args.get('limit', 100)), HISTORY_MAX_LIMIT))
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+    return jsonify(get_events(since, args.get('device') or None, limit))
+
+@app.route('/api/stats')
+@login_required
+def stats():
+    """Running trip statistics per device (or ?device=), answered from memory"""
+    device_id = request.args.get('device')
+    if not device_id:
+        return jsonify(trip_stats.get())
+    s = trip_stats.get(device_id)
+    if s is None:
+        return jsonify({"success": False, "message": "Unknown device"}), 404
+    base = current_base_station()
+    if s["last_latitude"] is not None and s["last_longitude"] is not None:
+        s["distance_from_base_m"] = haversine(base["latitude"], base["longitude"],
+                                              s["last_latitude"], s["last_longitude"])
+    return jsonify(s)
+
+@app.route('/export')
+@login_required
+def export():
+    """Stream ?since=&until=&device= packets as ?format=csv|gpx|geojson (gzip if accepted)"""
+    args = request.args
+    fmt = args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({"success": False, "message": "format must be csv, gpx or geojson"}), 400
+    try:
+        since = parse_timestamp(args['since']) if args.get('since') else None
+        until = parse_timestamp(args['until']) if args.get('until') else None
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+    device_id = args.get('device') or None
+
+    mimetype, extension = FORMATS[fmt]
+    rows = iter_packets(since, until, device_id, by_device=(fmt == 'gpx'))
+    body = stream_export(fmt, rows)
+    headers = {
+        'Content-Disposition': f'attachment; filename="track_export.{extension}"',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.accept_encodings['gzip'] and args.get('gzip', '1') != '0':
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/archive/segments')
+@login_required
+def archive_segments():
+    """Sealed archive segments with their min/max index"""
+    return jsonify({"stats": archive.stats(), "segments": [s.meta for s in archive.segments()]})
+
+ARCHIVE_NUMERIC = ("latitude", "longitude", "altitude", "speed", "satellites", "battery", "rssi")
+
+@app.route('/archive/query')
+@login_required
+def archive_query():
+    """Scan the columnar archive: summary stats over every match plus the first ?limit= rows"""
+    args = request.args
+    try:
+        since = parse_timestamp(args['since']) if args.get('since') else None
+        until = parse_timestamp(args['until']) if args.get('until') else None
+        bbox = parse_bbox(args['bbox']) if args.get('bbox') else None
+        limit = max(0, min(int(args.get('limit', 1000)), HISTORY_MAX_LIMIT))
+        columns = args['columns'].split(',') if args.get('columns') else ['timestamp', 'latitude', 'longitude']
+        unknown = set(columns) - set(ARCHIVE_NUMERIC) - {'id', 'timestamp', 'device'}
+        if unknown:
+            raise ValueError(f"unknown column(s) {', '.join(sorted(unknown))}")
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+
+    result = archive.query(since, until, bbox, args.get('device') or None, columns)
+    rows = len(next(iter(result.values()))) if result else 0
+    stats = {}
+    for c in columns:
+        if c in ARCHIVE_NUMERIC and rows:
+            values = result[c][~np.isnan(result[c])]
+            if len(values):
+                stats[c] = {"min": float(values.min()), "max": float(values.max()),
+                            "mean": float(values.mean())}
+            else:
+                stats[c] = {"min": None, "max": None, "mean": None}  # all NULL: NaN is not valid JSON
+    data = {}
+    for c in columns:
+        head = result[c][:limit]
+        if c == 'timestamp':
+            data[c] = [str(t) for t in head]
+        elif c == 'device':
+            data[c] = list(head)
+        else:
+            data[c] = [None if v != v else v for v in head.tolist()]  # NaN -> null
+    return jsonify({"rows": rows, "stats": stats, "data": data})
+
 @app.route('/receiver_status')
 @login_required
 def receiver_status():
-    status = get_last_receiver_status()
+    """Latest heartbeat from any receiver, or from one with ?receiver="""
+    receiver_id = request.args.get('receiver')
+    if receiver_id:
+        status = receivers.status(receiver_id)
+        if not status:
+            return jsonify({"success": False, "message": "Unknown receiver"}), 404
+        return jsonify(status)
+    status, version = live_state.receiver_versioned()
+    if status:
+        # Latest heartbeat, as also saved to receiver_status
+        return versioned_response(status, version)
+    status = receivers.status()  # loaded from the DB at startup
     if not status:
         # Return a safe default (offline at SJT) instead of 404 so the UI can render
         status = {
@@ -294,24 +860,74 @@ def receiver_status():
         }
     return jsonify(status)
 
+@app.route('/receivers')
+@login_required
+def receiver_list():
+    """Every known receiver with its latest heartbeat and reception counters"""
+    return jsonify(receivers.summaries())
+
+def current_base_station():
+    receiver_location = live_state.receiver_location
+    if live_state.preferred_source == "hardware" and receiver_location:
+        # Actual hardware receiver location
+        return receiver_location
+    # Fixed VIT SJT location for simulated mode
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "latitude": 12.9692,   # VIT Vellore SJT (fixed for simulation)
+        "longitude": 79.1559,  # VIT Vellore SJT (fixed for simulation)
+        "signal_strength": -65,
+        "is_online": 1
+    }
+
 @app.route('/api/base_station_location')
 @login_required
 def base_station_location():
     """Get base station (receiver) location based on current mode"""
-    global hardware_receiver_location, preferred_data_source
-    
-    if preferred_data_source == "hardware" and hardware_receiver_location:
-        # Return actual hardware receiver location
-        return jsonify(hardware_receiver_location)
-    else:
-        # Return fixed VIT SJT location for simulated mode
-        return jsonify({
-            "timestamp": datetime.utcnow().isoformat(),
-            "latitude": 12.9692,   # VIT Vellore SJT (fixed for simulation)
-            "longitude": 79.1559,  # VIT Vellore SJT (fixed for simulation)
-            "signal_strength": -65,
-            "is_online": 1
-        })
+    return jsonify(current_base_station())
+
+@app.route('/stream')
+@login_required
+def stream():
+    """Server-Sent Events push of live data, hardware packets and base station updates"""
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id', ''))
+    except ValueError:
+        last_id = None
+
+    def snapshot():
+        cursor = event_hub.last_id
+        messages = [format_event("data", current_data(), cursor)]
+        latest_hardware = live_state.latest_hardware()
+        if latest_hardware:
+            messages.append(format_event("hardware", latest_hardware, cursor))
+        messages.append(format_event("base_station", current_base_station(), cursor))
+        return cursor, messages
+
+    def generate(cursor):
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        if cursor is None or not event_hub.can_resume(cursor):
+            # Fresh client (or history gap): send the current state first
+            cursor, messages = snapshot()
+            yield from messages
+        while True:
+            events = event_hub.wait(cursor, SSE_KEEPALIVE)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            if events[0][0] > cursor + 1:
+                # This client fell more than EVENT_HISTORY events behind and some are
+                # gone: tell it, then start over from the current state
+                cursor, messages = snapshot()
+                yield format_event("resync", {"last_event_id": cursor}, cursor)
+                yield from messages
+                continue
+            for event_id, message in events:
+                yield message
+                cursor = event_id
+
+    return Response(generate(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/receiver_heartbeat', methods=['POST'])
 def receiver_heartbeat():
@@ -320,37 +936,110 @@ def receiver_heartbeat():
         data = request.get_json(force=True)
     except:
         return jsonify({"success": False, "message": "Invalid JSON"}), 400
+    body, status = accept_heartbeat(data)
+    return jsonify(body), status
 
-    receiver_data = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "latitude": float(data.get("latitude", 0)),
-        "longitude": float(data.get("longitude", 0)),
-        "signal_strength": int(data.get("signal_strength", 0)),
-        "is_online": 1
-    }
+# --------------------------- METRICS ENDPOINT -----------------------
+def seconds_since(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return (datetime.utcnow() - timestamp).total_seconds() if timestamp else None
 
-    # Store receiver data globally for hardware mode
-    global hardware_receiver_location
-    hardware_receiver_location = receiver_data
+def last_packet_ages():
+    return {(d["device_id"], d["source"]): seconds_since(d["last_seen"]) for d in live_state.devices()}
 
-    try:
-        save_receiver_status(receiver_data)
-    except Exception as e:
-        print("Receiver status save error:", e)
-        return jsonify({"success": False, "message": "Database error"}), 500
+def hardware_connected():
+    age = seconds_since(live_state.last_hardware_update)
+    return {(): int(age is not None and age < HARDWARE_TIMEOUT)}
 
-    return jsonify({"success": True})
+registry.gauge("tracker_device_last_packet_age_seconds", "Seconds since each device's last packet",
+               ("device", "source"), fn=last_packet_ages)
+registry.gauge("tracker_hardware_timeout_seconds", "Age after which hardware counts as disconnected",
+               fn=lambda: {(): HARDWARE_TIMEOUT})
+registry.gauge("tracker_hardware_connected", "1 if a hardware packet arrived within HARDWARE_TIMEOUT",
+               fn=hardware_connected)
+registry.gauge("tracker_receiver_last_heartbeat_age_seconds", "Seconds since each receiver's last heartbeat",
+               ("receiver",), fn=lambda: {(r["receiver_id"],): seconds_since(r["status"]["timestamp"])
+                                          for r in receivers.summaries() if r["status"]})
+registry.gauge("tracker_gateway_dedup_entries", "Packets remembered for cross-gateway deduplication",
+               fn=lambda: {(): len(gateway_dedup)})
+registry.gauge("tracker_data_source", "Preferred data source (1 = active)", ("source",),
+               fn=lambda: {(s,): int(live_state.preferred_source == s) for s in ("simulated", "hardware")})
+registry.gauge("tracker_simulator_running", "1 while the simulator thread is alive",
+               fn=lambda: {(): int(sim_thread is not None and sim_thread.is_alive())})
+registry.gauge("tracker_ingest_queue_depth", "Packets waiting for the DB writer",
+               fn=lambda: {(): ingest_writer.depth()})
+registry.gauge("tracker_ingest_queue_capacity", "DB writer queue capacity",
+               fn=lambda: {(): ingest_writer.max_queue})
+registry.counter("tracker_ingest_packets_total", "DB writer packet outcomes", ("outcome",),
+                 fn=lambda: {(k,): v for k, v in ingest_writer.stats().items()
+                             if k in ("enqueued", "written", "dropped", "rejected")})
+registry.counter("tracker_ingest_batches_total", "DB writer batches committed",
+                 fn=lambda: {(): ingest_writer.batches})
+registry.counter("tracker_ingest_errors_total", "DB writer batches that failed",
+                 fn=lambda: {(): ingest_writer.errors})
+registry.gauge("tracker_serial_connected", "1 while the serial receiver port is open",
+               fn=lambda: {(): int(serial_reader.connected)} if serial_reader else {})
+registry.counter("tracker_serial_frames_total", "Serial receiver frames by outcome", ("outcome",),
+                 fn=lambda: {(k,): v for k, v in serial_reader.stats().items() if k != "lines"}
+                 if serial_reader else {})
+registry.counter("tracker_serial_reconnects_total", "Serial port reopen attempts",
+                 fn=lambda: {(): serial_reader.reconnects} if serial_reader else {})
+registry.counter("tracker_stream_events_total", "Events published to /stream",
+                 fn=lambda: {(): event_hub.last_id})
+registry.counter("tracker_cache_hits_total", "In-memory cache hits", ("cache",),
+                 fn=lambda: {("users",): user_cache.hits, ("history",): recent_history.hits})
+registry.counter("tracker_cache_misses_total", "In-memory cache misses", ("cache",),
+                 fn=lambda: {("users",): user_cache.misses, ("history",): recent_history.misses})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of request, DB, ingest and device metrics"""
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                           f"Bearer {METRICS_TOKEN}")
+    if not (token_ok or current_user.is_authenticated):
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 # --------------------------- FRONTEND / STATIC ----------------------
+def google_maps_api_key():
+    return os.getenv('GOOGLE_MAPS_API_KEY', '')
+
+def render_index(content):
+    """Inject the Google Maps API key from the environment into index.html"""
+    api_key = google_maps_api_key()
+    if api_key:
+        # Replace the API key in the Google Maps script tag
+        return content.replace(
+            'key=GOOGLE_MAPS_API_KEY_PLACEHOLDER',
+            f'key={api_key}'
+        )
+    # If no API key, remove the Google Maps script entirely to avoid errors
+    return '\n'.join(line for line in content.split('\n')
+                     if 'maps.googleapis.com/maps/api/js' not in line)
+
+def render_script(content):
+    """Inject the Google Maps API key from the environment into script.js"""
+    return content.replace(
+        "const GOOGLE_MAPS_API_KEY = ''; // Will be populated by backend template - DO NOT COMMIT REAL KEY HERE",
+        f"const GOOGLE_MAPS_API_KEY = '{google_maps_api_key()}'; // Loaded from environment"
+    )
+
+# Frontend files are read, rendered and compressed once, then served from memory
+asset_cache = AssetCache(app.static_folder)
+asset_cache.register_template('index.html', render_index, google_maps_api_key)
+asset_cache.register_template('script.js', render_script, google_maps_api_key)
+asset_cache.warm()
+
 @app.route('/')
 @login_required
 def index():
-    return send_from_directory(app.static_folder, 'dashboard_enhanced.html')
+    return asset_cache.serve('dashboard_enhanced.html')
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return send_from_directory(app.static_folder, 'dashboard_enhanced.html')
+    return asset_cache.serve('dashboard_enhanced.html')
 
 @app.route('/old')
 @login_required
@@ -359,73 +1048,54 @@ def old_dashboard():
 
 @app.route('/<path:path>')
 def static_proxy(path):
-    # Allow login.html without needing authentication
-    if path == "login.html":
-        return send_from_directory(app.static_folder, path)
+    # Plain frontend files (login.html, css, js) need no authentication
+    return asset_cache.serve(path)
 
-    return send_from_directory(app.static_folder, path)
+# Flask's built-in static route ('/<path:filename>') matches before static_proxy;
+# send it through the asset cache as well
+app.view_functions['static'] = lambda filename: static_proxy(filename)
 
 
 @app.route('/index.html')
 @login_required
 def index_with_api_key():
     """Serve index.html with Google Maps API key injected from environment"""
-    import os
-    from flask import render_template_string
-    
-    google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY', '')
-    
-    # Read the index.html file
-    index_path = os.path.join(app.static_folder, 'index.html')
-    with open(index_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Inject the API key if it exists
-    if google_maps_api_key:
-        # Replace the API key in the Google Maps script tag
-        content = content.replace(
-            'key=GOOGLE_MAPS_API_KEY_PLACEHOLDER',
-            f'key={google_maps_api_key}'
-        )
-    else:
-        # If no API key, remove the Google Maps script entirely to avoid errors
-        content_lines = content.split('\n')
-        filtered_lines = []
-        for line in content_lines:
-            if 'maps.googleapis.com/maps/api/js' in line:
-                # Skip this line to avoid exposing the API key
-                continue
-            else:
-                filtered_lines.append(line)
-        content = '\n'.join(filtered_lines)
-    
-    return content
+    return asset_cache.serve('index.html')
 
 
 @app.route('/script.js')
 @login_required
 def script_with_api_key():
     """Serve script.js with Google Maps API key injected from environment"""
-    import os
-    
-    google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY', '')
-    
-    # Read the script.js file
-    script_path = os.path.join(app.static_folder, 'script.js')
-    with open(script_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Replace the API key placeholder with the actual key from environment
-    content = content.replace(
-        "const GOOGLE_MAPS_API_KEY = ''; // Will be populated by backend template - DO NOT COMMIT REAL KEY HERE",
-        f"const GOOGLE_MAPS_API_KEY = '{google_maps_api_key}'; // Loaded from environment"
-    )
-    
-    from flask import Response
-    return Response(content, mimetype='application/javascript')
+    return asset_cache.serve('script.js', content_type='application/javascript')
 
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    t = threading.Thread(target=sim_generator, daemon=True)
-    t.start()
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    debug = True
+    # With debug on, the reloader runs this script twice: a parent that only watches
+    # for code changes, and the child that serves requests (WERKZEUG_RUN_MAIN=true).
+    # Background workers and extra listeners belong in the child alone.
+    serving = not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+    if serving:
+        sim_thread = threading.Thread(target=sim_generator, name="simulator", daemon=True)
+        sim_thread.start()
+
+    # Background rollup/pruning; buffered recent rows may have been deleted
+    # Days are sealed into the archive before retention can delete their rows
+    if serving:
+        retention_worker = RetentionWorker(on_removed=lambda stats: recent_history.invalidate(),
+                                           before_pass=seal_archive)
+        retention_worker.start()
+
+    # Receiver wired over USB: frames go straight into the ingest pipeline, no WiFi/HTTP hop
+    if SERIAL_ENABLED and serving:
+        serial_reader = SerialReader(ingest_packets, SERIAL_PORT, SERIAL_BAUD).start()
+        atexit.register(serial_reader.stop)
+
+    # Optional asyncio front end for gateway uploads, sharing this process's state
+    from async_ingest import ASYNC_INGEST_PORT, create_server
+    if ASYNC_INGEST_PORT and serving:
+        async_ingest = create_server(sys.modules[__name__]).start_in_thread()
+        log.info("Async ingest listening on port %s", async_ingest.port)
+    app.run(host="0.0.0.0", port=5000, debug=debug)
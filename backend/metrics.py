@@ -0,0 +1,166 @@
+"""
+Minimal Prometheus-style instrumentation.
+
+Counters, gauges and histograms with labels, rendered in the text exposition
+format by /metrics. Recording is a dict lookup plus an add under a per-metric
+lock, cheap enough for every request and DB call; gauges that mirror existing
+state (queue depth, last-packet age) are computed by callbacks at scrape time
+instead of on the hot path.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers sub-millisecond DB calls up to slow /history scans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_SERIES = 1000  # label combinations per metric; later ones fold into "other"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        """`fn`, if given, computes the values at scrape time as {label tuple: value}"""
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self):
+        if self.fn is not None:
+            return list(self.fn().items())
+        with self._lock:
+            return list(self._series.items())
+
+    def _key(self, labels):
+        key = tuple(labels)
+        if key not in self._series and len(self._series) >= MAX_SERIES:
+            key = ("other",) * len(self.label_names)
+        return key
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}"
+                                for k, v in self._snapshot() if v is not None]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels)
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def time(self, *labels):
+        """Decorator timing each call of the wrapped function"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorator
+
+    def render(self):
+        with self._lock:
+            series = [(k, (list(s[0]), s[1], s[2])) for k, s in self._series.items()]
+        lines = self.header()
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# DB helper timings live here (not in main.py) so db.py can record them without a cycle
+db_duration = registry.histogram("tracker_db_call_duration_seconds", "Time spent in db.py helpers",
+                                 ("helper",))
+
+
+def db_timed(func):
+    """Time a db.py helper under its own name"""
+    return db_duration.time(func.__name__)(func)
@@ -0,0 +1,153 @@
+"""
+In-memory recent history.
+
+Fixed-capacity ring buffers (one across all devices, one per device) hold the
+newest packets as ready-to-serve dicts, so the dashboard's common
+"/history?n=100" read never touches SQLite. Requests reaching past the buffer
+return None and the caller falls back to the database.
+
+The buffers only see rows this process commits. When other processes write
+to the same database (LIVE_STATE_SHARED), pass `latest_id`: each read then
+compares the newest id in the DB with the newest one fed in here, and
+reloads when another process has inserted since.
+"""
+import os
+import threading
+
+from db import packet_dict
+
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "1000"))
+MAX_DEVICE_BUFFERS = 256  # bound memory if clients query many device ids
+
+
+class RingBuffer:
+    """Array-backed ring of packet dicts ordered by (timestamp, id)"""
+    __slots__ = ("capacity", "_items", "_head", "_size", "complete", "stale")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._head = 0  # next slot to write
+        self._size = 0
+        self.complete = False  # True while the buffer holds every matching row in the DB
+        self.stale = True  # needs (re)loading from the DB before it can serve reads
+
+    def __len__(self):
+        return self._size
+
+    def load(self, rows_newest_first):
+        self._items = [None] * self.capacity
+        self._head = self._size = 0
+        for row in reversed(rows_newest_first[:self.capacity]):
+            self._push(row)
+        self.complete = len(rows_newest_first) < self.capacity
+        self.stale = False
+
+    def _push(self, item):
+        self._items[self._head] = item
+        self._head = (self._head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self.complete = False  # oldest row evicted
+
+    def _key(self, offset):
+        item = self._items[(self._head - 1 - offset) % self.capacity]
+        return item["timestamp"], item["id"]
+
+    def add(self, item):
+        if self.stale:
+            return
+        key = (item["timestamp"], item["id"])
+        if self._size == 0 or key > self._key(0):
+            self._push(item)
+        elif self._size == self.capacity and key < self._key(self._size - 1):
+            pass  # backfilled row older than the whole window: not ours to serve
+        else:
+            # Out-of-order row inside the window: reload lazily on the next read
+            self.stale = True
+
+    def newest(self, n):
+        n = min(n, self._size)
+        return [self._items[(self._head - 1 - i) % self.capacity] for i in range(n)]
+
+
+class RecentHistory:
+    def __init__(self, loader, capacity=HISTORY_BUFFER_SIZE, latest_id=None):
+        """`loader(device_id, limit)` returns newest-first packet dicts from the DB;
+        `latest_id()`, if given, returns the highest packet id in the DB"""
+        self.loader = loader
+        self.capacity = capacity
+        self.latest_id = latest_id
+        self._seen_id = None  # newest DB id accounted for; ids past it came from elsewhere
+        self._lock = threading.Lock()
+        self._all = RingBuffer(capacity)
+        self._devices = {}
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self, device_id=None):
+        """Load the newest rows from the DB (all devices, or one device)"""
+        with self._lock:
+            ring = self._buffer(device_id)
+            if ring is not None:
+                self._load(ring, device_id)
+
+    def _buffer(self, device_id):
+        if device_id is None:
+            return self._all
+        ring = self._devices.get(device_id)
+        if ring is None and len(self._devices) < MAX_DEVICE_BUFFERS:
+            ring = self._devices[device_id] = RingBuffer(self.capacity)
+        return ring
+
+    def _load(self, ring, device_id):
+        # Called with the lock held so concurrent adds cannot slip between query and fill
+        ring.load(self.loader(device_id, self.capacity))
+
+    def add(self, rows):
+        """Feed committed rows (tuples in PACKET_COLUMNS order) into the buffers"""
+        items = [packet_dict(r) for r in rows]
+        with self._lock:
+            if self.latest_id and self._seen_id is not None:
+                for item in sorted(items, key=lambda i: i["id"]):
+                    if item["id"] == self._seen_id + 1:
+                        self._seen_id = item["id"]  # contiguous: nobody else wrote in between
+            for item in items:
+                self._all.add(item)
+                ring = self._devices.get(item["device_id"])
+                if ring is not None:
+                    ring.add(item)
+
+    def get(self, limit, device_id=None):
+        """Newest `limit` packets, or None when the request reaches past the buffer"""
+        if limit > self.capacity:
+            self.misses += 1
+            return None
+        latest = self.latest_id() if self.latest_id else None
+        with self._lock:
+            if self.latest_id and latest != self._seen_id:
+                self._stale_all()  # another process inserted rows
+                self._seen_id = latest
+            ring = self._buffer(device_id)
+            if ring is None:
+                self.misses += 1
+                return None
+            if ring.stale:
+                self._load(ring, device_id)
+            if limit > len(ring) and not ring.complete:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return ring.newest(limit)
+
+    def invalidate(self):
+        """Drop buffered rows (e.g. after retention deletes); they reload on the next read"""
+        with self._lock:
+            self._stale_all()
+
+    def _stale_all(self):
+        # Called with the lock held
+        self._all.stale = True
+        for ring in self._devices.values():
+            ring.stale = True
@@ -0,0 +1,238 @@
+"""
+Retention and compaction for long-running deployments.
+
+A background job periodically:
+  * if RETENTION_RAW_DAYS is set (off by default: raw packets are evidence and
+    are never deleted unless asked), rolls raw packets older than that up into
+    per-minute and per-hour aggregate tables and deletes them, a small chunk
+    per transaction so the ingest writer is never blocked for long;
+  * prunes per-minute rollups past their own window (hourly ones are kept);
+  * collapses old receiver heartbeats to the last one per hour;
+  * checkpoints the WAL and returns freed pages to the OS.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db import connection
+
+log = logging.getLogger("tracker")
+
+RETENTION_RAW_DAYS = float(os.getenv("RETENTION_RAW_DAYS", "0"))  # 0 keeps raw packets forever
+RETENTION_MINUTE_DAYS = float(os.getenv("RETENTION_MINUTE_DAYS", "180"))
+RETENTION_HEARTBEAT_HOURS = float(os.getenv("RETENTION_HEARTBEAT_HOURS", "24"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))  # seconds between runs
+RETENTION_CHUNK = int(os.getenv("RETENTION_CHUNK", "2000"))  # rows per transaction
+RETENTION_PAUSE = 0.05  # seconds between chunks, lets the ingest writer in
+
+# Rollup bucket = prefix of the ISO timestamp
+RESOLUTIONS = {"minute": 16, "hour": 13}
+
+
+def init_rollups():
+    with connection() as conn, conn:
+        for resolution in RESOLUTIONS:
+            conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS packets_rollup_{resolution} (
+                device_id TEXT NOT NULL,       -- '' for packets without a device
+                bucket TEXT NOT NULL,          -- ISO timestamp truncated to the {resolution}
+                packet_count INTEGER NOT NULL,
+                first_timestamp TEXT,
+                last_timestamp TEXT,
+                last_latitude REAL,
+                last_longitude REAL,
+                min_rssi INTEGER,
+                max_rssi INTEGER,
+                first_battery REAL,
+                last_battery REAL,
+                min_battery REAL,
+                PRIMARY KEY (device_id, bucket)
+            );
+            """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_receiver_status_timestamp ON receiver_status (timestamp)")
+
+
+def _merge_sql(resolution):
+    # Upsert that combines a chunk's partial aggregate with an existing bucket,
+    # so buckets split across chunks (or runs) end up identical to one pass
+    return f"""
+    INSERT INTO packets_rollup_{resolution} (device_id, bucket, packet_count, first_timestamp, last_timestamp,
+        last_latitude, last_longitude, min_rssi, max_rssi, first_battery, last_battery, min_battery)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (device_id, bucket) DO UPDATE SET
+        packet_count = packet_count + excluded.packet_count,
+        last_latitude = CASE WHEN excluded.last_timestamp >= last_timestamp THEN excluded.last_latitude ELSE last_latitude END,
+        last_longitude = CASE WHEN excluded.last_timestamp >= last_timestamp THEN excluded.last_longitude ELSE last_longitude END,
+        last_battery = CASE WHEN excluded.last_timestamp >= last_timestamp THEN excluded.last_battery ELSE last_battery END,
+        last_timestamp = max(last_timestamp, excluded.last_timestamp),
+        first_battery = CASE WHEN excluded.first_timestamp < first_timestamp THEN excluded.first_battery ELSE first_battery END,
+        first_timestamp = min(first_timestamp, excluded.first_timestamp),
+        min_rssi = min(coalesce(min_rssi, excluded.min_rssi), coalesce(excluded.min_rssi, min_rssi)),
+        max_rssi = max(coalesce(max_rssi, excluded.max_rssi), coalesce(excluded.max_rssi, max_rssi)),
+        min_battery = min(coalesce(min_battery, excluded.min_battery), coalesce(excluded.min_battery, min_battery))
+    """
+
+
+def _aggregate(rows, width):
+    """Aggregate (timestamp, device_id, lat, lon, rssi, battery) rows sorted by time"""
+    buckets = {}
+    for ts, device_id, lat, lon, rssi, battery in rows:
+        key = (device_id or "", ts[:width])
+        b = buckets.get(key)
+        if b is None:
+            buckets[key] = [key[0], key[1], 1, ts, ts, lat, lon, rssi, rssi, battery, battery, battery]
+            continue
+        b[2] += 1
+        b[4], b[5], b[6], b[10] = ts, lat, lon, battery
+        if rssi is not None:
+            b[7] = rssi if b[7] is None else min(b[7], rssi)
+            b[8] = rssi if b[8] is None else max(b[8], rssi)
+        if battery is not None:
+            b[11] = battery if b[11] is None else min(b[11], battery)
+    return buckets.values()
+
+
+def roll_up_packets(cutoff, chunk=RETENTION_CHUNK, max_id=None):
+    """Roll up and delete raw packets older than `cutoff` (and up to `max_id`); returns rows removed"""
+    removed = 0
+    while True:
+        with connection() as conn, conn:
+            rows = conn.execute("""
+                SELECT id, timestamp, device_id, latitude, longitude, rssi, battery FROM packets
+                WHERE timestamp < ? AND (? IS NULL OR id <= ?) ORDER BY timestamp, id LIMIT ?
+            """, (cutoff, max_id, max_id, chunk)).fetchall()
+            if not rows:
+                return removed
+            data = [r[1:] for r in rows]
+            for resolution, width in RESOLUTIONS.items():
+                conn.executemany(_merge_sql(resolution), [tuple(b) for b in _aggregate(data, width)])
+            conn.executemany("DELETE FROM packets WHERE id = ?", [(r[0],) for r in rows])
+        removed += len(rows)
+        if len(rows) < chunk:
+            return removed
+        time.sleep(RETENTION_PAUSE)
+
+
+def prune_minute_rollups(cutoff):
+    with connection() as conn, conn:
+        return conn.execute("DELETE FROM packets_rollup_minute WHERE bucket < ?", (cutoff[:16],)).rowcount
+
+
+def collapse_heartbeats(cutoff, chunk=RETENTION_CHUNK):
+    """Keep only the last heartbeat of each receiver and hour before `cutoff`; returns rows removed"""
+    removed = 0
+    while True:
+        with connection() as conn, conn:
+            ids = conn.execute("""
+                SELECT id FROM receiver_status
+                WHERE timestamp < ? AND id NOT IN (
+                    SELECT max(id) FROM receiver_status WHERE timestamp < ?
+                    GROUP BY receiver_id, substr(timestamp, 1, 13)
+                )
+                LIMIT ?
+            """, (cutoff, cutoff, chunk)).fetchall()
+            if not ids:
+                return removed
+            conn.executemany("DELETE FROM receiver_status WHERE id = ?", ids)
+        removed += len(ids)
+        if len(ids) < chunk:
+            return removed
+        time.sleep(RETENTION_PAUSE)
+
+
+def compact(full=False):
+    """Checkpoint the WAL and release free pages; full=True runs VACUUM (blocks writers)"""
+    with connection() as conn:
+        if full:
+            conn.execute("VACUUM")
+        elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+        # PASSIVE never waits on readers or the writer
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def run_retention(now=None, keep=None):
+    """One retention pass; returns counts of what was removed.
+
+    `keep` = (cutoff, max id) limits raw deletion to rows before cutoff and up to
+    max id (those already archived); keep=False deletes no raw rows.
+    """
+    now = now or datetime.utcnow()
+    cutoff, max_id = (now - timedelta(days=RETENTION_RAW_DAYS)).isoformat(), None
+    if keep:
+        cutoff, max_id = min(cutoff, keep[0]), keep[1]
+    stats = {
+        "packets": roll_up_packets(cutoff, max_id=max_id) if RETENTION_RAW_DAYS > 0 and keep is not False else 0,
+        "minute_rollups": prune_minute_rollups((now - timedelta(days=RETENTION_MINUTE_DAYS)).isoformat()),
+        "heartbeats": collapse_heartbeats((now - timedelta(hours=RETENTION_HEARTBEAT_HOURS)).isoformat())
+    }
+    compact()
+    return stats
+
+
+class RetentionWorker:
+    def __init__(self, interval=RETENTION_INTERVAL, on_removed=None, before_pass=None):
+        """`on_removed(stats)` is called after a pass that deleted raw packets;
+        `before_pass()` runs first on every pass (e.g. archiving rows about to age out)
+        and returns the (cutoff, max id) of the raw rows it has secured, or None for
+        none yet: only those may be deleted. If it fails the pass goes ahead with the
+        bound it returned last"""
+        self.interval = interval
+        self.on_removed = on_removed
+        self.before_pass = before_pass
+        self.keep = False if before_pass else None
+        self.last_run = None
+        self.last_stats = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        init_rollups()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.before_pass:
+                try:
+                    self.keep = self.before_pass() or False
+                except Exception as e:
+                    # Rollups and heartbeats are still pruned; raw rows only up to the last bound
+                    log.exception("Retention pre-pass error: %s", e)
+            try:
+                stats = run_retention(keep=self.keep)
+                self.last_run, self.last_stats = datetime.utcnow(), stats
+                if stats["packets"] and self.on_removed:
+                    self.on_removed(stats)
+                if any(stats.values()):
+                    log.info("Retention pass: %s", stats)
+            except Exception as e:
+                log.exception("Retention error: %s", e)
+            self._stop.wait(self.interval)
+
+
+def get_rollups(resolution="hour", since=None, until=None, device_id=None, limit=1000):
+    """Newest-first aggregate buckets for data that has aged out of the raw table"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"unknown resolution '{resolution}'")
+    clauses, params = [], []
+    if device_id is not None:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    if since is not None:
+        clauses.append("bucket >= ?")
+        params.append(since[:RESOLUTIONS[resolution]])
+    if until is not None:
+        clauses.append("bucket < ?")
+        params.append(until[:RESOLUTIONS[resolution]])
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.append(limit)
+    with connection() as conn:
+        cur = conn.execute(f"SELECT * FROM packets_rollup_{resolution}{where} ORDER BY bucket DESC LIMIT ?", params)
+        columns = [c[0] for c in cur.description]
+        return [dict(zip(columns, r)) for r in cur.fetchall()]
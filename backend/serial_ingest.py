@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Serial-port ingest for a LoRa receiver wired over USB.
+
+SerialReader runs on its own thread, reads the receiver's serial output,
+splits it into lines and parses each line as one frame:
+
+  JSON          {"latitude": 12.97, "longitude": 79.15, ..., "rssi": -61}
+  Key:Value     LAT:12.969200,LON:79.155900,ALT:310.0,SPD:1.20,SAT:8,BAT:3.72,RSSI:-61
+
+Key:Value is the transmitter's LoRa payload (optionally with ID:, RX:, SEQ:
+and TS: first), so a receiver sketch can echo what it hears; prefixes such
+as "Raw: " are skipped. Either form may be wrapped NMEA-style as
+$<frame>*HH (XOR checksum) or $<frame>*HHHH (CRC-16/CCITT); frames failing
+their check are dropped. Lines that are not frames (boot banners, debug
+prints) are ignored.
+
+Valid packets are handed off in batches (every SERIAL_BATCH_SIZE packets or
+SERIAL_BATCH_INTERVAL seconds) to the same pipeline as /api/upload. A lost
+port (cable pulled, receiver reset) is reopened with backoff.
+
+Standalone against a pseudo-terminal fed by the multi-tracker simulator:
+
+    python serial_ingest.py --emulate 50
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+try:
+    import serial
+except ImportError:
+    serial = None  # pyserial is only needed when SERIAL_ENABLED
+
+from ingest import IngestAckTimeout, IngestQueueFull, build_packet
+
+log = logging.getLogger("tracker")
+
+SERIAL_ENABLED = os.getenv("SERIAL_ENABLED", "False").lower() in ("1", "true", "yes")
+SERIAL_PORT = os.getenv("SERIAL_PORT", "COM5")
+SERIAL_BAUD = int(os.getenv("SERIAL_BAUD", "115200"))
+SERIAL_BATCH_SIZE = int(os.getenv("SERIAL_BATCH_SIZE", "50"))
+SERIAL_BATCH_INTERVAL = float(os.getenv("SERIAL_BATCH_INTERVAL", "0.05"))  # seconds
+SERIAL_REQUIRE_CHECKSUM = os.getenv("SERIAL_REQUIRE_CHECKSUM", "False").lower() in ("1", "true", "yes")
+RECONNECT_MIN = 1.0   # seconds before the first reopen attempt, doubling up to RECONNECT_MAX
+RECONNECT_MAX = 30.0
+MAX_LINE_BYTES = 4096
+
+# Key:Value frame keys -> upload fields
+FRAME_KEYS = {
+    "ID": "device_id",
+    "RX": "receiver_id",
+    "SEQ": "seq",
+    "TS": "timestamp",
+    "LAT": "latitude",
+    "LON": "longitude",
+    "ALT": "altitude",
+    "SPD": "speed",
+    "SAT": "satellites",
+    "BAT": "battery",
+    "RSSI": "rssi",
+}
+
+CHECKSUM_RE = re.compile(r"\*([0-9A-Fa-f]{2}|[0-9A-Fa-f]{4})$")
+
+
+class ChecksumError(ValueError):
+    pass
+
+
+def xor_checksum(data):
+    value = 0
+    for byte in data:
+        value ^= byte
+    return value
+
+
+def crc16_ccitt(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)"""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        crc &= 0xFFFF
+    return crc
+
+
+def format_frame(data, checksum="crc16"):
+    """Key:Value frame for an upload dict, wrapped with a checksum (None, "xor" or "crc16")"""
+    names = {field: key for key, field in FRAME_KEYS.items()}
+    body = ",".join(f"{names[k]}:{v}" for k, v in data.items() if k in names and v is not None)
+    if checksum == "xor":
+        return f"${body}*{xor_checksum(body.encode()):02X}"
+    if checksum == "crc16":
+        return f"${body}*{crc16_ccitt(body.encode()):04X}"
+    return body
+
+
+def parse_frame(line, require_checksum=SERIAL_REQUIRE_CHECKSUM):
+    """Upload dict for one serial line, or None when the line is not a frame.
+
+    Raises ChecksumError for a failed (or, if required, missing) checksum and
+    ValueError for a malformed frame.
+    """
+    text = line.decode("utf-8", "replace").strip()
+    start = text.find("$")
+    if start != -1:
+        text = text[start + 1:]
+    match = CHECKSUM_RE.search(text) if start != -1 else None
+    if match:
+        text, expected = text[:match.start()], int(match.group(1), 16)
+        data = text.encode("utf-8")
+        actual = xor_checksum(data) if len(match.group(1)) == 2 else crc16_ccitt(data)
+        if actual != expected:
+            raise ChecksumError(f"checksum mismatch ({actual:X} != {expected:X})")
+    elif require_checksum and ("LAT:" in text or text.startswith("{")):
+        raise ChecksumError("missing checksum")
+
+    if text.startswith("{"):
+        try:
+            return json.loads(text)
+        except ValueError:
+            raise ValueError("invalid JSON frame")
+    start = text.find("LAT:")
+    if start == -1:
+        return None
+    start = text.rfind(" ", 0, start) + 1  # frames have no spaces; ID:/TS: etc. may precede LAT:
+    data = {}
+    for pair in text[start:].split(","):
+        key, sep, value = pair.partition(":")
+        field = FRAME_KEYS.get(key.strip().upper())
+        if not sep or field is None:
+            raise ValueError(f"bad field {pair!r}")
+        data[field] = value.strip()
+    return data
+
+
+class SerialReader:
+    def __init__(self, handler, port=SERIAL_PORT, baud=SERIAL_BAUD,
+                 batch_size=SERIAL_BATCH_SIZE, batch_interval=SERIAL_BATCH_INTERVAL):
+        """`handler(packets)` receives lists of canonical packets (build_packet)"""
+        self.handler = handler
+        self.port = port
+        self.baud = baud
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._serial = None
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Counters for monitoring
+        self.connected = False
+        self.reconnects = 0
+        self.lines = 0
+        self.packets = 0
+        self.ignored = 0
+        self.checksum_errors = 0
+        self.parse_errors = 0
+        self.dropped = 0
+
+    def start(self):
+        if serial is None:
+            raise RuntimeError("pyserial is not installed")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="serial-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "lines": self.lines,
+            "packets": self.packets,
+            "ignored": self.ignored,
+            "checksum_errors": self.checksum_errors,
+            "parse_errors": self.parse_errors,
+            "dropped": self.dropped,
+        }
+
+    def _open(self):
+        # The read timeout bounds how long a partial batch waits for more data
+        self._serial = serial.Serial(self.port, self.baud, timeout=self.batch_interval)
+        self.connected = True
+        print(f"Serial ingest connected to {self.port} @ {self.baud}")
+
+    def _close(self):
+        self.connected = False
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except (OSError, serial.SerialException):
+                pass
+            self._serial = None
+
+    def _run(self):
+        delay = RECONNECT_MIN
+        while not self._stop.is_set():
+            try:
+                self._open()
+                delay = RECONNECT_MIN
+                self._read_loop()
+            except (OSError, serial.SerialException) as e:
+                log.warning("Serial ingest error on %s: %s; retrying in %.0fs", self.port, e, delay)
+                self._close()
+                self.reconnects += 1
+                self._stop.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+        self._close()
+
+    def _read_loop(self):
+        buffer = b""
+        batch = []
+        first = None  # when the oldest packet in `batch` arrived
+        try:
+            while not self._stop.is_set():
+                chunk = self._serial.read(self._serial.in_waiting or 1)
+                if chunk:
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    if len(buffer) > MAX_LINE_BYTES:
+                        buffer = b""  # no newline in sight: line noise, resynchronise
+                        self.parse_errors += 1
+                    for line in lines:
+                        packet = self._parse(line)
+                        if packet is not None:
+                            batch.append(packet)
+                            first = first or time.monotonic()
+                if batch and (len(batch) >= self.batch_size or time.monotonic() - first >= self.batch_interval):
+                    self._hand_off(batch)
+                    batch, first = [], None
+        finally:
+            if batch:
+                self._hand_off(batch)  # complete frames read before a disconnect are kept
+
+    def _parse(self, line):
+        if not line.strip():
+            return None
+        self.lines += 1
+        try:
+            data = parse_frame(line)
+            if data is None:
+                self.ignored += 1
+                return None
+            return build_packet(data, keep_timestamp=True)
+        except ChecksumError:
+            self.checksum_errors += 1
+        except ValueError:
+            self.parse_errors += 1
+        return None
+
+    def _hand_off(self, packets):
+        try:
+            self.handler(packets)
+            self.packets += len(packets)
+        except IngestAckTimeout:
+            self.packets += len(packets)  # queued, commit still pending
+        except IngestQueueFull:
+            self.dropped += len(packets)
+        except Exception as e:
+            log.exception("Serial ingest hand-off error: %s", e)
+            self.dropped += len(packets)
+
+
+def emulate(devices, interval, checksum):
+    """Feed simulated receiver output into a pseudo-terminal; returns (slave path, thread)"""
+    from simulator import TrackerSwarm
+    master, slave = os.openpty()
+    swarm = TrackerSwarm(devices, interval, prefix="serial")
+
+    def run():
+        while True:
+            for packet in swarm.tick():
+                os.write(master, (format_frame(packet, checksum) + "\r\n").encode())
+            time.sleep(0.1)
+
+    thread = threading.Thread(target=run, name="serial-emulator", daemon=True)
+    thread.start()
+    return os.ttyname(slave), thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest packets from a serial LoRa receiver")
+    parser.add_argument("--port", default=SERIAL_PORT)
+    parser.add_argument("--baud", type=int, default=SERIAL_BAUD)
+    parser.add_argument("--emulate", type=int, metavar="DEVICES",
+                        help="read from a pseudo-terminal fed by this many simulated trackers")
+    parser.add_argument("--interval", type=float, default=2.5, help="with --emulate, seconds between packets")
+    parser.add_argument("--checksum", choices=("none", "xor", "crc16"), default="crc16",
+                        help="with --emulate, frame checksum")
+    args = parser.parse_args()
+
+    port = args.port
+    if args.emulate:
+        port, _ = emulate(args.emulate, args.interval, None if args.checksum == "none" else args.checksum)
+        print(f"Emulating {args.emulate} trackers on {port}")
+
+    import main as app_module  # sets up the DB, live state and ingest writer
+    reader = SerialReader(app_module.ingest_packets, port, args.baud).start()
+    try:
+        while True:
+            time.sleep(5)
+            print(reader.stats())
+    except KeyboardInterrupt:
+        print("\nStopping serial ingest...")
+    reader.stop()
+    app_module.ingest_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Live state shared between worker processes through SQLite.
+
+SharedLiveState keeps the in-memory LiveState for reads and mirrors it into
+three small tables so every worker sees the same latest fixes, data-source
+preference and receiver location:
+
+  live_devices        one row per device (latest packet, counts, last seen)
+  live_settings       preferred_source and receiver_location
+  live_state_version  a single counter bumped by every write
+
+Each written row is stamped with the version it was written under. A worker
+checks the counter at most every SHARED_STATE_POLL seconds and, when it has
+moved, reads back only the rows with a newer version. Per-packet updates are
+coalesced per device and flushed by a background thread; data-source and
+receiver changes are written immediately.
+
+Changes pulled in from other workers are passed to `on_change`, so each
+worker can push them to its own /stream subscribers; the background thread
+also syncs, so this happens even when no request reads the state.
+
+Enable with LIVE_STATE_SHARED=1 when running several worker processes. The
+app then also checks its recent-history buffers against the newest packet id
+and claims gateway fingerprints in SQLite. Still per process: the ETag
+epoch/versions (a client switching workers gets one full 200 response),
+/metrics counters, /receivers reception counters, trip stats and geofence
+membership.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from db import connection
+from state import DeviceRecord, LiveState
+
+log = logging.getLogger("tracker")
+
+LIVE_STATE_SHARED = os.getenv("LIVE_STATE_SHARED", "0").lower() in ("1", "true", "yes")
+SHARED_STATE_POLL = float(os.getenv("SHARED_STATE_POLL", "0.25"))  # seconds between version checks
+SHARED_STATE_FLUSH = float(os.getenv("SHARED_STATE_FLUSH", "0.1"))  # seconds between device flushes
+
+UPSERT_DEVICE_SQL = """
+    INSERT INTO live_devices (device_id, source, packet, timestamp, last_seen, packet_count, version)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (device_id) DO UPDATE SET
+        packet = CASE WHEN excluded.timestamp >= timestamp THEN excluded.packet ELSE packet END,
+        timestamp = max(timestamp, excluded.timestamp),
+        source = excluded.source,
+        last_seen = max(last_seen, excluded.last_seen),
+        packet_count = packet_count + excluded.packet_count,
+        version = excluded.version
+"""
+
+
+def init_shared_state():
+    with connection() as conn, conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS live_state_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        """)
+        conn.execute("INSERT OR IGNORE INTO live_state_version (id, version) VALUES (1, 0)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS live_devices (
+            device_id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            packet TEXT NOT NULL,      -- latest packet as JSON
+            timestamp TEXT NOT NULL,   -- timestamp of that packet
+            last_seen TEXT NOT NULL,   -- when any packet for the device last arrived
+            packet_count INTEGER NOT NULL,
+            version INTEGER NOT NULL
+        );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_live_devices_version ON live_devices (version)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS live_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT,                -- JSON
+            version INTEGER NOT NULL
+        );
+        """)
+
+
+def _next_version(conn):
+    # Called inside the write transaction, so no other writer can bump it in between
+    # (UPDATE ... RETURNING would need SQLite 3.35+)
+    conn.execute("UPDATE live_state_version SET version = version + 1 WHERE id = 1")
+    return conn.execute("SELECT version FROM live_state_version WHERE id = 1").fetchone()[0]
+
+
+class SharedLiveState(LiveState):
+    def __init__(self, poll=SHARED_STATE_POLL, flush_interval=SHARED_STATE_FLUSH, on_change=None):
+        """`on_change(updates, settings)` receives other workers' changes: a list of
+        (source, newer packet) and the names of settings that changed"""
+        self._ready = False  # LiveState.__init__ assigns defaults that must not be written out
+        super().__init__()
+        self.on_change = on_change
+        self.poll = poll
+        self.flush_interval = flush_interval
+        self._version = 0
+        self._checked = 0.0
+        self._sync_lock = threading.Lock()
+        self._pending = {}  # device_id -> [source, packet, last_seen, count delta]
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        init_shared_state()
+        self._ready = True
+        self.sync(force=True)
+        self._thread = threading.Thread(target=self._run, name="shared-state", daemon=True)
+        self._thread.start()
+
+    # ---------- shared settings ----------
+    @property
+    def preferred_source(self):
+        self.sync()
+        return self._preferred_source
+
+    @preferred_source.setter
+    def preferred_source(self, value):
+        self._preferred_source = value
+        if self._ready:
+            self._write_setting("preferred_source", value)
+
+    @property
+    def receiver_location(self):
+        self.sync()
+        return self._receiver_location
+
+    @receiver_location.setter
+    def receiver_location(self, value):
+        LiveState.receiver_location.fset(self, value)
+        if self._ready:
+            self._write_setting("receiver_location", value)
+
+    def _write_setting(self, key, value):
+        with connection() as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO live_settings (key, value, version) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), _next_version(conn)))
+
+    # ---------- devices ----------
+    def receiver_versioned(self):
+        self.sync()
+        return super().receiver_versioned()
+
+    def update(self, packet, source, count=1):
+        newer = super().update(packet, source, count)
+        device_id = self.device_key(packet, source)
+        now = datetime.utcnow().isoformat()
+        with self._pending_lock:
+            pending = self._pending.get(device_id)
+            if pending is None:
+                self._pending[device_id] = [source, packet, now, count]
+            else:
+                if packet["timestamp"] >= pending[1]["timestamp"]:
+                    pending[1] = packet
+                pending[0], pending[2] = source, now
+                pending[3] += count
+        return newer
+
+    def get_versioned(self, device_id):
+        self.sync()
+        return super().get_versioned(device_id)
+
+    def devices(self):
+        self.sync()
+        return super().devices()
+
+    def latest_hardware_versioned(self):
+        self.sync()
+        return super().latest_hardware_versioned()
+
+    # ---------- flush / sync ----------
+    def flush(self):
+        """Write coalesced device updates in one transaction"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with connection() as conn, conn:
+                version = _next_version(conn)
+                conn.executemany(UPSERT_DEVICE_SQL, [
+                    (device_id, source, json.dumps(packet), packet["timestamp"], last_seen, count, version)
+                    for device_id, (source, packet, last_seen, count) in pending.items()
+                ])
+        except Exception as e:
+            log.exception("Shared state flush error: %s", e)
+            with self._pending_lock:
+                # Put the updates back so the next flush retries them
+                for device_id, entry in pending.items():
+                    newer = self._pending.get(device_id)
+                    if newer is not None:
+                        entry[3] += newer[3]
+                        if newer[1]["timestamp"] >= entry[1]["timestamp"]:
+                            entry[0], entry[1], entry[2] = newer[0], newer[1], newer[2]
+                    self._pending[device_id] = entry
+
+    def sync(self, force=False):
+        """Pull changes other workers (or our flusher) committed since the last check"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.poll:
+            return
+        if not self._sync_lock.acquire(blocking=force):
+            return  # another thread is already syncing
+        changes = None
+        try:
+            self._checked = now
+            with connection() as conn:
+                version = conn.execute("SELECT version FROM live_state_version WHERE id = 1").fetchone()[0]
+                if version == self._version:
+                    return
+                devices = conn.execute("SELECT device_id, source, packet, last_seen, packet_count FROM live_devices "
+                                       "WHERE version > ?", (self._version,)).fetchall()
+                settings = conn.execute("SELECT key, value FROM live_settings WHERE version > ?",
+                                        (self._version,)).fetchall()
+            changes = self._merge(devices, settings)
+            self._version = version
+        except Exception as e:
+            log.exception("Shared state sync error: %s", e)
+        finally:
+            self._sync_lock.release()
+        # Outside the sync lock: the callback may read (and so sync) the state itself
+        if changes and self.on_change and (changes[0] or changes[1]):
+            try:
+                self.on_change(*changes)
+            except Exception as e:
+                log.exception("Shared state change callback error: %s", e)
+
+    def _merge(self, devices, settings):
+        """Apply rows read back from the tables; returns ([(source, newer packet)], changed settings)"""
+        updates, changed = [], []
+        with self._pending_lock:
+            unflushed = {d: p[3] for d, p in self._pending.items()}
+        with self._lock:
+            for device_id, source, packet_json, last_seen, packet_count in devices:
+                packet = json.loads(packet_json)
+                last_seen = datetime.fromisoformat(last_seen)
+                record = self._devices.get(device_id)
+                if record is None:
+                    record = self._devices[device_id] = DeviceRecord(device_id, source)
+                if record.packet is None or packet["timestamp"] > record.packet["timestamp"]:
+                    record.packet = packet
+                    record.version = self._bump()
+                    updates.append((source, packet))
+                record.packet_count = packet_count + unflushed.get(device_id, 0)
+                if record.last_seen is None or last_seen > record.last_seen:
+                    record.last_seen = last_seen
+                if source == "hardware":
+                    latest = self._latest_hardware
+                    if latest is None or latest is record or record.last_seen >= latest.last_seen:
+                        self._latest_hardware = record
+                    if self.last_hardware_update is None or last_seen > self.last_hardware_update:
+                        self.last_hardware_update = last_seen
+            for key, value in settings:
+                value = json.loads(value)
+                if key == "preferred_source" and value != self._preferred_source:
+                    self._preferred_source = value
+                    changed.append(key)
+                elif key == "receiver_location" and value != self._receiver_location:
+                    self._receiver_location = value
+                    self.receiver_version = self._bump()
+                    changed.append(key)
+        return updates, changed
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            self.sync()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,139 @@
+"""
+Track downsampling for /history.
+
+Douglas-Peucker keeps the shape of the map polyline; Largest-Triangle-Three-
+Buckets keeps the visual shape of a time series (RSSI, battery, ...). Both
+return the indices of the points to keep, in ascending order.
+"""
+import heapq
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def _project(lat, lon):
+    """Equirectangular projection to metres around the track's mean latitude"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    k = np.cos(np.radians(np.nanmean(lat))) if len(lat) else 1.0
+    return np.radians(lon) * k * EARTH_RADIUS_M, np.radians(lat) * EARTH_RADIUS_M
+
+
+def douglas_peucker(lat, lon, max_points=None, tolerance=None):
+    """Indices kept by Douglas-Peucker, bounded by max_points and/or tolerance (m).
+
+    Segments are split most-significant first (a max-heap on each segment's
+    farthest point), so only as many splits run as points are kept. With just a
+    tolerance this is exactly classic DP; with max_points it stops after the
+    max_points - 2 most significant splits.
+    """
+    n = len(lat)
+    if n <= 2:
+        return np.arange(n)
+    x, y = _project(lat, lon)
+    tol = 0.0 if tolerance is None else tolerance
+    limit = n if max_points is None else max(2, max_points)
+    heap = []
+
+    def push(start, end):
+        if end - start < 2:
+            return
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        chord = np.hypot(dx, dy)
+        if chord > 0:
+            dist = np.abs(dx * py - dy * px) / chord
+        else:
+            dist = np.hypot(px, py)
+        i = int(np.argmax(dist))
+        if dist[i] > tol:
+            heapq.heappush(heap, (-dist[i], start, end, start + 1 + i))
+
+    kept = [0, n - 1]
+    push(0, n - 1)
+    while heap and len(kept) < limit:
+        _, start, end, split = heapq.heappop(heap)
+        kept.append(split)
+        push(start, split)
+        push(split, end)
+    return np.sort(np.array(kept, dtype=np.int64))
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets downsampling of a time series.
+
+    Points with a missing (NaN) value have nothing to plot and are never kept.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if not valid.all():
+        index = np.flatnonzero(valid)
+        return index[lttb(x[index], y[index], max_points)]
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n) if max_points >= n else np.array([0, n - 1][:max_points])
+
+    # First and last points are fixed; the rest are split into equal buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nlo, nhi = edges[b + 1], edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[b + 1] = a
+    return kept
+
+
+# ---------- /history integration ----------
+SERIES = ("track", "rssi", "battery", "altitude", "speed")
+
+
+def simplify_rows(rows, columns, series="track", max_points=None, tolerance=None):
+    """Downsample packet rows (tuples, any order) and return the kept rows in the same order.
+
+    series="track" runs Douglas-Peucker on latitude/longitude; any other series
+    name runs LTTB on that column against time. Rows of different devices are
+    never joined into one line: each device is simplified on its own, with
+    max_points applying per device.
+    """
+    if series not in SERIES:
+        raise ValueError(f"unknown series '{series}'")
+    if series != "track" and max_points is None:
+        raise ValueError("max_points is required for time series")
+    col = {name: i for i, name in enumerate(columns)}
+    groups = {}
+    if "device_id" in col:
+        for i, r in enumerate(rows):
+            groups.setdefault(r[col["device_id"]], []).append(i)
+    if len(groups) <= 1:
+        return [rows[i] for i in _simplify(rows, col, series, max_points, tolerance)]
+    kept = []
+    for indices in groups.values():
+        device_rows = [rows[i] for i in indices]
+        kept.extend(indices[k] for k in _simplify(device_rows, col, series, max_points, tolerance))
+    return [rows[i] for i in sorted(kept)]
+
+
+def _simplify(rows, col, series, max_points, tolerance):
+    """Indices of the rows to keep, for one device"""
+    if series == "track":
+        valid = [i for i, r in enumerate(rows) if r[col["latitude"]] is not None and r[col["longitude"]] is not None]
+        lat = np.fromiter((rows[i][col["latitude"]] for i in valid), np.float64, len(valid))
+        lon = np.fromiter((rows[i][col["longitude"]] for i in valid), np.float64, len(valid))
+        # DP is order-independent as long as points are in sequence, so no re-sort needed
+        return [valid[k] for k in douglas_peucker(lat, lon, max_points, tolerance)]
+    try:
+        t = np.array([r[col["timestamp"]] for r in rows], dtype="datetime64[us]").astype(np.float64)
+    except ValueError:
+        t = np.arange(len(rows), dtype=np.float64)  # unparseable timestamps: fall back to sequence
+    y = np.array([r[col[series]] for r in rows], dtype=np.float64)
+    return lttb(t, y, max_points).tolist()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Multi-tracker simulator for capacity testing.
+
+TrackerSwarm moves N virtual trackers (1 to tens of thousands) with one
+vectorised NumPy random-walk step per tick, and emits packets for the
+trackers whose transmit interval has elapsed. Reception is modelled on the
+receiver's side: RSSI follows a log-distance path-loss model with log-normal
+shadowing, packets below the receiver sensitivity are lost, and a further
+random loss rate applies on top.
+
+Packets go to a sink: the HTTP upload endpoints of a running backend
+(batched NDJSON to /api/upload_batch, or one POST per packet to
+/api/upload), or straight into the in-process ingest pipeline (main.py's
+ingest_packets, run against a scratch database in a temporary directory).
+
+    python simulator.py --devices 2000 --interval 2.5 --http http://127.0.0.1:5000
+    python simulator.py --devices 20000 --queue --duration 60
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# VIT Vellore SJT, same origin as the dashboard's single-walker simulation
+BASE_LAT = 12.9692
+BASE_LON = 79.1559
+METRES_PER_DEGREE = 111320.0
+
+# Receiver model: log-distance path loss with shadowing
+TX_POWER_DBM = -30.0        # RSSI at the reference distance (1 m)
+PATH_LOSS_EXPONENT = 2.7    # 2 free space, ~2.7-3.5 outdoors with obstacles
+SHADOWING_SD_DB = 4.0
+SENSITIVITY_DBM = -120.0    # packets weaker than this are not received
+
+
+class TrackerSwarm:
+    def __init__(self, devices, interval=2.5, interval_jitter=0.0, loss=0.0, spread_m=1000.0,
+                 walk_speed=1.2, prefix="swarm", seed=None,
+                 base=(BASE_LAT, BASE_LON), path_loss_exponent=PATH_LOSS_EXPONENT):
+        """`interval` is seconds between transmissions; each tracker's interval is
+        drawn uniformly from interval ± interval_jitter. `loss` is the random loss
+        rate applied on top of the path-loss model."""
+        n = devices
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.loss = loss
+        self.base = base
+        self.path_loss_exponent = path_loss_exponent
+        self.device_ids = [f"{prefix}-{i:05d}" for i in range(n)]
+
+        rng = self.rng
+        # Start scattered around the receiver (uniform over a disc)
+        r = spread_m * np.sqrt(rng.random(n))
+        theta = rng.uniform(0, 2 * np.pi, n)
+        self.lat = base[0] + r * np.cos(theta) / METRES_PER_DEGREE
+        self.lon = base[1] + r * np.sin(theta) / (METRES_PER_DEGREE * np.cos(np.radians(base[0])))
+        self.heading = rng.uniform(0, 2 * np.pi, n)
+        self.speed = np.clip(rng.normal(walk_speed, 0.3, n), 0, None)  # m/s
+        self.walk_speed = walk_speed
+        self.altitude = rng.normal(310, 5, n)
+        self.battery = rng.uniform(3.8, 4.1, n)
+        self.drain = rng.uniform(2e-6, 8e-6, n)  # volts per second
+        self.interval = np.maximum(0.05, interval + rng.uniform(-interval_jitter, interval_jitter, n))
+        self.last_tick = time.monotonic()
+        self.next_send = self.last_tick + rng.uniform(0, 1, n) * self.interval  # stagger first packets
+
+        self.generated = 0
+        self.lost = 0
+
+    def step(self, dt):
+        """Advance every tracker by dt seconds (vectorised random walk)"""
+        rng = self.rng
+        s = np.sqrt(dt)
+        self.heading += rng.normal(0, 0.5 * s, self.n)
+        self.speed = np.clip(self.speed + rng.normal(0, 0.2 * s, self.n), 0, 3 * self.walk_speed)
+        dist = self.speed * dt
+        self.lat += dist * np.cos(self.heading) / METRES_PER_DEGREE
+        self.lon += dist * np.sin(self.heading) / (METRES_PER_DEGREE * np.cos(np.radians(self.lat)))
+        self.battery = np.maximum(3.2, self.battery - self.drain * dt)
+
+    def rssi(self, idx):
+        """Received signal strength at the base for trackers `idx`"""
+        dy = (self.lat[idx] - self.base[0]) * METRES_PER_DEGREE
+        dx = (self.lon[idx] - self.base[1]) * METRES_PER_DEGREE * np.cos(np.radians(self.base[0]))
+        d = np.maximum(np.hypot(dx, dy), 1.0)
+        shadowing = self.rng.normal(0, SHADOWING_SD_DB, len(idx))
+        return TX_POWER_DBM - 10 * self.path_loss_exponent * np.log10(d) + shadowing
+
+    def tick(self, now=None):
+        """Advance to `now` and return the packets received this tick"""
+        now = time.monotonic() if now is None else now
+        dt = max(0.0, now - self.last_tick)
+        self.last_tick = now
+        if dt:
+            self.step(dt)
+
+        idx = np.flatnonzero(self.next_send <= now)
+        if not len(idx):
+            return []
+        # Schedule the next transmission; trackers that fell far behind resync to now
+        self.next_send[idx] = np.maximum(self.next_send[idx] + self.interval[idx], now)
+        self.generated += len(idx)
+
+        rssi = self.rssi(idx)
+        received = (rssi >= SENSITIVITY_DBM) & (self.rng.random(len(idx)) >= self.loss)
+        self.lost += int(len(idx) - received.sum())
+        idx, rssi = idx[received], rssi[received]
+
+        timestamp = datetime.utcnow().isoformat()
+        sats = self.rng.integers(4, 12, len(idx))
+        lat, lon = np.round(self.lat[idx], 6).tolist(), np.round(self.lon[idx], 6).tolist()
+        alt, spd = np.round(self.altitude[idx], 1).tolist(), np.round(self.speed[idx], 2).tolist()
+        bat = np.round(self.battery[idx], 3).tolist()
+        rssi, sats = np.round(rssi).astype(int).tolist(), sats.tolist()
+        return [{
+            "device_id": self.device_ids[i],
+            "timestamp": timestamp,
+            "latitude": lat[k],
+            "longitude": lon[k],
+            "altitude": alt[k],
+            "speed": spd[k],
+            "satellites": sats[k],
+            "battery": bat[k],
+            "rssi": rssi[k]
+        } for k, i in enumerate(idx.tolist())]
+
+
+# --------------------------- SINKS ---------------------------------
+class HttpSink:
+    """POST packets to a running backend, batched (NDJSON) or one request per packet"""
+
+    def __init__(self, base_url, per_packet=False, workers=8, batch_max=5000):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.per_packet = per_packet
+        self.batch_max = batch_max
+        self.sent = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(workers) if per_packet else None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return conn
+
+    def _post(self, path, body, content_type="application/json"):
+        conn = self._conn()
+        try:
+            conn.request("POST", path, body, {"Content-Type": content_type})
+            response = conn.getresponse()
+            response.read()
+            return response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            return False
+
+    def _post_packet(self, packet):
+        ok = self._post("/api/upload", json.dumps(packet))
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.errors += 1
+
+    def __call__(self, packets):
+        if self.per_packet:
+            list(self._pool.map(self._post_packet, packets))
+            return
+        for start in range(0, len(packets), self.batch_max):
+            chunk = packets[start:start + self.batch_max]
+            body = "\n".join(json.dumps(p, separators=(",", ":")) for p in chunk)
+            if self._post("/api/upload_batch", body, "application/x-ndjson"):
+                self.sent += len(chunk)
+            else:
+                self.errors += len(chunk)
+
+
+class QueueSink:
+    """Hand packets to the backend's ingest pipeline in-process (no HTTP).
+
+    `ingest` is main.ingest_packets, so gateway dedup, live state, events and
+    geofences run as for an upload; only the HTTP layer is skipped.
+    """
+
+    def __init__(self, ingest):
+        self.ingest = ingest
+        self.sent = 0
+        self.errors = 0
+
+    def __call__(self, packets):
+        from ingest import IngestQueueFull, build_packet
+        canonical = [build_packet(p, keep_timestamp=True) for p in packets]
+        try:
+            self.ingest(canonical, ack="queued")
+        except IngestQueueFull:
+            self.errors += len(canonical)  # a batch is queued whole or not at all
+            return
+        self.sent += len(canonical)
+
+
+def run(swarm, sink, tick=0.5, duration=None, report_every=5.0):
+    """Drive the swarm in real time until `duration` seconds pass (or forever)"""
+    start = last_report = time.monotonic()
+    while duration is None or time.monotonic() - start < duration:
+        tick_start = time.monotonic()
+        packets = swarm.tick(tick_start)
+        if packets:
+            sink(packets)
+        now = time.monotonic()
+        if now - last_report >= report_every:
+            elapsed = now - start
+            print(f"[{elapsed:6.1f}s] generated={swarm.generated} lost={swarm.lost} "
+                  f"sent={sink.sent} errors={sink.errors} ({sink.sent / elapsed:.0f} packets/s)")
+            last_report = now
+        time.sleep(max(0.0, tick - (time.monotonic() - tick_start)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate many GPS trackers against the backend")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=2.5, help="seconds between packets per tracker")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± spread of per-tracker intervals")
+    parser.add_argument("--loss", type=float, default=0.0, help="random packet loss rate (0-1)")
+    parser.add_argument("--spread", type=float, default=1000.0, help="start radius around the base (m)")
+    parser.add_argument("--ple", type=float, default=PATH_LOSS_EXPONENT, help="path loss exponent")
+    parser.add_argument("--prefix", default="swarm", help="device id prefix")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--tick", type=float, default=0.5, help="simulation step (s)")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--http", metavar="URL", help="backend base URL, e.g. http://127.0.0.1:5000")
+    target.add_argument("--queue", action="store_true", help="feed the ingest queue in-process")
+    parser.add_argument("--per-packet", action="store_true", help="with --http, one POST per packet")
+    parser.add_argument("--workers", type=int, default=8, help="connections for --per-packet")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    swarm = TrackerSwarm(args.devices, args.interval, args.jitter, args.loss, args.spread,
+                         prefix=args.prefix, seed=args.seed, path_loss_exponent=args.ple)
+    if args.queue:
+        # main.py opens lost_person_db.sqlite relative to the working directory:
+        # never fill the real database with simulated trackers
+        workdir = tempfile.mkdtemp(prefix="tracker-sim-")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        os.chdir(workdir)
+        print(f"Scratch database in {workdir}")
+        import main as backend  # sets up the DB and the ingest writer in this process
+        sink = QueueSink(backend.ingest_packets)
+    else:
+        sink = HttpSink(args.http, args.per_packet, args.workers)
+    print(f"Simulating {args.devices} trackers every {args.interval}s -> "
+          f"{'ingest queue' if args.queue else args.http}")
+    try:
+        run(swarm, sink, args.tick, args.duration)
+    except KeyboardInterrupt:
+        print("\nStopping simulator...")
+    print(f"generated={swarm.generated} lost={swarm.lost} sent={sink.sent} errors={sink.errors}")
+    if args.queue:
+        backend.ingest_writer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Thread-safe live state for the backend.
+
+Holds the latest packet of every tracked device plus the data-source
+preference and hardware receiver location. Flask request threads and the
+simulator thread all update it, so every mutation goes through one lock;
+reads and writes are O(1) dict operations.
+
+Every change bumps a monotonically increasing state version; each device
+record and the receiver location remember the version they last changed
+at, which the API uses as ETags so unchanged polls get a 304.
+"""
+import os
+import threading
+from datetime import datetime
+
+DEFAULT_DEVICE_ID = "default"  # hardware uploads that do not name a device
+SIM_DEVICE_ID = "sim"
+
+
+class DeviceRecord:
+    """Latest known state of one device"""
+    __slots__ = ("device_id", "source", "packet", "last_seen", "packet_count", "version")
+
+    def __init__(self, device_id, source):
+        self.device_id = device_id
+        self.source = source  # "simulated" or "hardware"
+        self.packet = None
+        self.last_seen = None
+        self.packet_count = 0
+        self.version = 0  # state version at which `packet` last changed
+
+    def summary(self):
+        p = self.packet or {}
+        return {
+            "device_id": self.device_id,
+            "source": self.source,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "timestamp": p.get("timestamp"),
+            "latitude": p.get("latitude"),
+            "longitude": p.get("longitude"),
+            "battery": p.get("battery"),
+            "rssi": p.get("rssi"),
+            "packet_count": self.packet_count
+        }
+
+
+class LiveState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._latest_hardware = None  # record of the most recently updated hardware device
+        self.epoch = os.urandom(4).hex()  # distinguishes versions across restarts and processes
+        self.version = 0
+        self.receiver_version = 0
+        self.preferred_source = "simulated"  # "simulated" or "hardware"
+        self.last_hardware_update = None
+        self._receiver_location = None  # hardware receiver (base station), separate from transmitters
+
+    def _bump(self):
+        # Called with self._lock held
+        self.version += 1
+        return self.version
+
+    @property
+    def receiver_location(self):
+        return self._receiver_location
+
+    @receiver_location.setter
+    def receiver_location(self, value):
+        with self._lock:
+            self._receiver_location = value
+            self.receiver_version = self._bump()
+
+    def receiver_versioned(self):
+        """(receiver location, version)"""
+        with self._lock:
+            return self._receiver_location, self.receiver_version
+
+    @staticmethod
+    def device_key(packet, source):
+        return packet.get("device_id") or (SIM_DEVICE_ID if source == "simulated" else DEFAULT_DEVICE_ID)
+
+    def update(self, packet, source, count=1):
+        """Store a device's newest packet; older (backfilled) packets only bump the counters"""
+        device_id = self.device_key(packet, source)
+        now = datetime.utcnow()
+        with self._lock:
+            record = self._devices.get(device_id)
+            if record is None:
+                record = self._devices[device_id] = DeviceRecord(device_id, source)
+            record.packet_count += count
+            record.last_seen = now
+            newer = record.packet is None or packet["timestamp"] >= record.packet["timestamp"]
+            if newer:
+                record.packet = packet
+                record.version = self._bump()
+            if source == "hardware":
+                self.last_hardware_update = now
+                if newer:
+                    self._latest_hardware = record
+            return newer
+
+    def get(self, device_id):
+        return self.get_versioned(device_id)[0]
+
+    def get_versioned(self, device_id):
+        """(latest packet, version) of a device; the version changes whenever the packet does"""
+        with self._lock:
+            record = self._devices.get(device_id)
+            return (record.packet, record.version) if record else (None, 0)
+
+    def devices(self):
+        with self._lock:
+            return [r.summary() for r in self._devices.values()]
+
+    def latest_hardware(self):
+        return self.latest_hardware_versioned()[0]
+
+    def latest_hardware_versioned(self):
+        with self._lock:
+            record = self._latest_hardware
+            return (record.packet, record.version) if record else (None, 0)
+
+    def latest_simulated(self):
+        return self.get(SIM_DEVICE_ID)
+
+    def current(self):
+        """The packet /data serves: latest hardware fix if preferred and available, else simulated"""
+        return self.current_versioned()[0]
+
+    def current_versioned(self):
+        if self.preferred_source == "hardware":
+            packet, version = self.latest_hardware_versioned()
+            if packet:
+                return packet, version
+        return self.get_versioned(SIM_DEVICE_ID)
@@ -0,0 +1,44 @@
+"""
+Test setup: backend modules are flat (`from db import ...`) and keep their
+database and archive relative to the working directory, so tests that touch
+them run from a scratch directory with backend/ on sys.path.
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture(scope="session")
+def workdir(tmp_path_factory):
+    """Scratch working directory holding the test database"""
+    path = tmp_path_factory.mktemp("workdir")
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def app_module(workdir):
+    """The Flask app module, imported once against the scratch database"""
+    import main
+    return main
+
+
+@pytest.fixture
+def client(app_module):
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def logged_in(app_module, client):
+    """Test client with a dashboard session"""
+    app_module.create_user("tester", "secret")  # no-op once the user exists
+    response = client.post("/api/login", json={"username": "tester", "password": "secret"})
+    assert response.status_code == 200
+    return client
@@ -0,0 +1,113 @@
+import os
+
+from archive import Archive
+from db import connection, save_packets
+from ingest import build_packet
+from retention import RetentionWorker
+
+
+def store(day, device_id, n, start=0, **fields):
+    packets = [build_packet(dict({"device_id": device_id, "latitude": 12.9 + i / 1000, "longitude": 79.1,
+                                  "timestamp": f"{day}T10:{i:02d}:00"}, **fields), keep_timestamp=True)
+               for i in range(start, start + n)]
+    return save_packets(packets)
+
+
+def test_reseal_while_a_reader_holds_the_old_segment(app_module, tmp_path):
+    store("2020-01-01", "archive-1", 3)
+    archive = Archive(str(tmp_path))
+    assert archive.seal_day("2020-01-01") == 3
+    old = archive.segments(device_id="archive-1")[0]
+    held = old.column("latitude")  # a reader still scanning the old seal
+
+    store("2020-01-01", "archive-1", 2, start=3)
+    assert archive.seal_day("2020-01-01") == 5
+    assert len(held) == 3 and held[0] == 12.9
+    assert old._columns == {}
+
+    (segment,) = archive.segments(device_id="archive-1")
+    assert len(segment) == 5 and segment.path != old.path
+    assert Archive(str(tmp_path)).segments()[0].path == segment.path
+
+
+def test_load_keeps_the_newest_seal_of_a_day(app_module, tmp_path):
+    store("2020-01-02", "archive-2", 2)
+    archive = Archive(str(tmp_path))
+    archive.seal_day("2020-01-02")
+    first = archive.segments()[0].path
+    kept = os.path.join(tmp_path, "stale")
+    os.rename(first, kept)  # as if its removal had failed while mapped
+    store("2020-01-02", "archive-2", 1, start=2)
+    archive.seal_day("2020-01-02")
+
+    reloaded = Archive(str(tmp_path))
+    (segment,) = reloaded.segments()
+    assert len(segment) == 3
+    assert not os.path.exists(kept)
+
+
+def test_query_stats_are_null_for_all_null_columns(app_module, logged_in):
+    (row,) = store("2020-01-03", "archive-3", 1)
+    with connection() as conn, conn:
+        conn.execute("UPDATE packets SET altitude = NULL WHERE id = ?", (row[0],))
+    app_module.archive.seal_day("2020-01-03")
+
+    response = logged_in.get("/archive/query?device=archive-3&columns=altitude,latitude")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["stats"]["altitude"] == {"min": None, "max": None, "mean": None}
+    assert body["stats"]["latitude"]["min"] == 12.9
+    assert body["data"]["altitude"] == [None]
+
+
+def test_retention_runs_when_the_pre_pass_fails(app_module):
+    def failing_seal():
+        raise OSError("segment in use")
+
+    worker = RetentionWorker(interval=60, before_pass=failing_seal)
+    worker.start()
+    for _ in range(50):
+        if worker.last_run:
+            break
+        worker._stop.wait(0.1)
+    worker.stop()
+    assert worker.last_run is not None
+
+
+def test_raw_packets_are_kept_unless_retention_is_enabled(app_module):
+    from datetime import datetime
+    from retention import run_retention
+    (row,) = store("2001-01-01", "retained-1", 1)
+    assert run_retention(datetime(2020, 1, 1))["packets"] == 0
+    with connection() as conn:
+        assert conn.execute("SELECT 1 FROM packets WHERE id = ?", (row[0],)).fetchone()
+
+
+def test_seal_pending_picks_up_backfill_and_newly_complete_days(app_module, tmp_path):
+    from datetime import datetime
+    store("2019-03-01", "archive-4", 2)
+    store("2019-03-03", "archive-4", 1)
+    archive = Archive(str(tmp_path))
+    assert "2019-03-01" in archive.seal_pending(now=datetime(2019, 3, 3, 12))
+    assert archive.retention_bound()[0] == "2019-03-02"
+
+    store("2019-03-01", "archive-4", 1, start=2)  # late store-and-forward backfill
+    assert archive.seal_pending(now=datetime(2019, 3, 3, 12)) == ["2019-03-01"]
+    assert len(archive.segments(since="2019-03-01T00:00:00", until="2019-03-01T23:59:59")[0]) == 3
+    assert archive.seal_pending(now=datetime(2019, 3, 3, 12)) == []
+    assert archive.seal_pending(now=datetime(2019, 3, 5)) == ["2019-03-03"]
+
+
+def test_retention_only_deletes_archived_rows(app_module, monkeypatch):
+    from datetime import datetime
+    import retention
+    monkeypatch.setattr(retention, "RETENTION_RAW_DAYS", 1)
+    (sealed,) = store("2001-02-01", "retained-2", 1)
+    (late,) = store("2001-02-01", "retained-2", 1, start=1)  # stored after the seal
+    (unsealed,) = store("2001-02-03", "retained-2", 1)
+    now = datetime(2001, 2, 10)
+    assert retention.run_retention(now, keep=False)["packets"] == 0
+    retention.run_retention(now, keep=("2001-02-02", sealed[0]))
+    with connection() as conn:
+        left = conn.execute("SELECT id FROM packets WHERE device_id = 'retained-2'").fetchall()
+    assert sorted(r[0] for r in left) == [late[0], unsealed[0]]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from ingest import build_packet, parse_batch
+
+
+def test_parse_batch_keeps_bad_ndjson_lines_as_errors():
+    items = parse_batch('{"latitude": 1, "longitude": 2}\n{"latitude": 1, "longi\n\n{"latitude": 3, "longitude": 4}\n')
+    assert len(items) == 3
+    assert items[0]["latitude"] == 1 and items[2]["latitude"] == 3
+    assert isinstance(items[1], ValueError)
+
+
+@pytest.mark.parametrize("fields", [
+    {"latitude": "nan"}, {"longitude": "inf"}, {"altitude": "-inf"}, {"battery": "nan"},
+    {"latitude": 90.5}, {"longitude": -180.1}, {"satellites": float("inf")},
+])
+def test_build_packet_rejects_non_finite_and_out_of_range_values(fields):
+    with pytest.raises(ValueError, match="invalid field value"):
+        build_packet(dict({"latitude": 12.9, "longitude": 79.1}, **fields))
+
+
+def test_build_packet_accepts_the_coordinate_limits():
+    packet = build_packet({"latitude": -90, "longitude": 180})
+    assert (packet["latitude"], packet["longitude"]) == (-90.0, 180.0)
+
+
+def test_parse_batch_rejects_an_invalid_json_array():
+    with pytest.raises(ValueError):
+        parse_batch('[{"latitude": 1, "longitude": 2},')
+
+
+def test_batch_with_a_garbled_line_stores_the_rest(client):
+    lines = [json.dumps({"device_id": "batch-1", "latitude": 12.9, "longitude": 79.1,
+                         "timestamp": f"2023-05-01T00:00:0{i}"}) for i in range(3)]
+    lines.insert(1, '{"device_id": "batch-1", "latit')
+    response = client.post("/api/upload_batch", data="\n".join(lines), content_type="application/x-ndjson")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["accepted"], body["rejected"]) == (3, 1)
+    assert body["results"][1] == {"index": 1, "success": False, "message": "invalid JSON"}
+
+
+def test_stationary_backlog_is_not_taken_for_gateway_copies(client):
+    # Store-and-forward: same payload from a parked tracker, one fix a minute
+    lines = [json.dumps({"device_id": "batch-parked", "receiver_id": "gw-a", "latitude": 12.9,
+                         "longitude": 79.1, "timestamp": f"2023-05-01T00:0{i}:00"}) for i in range(5)]
+    response = client.post("/api/upload_batch", data="\n".join(lines), content_type="application/x-ndjson")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["accepted"], body["duplicates"]) == (5, 0)
+
+    # The same backlog relayed by a second gateway is all copies
+    lines = [line.replace('"gw-a"', '"gw-b"') for line in lines]
+    body = client.post("/api/upload_batch", data="\n".join(lines), content_type="application/x-ndjson").get_json()
+    assert (body["accepted"], body["duplicates"]) == (0, 5)
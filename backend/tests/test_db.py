@@ -0,0 +1,29 @@
+import sqlite3
+
+import db
+
+
+def test_init_db_converts_an_existing_database_to_incremental_vacuum(app_module, tmp_path, monkeypatch):
+    path = str(tmp_path / "old.sqlite")
+    old = sqlite3.connect(path)
+    old.execute("PRAGMA journal_mode=WAL")
+    old.execute("CREATE TABLE legacy (x)")
+    old.close()
+
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.close_db()  # drop pooled connections to the test database
+    try:
+        db.init_db()
+        with db.connection() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
+        db.close_db()
+
+
+def test_save_packets_returns_the_stored_ids(app_module):
+    from ingest import build_packet
+    stored = db.save_packets([build_packet({"device_id": "ids-1", "latitude": 12.9 + i / 100, "longitude": 79.1})
+                              for i in range(5)])
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, latitude FROM packets WHERE device_id = 'ids-1' ORDER BY id").fetchall()
+    assert [(r[0], r[2]) for r in stored] == rows
@@ -0,0 +1,34 @@
+from events import EventHub
+
+
+def read_event(chunks):
+    """Next SSE message (skipping the retry hint) as a dict of its fields"""
+    while True:
+        message = next(chunks)
+        message = message.decode() if isinstance(message, bytes) else message
+        if not message.startswith(("retry:", ":")):
+            return dict(line.split(": ", 1) for line in message.strip().split("\n"))
+
+
+def test_stream_resyncs_a_client_that_fell_behind_the_history(app_module, logged_in, monkeypatch):
+    hub = EventHub(history=4)
+    monkeypatch.setattr(app_module, "event_hub", hub)
+    response = logged_in.get("/stream", buffered=False)
+    chunks = iter(response.response)
+    assert read_event(chunks)["event"] == "data"  # connect snapshot
+    while read_event(chunks)["event"] != "base_station":
+        pass
+
+    for i in range(10):  # more than the hub keeps while this client is not reading
+        hub.publish("hardware", {"n": i})
+    resync = read_event(chunks)
+    assert (resync["event"], resync["id"]) == ("resync", "10")
+    assert read_event(chunks)["event"] == "data"
+
+    hub.publish("hardware", {"n": 10})
+    while True:
+        event = read_event(chunks)
+        if event["id"] == "11":
+            break
+    assert event["data"] == '{"n":10}'
+    response.close()
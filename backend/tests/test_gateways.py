@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from gateways import DUPLICATE, NEW, UPGRADED, DEDUP_PAYLOAD_WINDOW, DedupCache
+from ingest import IngestWriter, build_packet
+
+
+def copy(receiver_id, rssi, seq=7, device_id="tracker-1", **fields):
+    data = dict(device_id=device_id, receiver_id=receiver_id, rssi=rssi, seq=seq,
+                latitude=12.97, longitude=79.15, **fields)
+    return build_packet(data)
+
+
+class RssiUpdates(list):
+    def __call__(self, updates):
+        self.extend(updates)
+
+
+def test_second_copy_is_a_duplicate_and_a_stronger_one_an_upgrade():
+    cache = DedupCache(RssiUpdates())
+    first = copy("gw-a", -90)
+    assert cache.offer(first)[0] == NEW
+    assert cache.offer(copy("gw-b", -95))[:2] == (DUPLICATE, first)
+    outcome, best, replaced = cache.offer(copy("gw-c", -60))
+    assert outcome == UPGRADED
+    assert best is None  # first copy not accepted yet: nothing live to correct
+    assert replaced is first
+    assert cache.accept([first])[0]["rssi"] == -60
+
+
+def test_upgrade_after_commit_updates_the_stored_row():
+    updates = RssiUpdates()
+    cache = DedupCache(updates)
+    first = copy("gw-a", -90)
+    cache.offer(first)
+    cache.accept([first])
+    cache.committed([first], [(41,)])
+    outcome, best, _ = cache.offer(copy("gw-b", -70))
+    assert (outcome, best["rssi"], best["receiver_id"]) == (UPGRADED, -70, "gw-b")
+    assert best["timestamp"] == first["timestamp"]
+    assert updates == [(41, -70, "gw-b")]
+
+
+def test_upgrade_while_queued_is_applied_on_commit():
+    updates = RssiUpdates()
+    cache = DedupCache(updates)
+    first = copy("gw-a", -90)
+    cache.offer(first)
+    cache.offer(copy("gw-b", -70))
+    cache.committed([first], [(42,)])
+    assert updates == [(42, -70, "gw-b")]
+
+
+def test_discarded_copy_is_new_again():
+    cache = DedupCache(RssiUpdates())
+    first = copy("gw-a", -90)
+    cache.offer(first)
+    cache.discard([first])
+    assert cache.offer(copy("gw-a", -90))[0] == NEW
+    assert len(cache) == 1
+
+
+def test_payload_fingerprint_expires_before_the_next_transmission():
+    assert DEDUP_PAYLOAD_WINDOW < 2.5  # transmitter interval
+    cache = DedupCache(RssiUpdates(), window=60, payload_window=0.05)
+    assert cache.offer(copy("gw-a", -80, seq=None))[0] == NEW
+    assert cache.offer(copy("gw-b", -85, seq=None))[0] == DUPLICATE
+    time.sleep(0.1)
+    # Stationary tracker, same payload: its next fix is a new packet
+    assert cache.offer(copy("gw-a", -80, seq=None))[0] == NEW
+    assert cache.offer(copy("gw-a", -80, seq=8))[0] == NEW
+
+
+def test_upload_refused_with_503_is_stored_on_retry(app_module, monkeypatch):
+    """Regression: a 503'd first copy used to be remembered, so its retry came back as a duplicate"""
+    full = IngestWriter(max_queue=1, overflow="reject")
+    full.submit({"device_id": "filler"}, ack="queued")
+    monkeypatch.setattr(app_module, "ingest_writer", full)
+    upload = {"device_id": "retry-1", "receiver_id": "gw-a", "seq": 1,
+              "latitude": 12.97, "longitude": 79.15, "rssi": -80}
+    assert app_module.accept_upload(upload, ack="queued")[1] == 503
+
+    monkeypatch.undo()
+    body, status = app_module.accept_upload(upload, ack="committed")
+    assert (status, body) == (200, {"success": True})
+    assert app_module.live_state.get("retry-1")["rssi"] == -80
+    rows, _ = app_module.get_history(device_id="retry-1")
+    assert len(rows) == 1
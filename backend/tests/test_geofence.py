@@ -0,0 +1,52 @@
+import pytest
+
+from geofence import GeofenceEngine, _Compiled, validate_geofence
+
+SQUARE = {"id": 1, "name": "camp", "zone": "safe", "kind": "polygon",
+          "geometry": [[12.0, 79.0], [12.0, 79.01], [12.01, 79.01], [12.01, 79.0]]}
+CIRCLE = {"id": 2, "name": "river", "zone": "hazard", "kind": "circle",
+          "geometry": {"center": [12.05, 79.05], "radius_m": 100.0}}
+
+
+def engine():
+    e = GeofenceEngine()
+    e._compiled = _Compiled([SQUARE, CIRCLE])
+    return e
+
+
+def fix(lat, lon, timestamp, device_id="geo-1"):
+    return {"device_id": device_id, "latitude": lat, "longitude": lon, "timestamp": timestamp}
+
+
+def test_polygon_and_circle_containment():
+    compiled = _Compiled([SQUARE, CIRCLE])
+    assert compiled.contains(12.005, 79.005).tolist() == [True, False]
+    assert compiled.contains(12.05, 79.0505).tolist() == [False, True]   # ~54 m from the centre
+    assert compiled.contains(12.05, 79.0515).tolist() == [False, False]  # ~163 m
+    assert compiled.contains(12.02, 79.005).tolist() == [False, False]
+
+
+def test_enter_and_exit_events_after_a_baseline():
+    e = engine()
+    assert e.evaluate(fix(12.02, 79.005, "2024-01-01T00:00:00")) == []  # baseline
+    (enter,) = e.evaluate(fix(12.005, 79.005, "2024-01-01T00:00:05"))
+    assert (enter["event"], enter["geofence_id"]) == ("enter", 1)
+    (leave,) = e.evaluate(fix(12.02, 79.005, "2024-01-01T00:00:10"))
+    assert (leave["event"], leave["geofence_id"]) == ("exit", 1)
+
+
+def test_backfilled_fix_does_not_flip_membership():
+    e = engine()
+    e.evaluate(fix(12.005, 79.005, "2024-01-01T00:00:10"))  # inside, newest
+    # An older fix from outside arrives late: no exit now and no re-enter later
+    assert e.evaluate(fix(12.02, 79.005, "2024-01-01T00:00:01")) == []
+    assert e.membership() == {"geo-1": [1]}
+    assert e.evaluate(fix(12.006, 79.005, "2024-01-01T00:00:15")) == []
+
+
+def test_validate_geofence_rejects_bad_shapes():
+    with pytest.raises(ValueError):
+        validate_geofence({"name": "x", "points": [[1, 2], [3, 4]]})
+    with pytest.raises(ValueError):
+        validate_geofence({"name": "x", "center": [1, 2], "radius_m": 0})
+    assert validate_geofence({"name": "x", "center": [1, 2], "radius_m": 5})[2] == "circle"
@@ -0,0 +1,54 @@
+import pytest
+
+from db import PACKET_COLUMNS, connection, get_history, get_packets_after, save_packets
+from ingest import build_packet
+
+
+@pytest.fixture(scope="module")
+def stored(app_module):
+    """Ten fixes each for two devices, plus a late upload with an old timestamp"""
+    packets = [build_packet({"device_id": device, "latitude": 11.0, "longitude": 78.0,
+                             "timestamp": f"2022-03-01T00:00:{i:02d}"}, keep_timestamp=True)
+               for i in range(10) for device in ("page-a", "page-b")]
+    packets.append(build_packet({"device_id": "page-a", "latitude": 11.0, "longitude": 78.0,
+                                 "timestamp": "2022-02-28T23:59:00"}, keep_timestamp=True))
+    return [row[0] for row in save_packets(packets)]
+
+
+def test_keyset_pages_cover_the_range_once(stored):
+    seen, cursor = [], None
+    while True:
+        rows, cursor = get_history(since="2022-02-28", until="2022-03-02", cursor=cursor,
+                                   limit=4, device_id="page-a")
+        seen.extend(rows)
+        if cursor is None:
+            break
+    keys = [(r["timestamp"], r["id"]) for r in seen]
+    assert len(seen) == 11
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_after_id_returns_late_rows_in_insert_order(stored):
+    first = stored[0] - 1
+    rows = get_packets_after(first, limit=100, device_id="page-a")
+    ids = [r["id"] for r in rows]
+    assert len(ids) == 11 and ids == sorted(ids)
+    assert rows[-1]["timestamp"] == "2022-02-28T23:59:00"  # backfill still shows up
+    assert [r["id"] for r in get_packets_after(rows[4]["id"], 3, "page-a")] == [r["id"] for r in rows[5:8]]
+
+
+def test_after_id_with_device_uses_the_device_id_index(stored):
+    with connection() as conn:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN SELECT {PACKET_COLUMNS} FROM packets "
+                            "WHERE id > ? AND device_id = ? ORDER BY id LIMIT ?", (0, "page-a", 10)).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "idx_packets_device_id" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_after_id_endpoint_pages_with_header(logged_in, stored):
+    response = logged_in.get(f"/history?after_id={stored[0] - 1}&device=page-b&limit=6")
+    assert len(response.get_json()) == 6
+    after = response.headers["X-Next-After-Id"]
+    rest = logged_in.get(f"/history?after_id={after}&device=page-b&limit=6")
+    assert len(rest.get_json()) == 4 and "X-Next-After-Id" not in rest.headers
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from ingest import IngestQueueFull, IngestWriteError, IngestWriter
+
+
+class GatedWrites:
+    """write_batch stand-in that holds the writer until released"""
+
+    def __init__(self, fail=False):
+        self.release = threading.Event()
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, packets):
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("disk full")
+        self.batches.append(list(packets))
+
+
+def packets(n, start=0):
+    return [{"n": i} for i in range(start, start + n)]
+
+
+def fill(w):
+    """Park one packet in the held writer, then fill the queue"""
+    w.submit({"n": "in flight"}, ack="queued")
+    while w.depth():
+        pass
+    w.submit_many(packets(w.max_queue), ack="queued")
+
+
+def writer(write, **kwargs):
+    kwargs.setdefault("max_queue", 4)
+    kwargs.setdefault("batch_size", 1)
+    kwargs.setdefault("flush_interval", 0)
+    w = IngestWriter(write, **kwargs)
+    w.start()
+    return w
+
+
+def test_queued_packets_are_written_in_order():
+    write = GatedWrites()
+    write.release.set()
+    w = writer(write, batch_size=10)
+    w.submit_many(packets(3), ack="committed")
+    w.stop()
+    assert [p["n"] for batch in write.batches for p in batch] == [0, 1, 2]
+    assert w.written == 3
+
+
+def test_reject_refuses_a_batch_that_does_not_fit_without_queueing_part_of_it():
+    write = GatedWrites()
+    w = writer(write, overflow="reject")
+    w.submit_many(packets(3), ack="queued")
+    with pytest.raises(IngestQueueFull):
+        w.submit_many(packets(3, start=3), ack="queued")
+    assert w.enqueued == 3
+    assert w.rejected == 3
+    write.release.set()
+    w.stop()
+    assert [p["n"] for batch in write.batches for p in batch] == [0, 1, 2]
+
+
+def test_batch_larger_than_the_queue_is_refused():
+    w = writer(GatedWrites(), overflow="drop_oldest")
+    with pytest.raises(IngestQueueFull):
+        w.submit_many(packets(5), ack="queued")
+    assert w.depth() == 0
+    w.stop(timeout=0)
+
+
+def test_block_times_out_with_queue_full():
+    write = GatedWrites()
+    w = writer(write, overflow="block", block_timeout=0.05)
+    fill(w)
+    with pytest.raises(IngestQueueFull):
+        w.submit(packets(1)[0], ack="queued")
+    write.release.set()
+    w.stop()
+
+
+def test_drop_oldest_reports_a_dropped_committed_packet_as_queue_full():
+    write = GatedWrites()
+    w = writer(write, max_queue=1, overflow="drop_oldest")
+    w.submit({"n": "in flight"}, ack="queued")
+    while w.depth():  # the held writer has taken it
+        pass
+    errors = []
+
+    def committed_upload():
+        try:
+            w.submit({"n": "dropped"}, ack="committed", timeout=5)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=committed_upload)
+    thread.start()
+    while not w.depth():
+        pass
+    w.submit({"n": "newer"}, ack="queued")  # pushes the committed packet out
+    thread.join(5)
+    write.release.set()
+    w.stop()
+    assert len(errors) == 1 and isinstance(errors[0], IngestQueueFull)
+    assert w.dropped == 1
+
+
+def test_committed_ack_surfaces_write_errors():
+    write = GatedWrites(fail=True)
+    write.release.set()
+    w = writer(write)
+    with pytest.raises(IngestWriteError):
+        w.submit({"n": 1}, ack="committed", timeout=5)
+    w.stop()
+    assert w.errors == 1
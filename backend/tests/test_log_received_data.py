@@ -0,0 +1,45 @@
+import json
+import sqlite3
+
+from log_received_data import COLUMNS, RotatingLog, fetch_after, format_json, format_text, select_columns
+
+ROW = (7, "2024-01-01T00:00:00", 12.97, 79.15, 310.0, 1.2, 8, 3.9, -61, "tracker-1", "gw-a")
+
+
+def test_text_lines_name_the_device_and_receiver():
+    line = format_text(ROW)
+    assert line.startswith("[2024-01-01T00:00:00] ID:tracker-1, RX:gw-a, LAT:12.97")
+    assert "RX:" not in format_text(ROW[:-1] + (None,))
+
+
+def test_json_lines_carry_every_column():
+    record = json.loads(format_json(ROW))
+    assert record["device_id"] == "tracker-1" and record["receiver_id"] == "gw-a"
+    assert list(record) == COLUMNS.split(", ")
+
+
+def test_database_without_receiver_column_reads_null():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE packets (id INTEGER PRIMARY KEY, timestamp TEXT, latitude REAL, longitude REAL, "
+                  "altitude REAL, speed REAL, satellites INTEGER, battery REAL, rssi INTEGER, device_id TEXT)")
+    conn.execute("INSERT INTO packets VALUES (1, 't', 1, 2, 3, 4, 5, 6, -7, 'dev')")
+    (row,) = fetch_after(conn, 0, columns=select_columns(conn))
+    assert row[-2:] == ("dev", None)
+
+
+def test_stored_packets_keep_their_receiver(app_module):
+    from db import connection, save_packets
+    from ingest import build_packet
+    (stored,) = save_packets([build_packet({"device_id": "log-1", "receiver_id": "gw-z",
+                                            "latitude": 1, "longitude": 2})])
+    with connection() as conn:
+        (row,) = fetch_after(conn, stored[0] - 1, columns=select_columns(conn))
+    assert row[-2:] == ("log-1", "gw-z")
+
+
+def test_rotation_size_counts_bytes(tmp_path):
+    log = RotatingLog(str(tmp_path / "received.log"), rotate_bytes=10 ** 6, rotate_seconds=3600)
+    log.write_lines([format_text(ROW[:-2] + ("tracker-é",) + ROW[-1:])] * 3)
+    log.flush()
+    assert log.size == (tmp_path / "received.log").stat().st_size
+    log.file.close()
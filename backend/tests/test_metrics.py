@@ -0,0 +1,16 @@
+def test_metrics_require_login_by_default(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+
+def test_metrics_for_logged_in_users(logged_in):
+    response = logged_in.get("/metrics")
+    assert response.status_code == 200
+    assert b"tracker_" in response.data
+
+
+def test_metrics_bearer_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
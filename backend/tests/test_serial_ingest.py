@@ -0,0 +1,35 @@
+import pytest
+
+from serial_ingest import ChecksumError, crc16_ccitt, format_frame, parse_frame, xor_checksum
+
+UPLOAD = {"device_id": "t-7", "seq": 12, "latitude": 12.9692, "longitude": 79.1559, "altitude": 310.0,
+          "speed": 1.2, "satellites": 8, "battery": 3.72, "rssi": -61}
+
+
+def test_crc16_ccitt_false_check_value():
+    assert crc16_ccitt(b"123456789") == 0x29B1
+    assert xor_checksum(b"GPGGA") == ord("G") ^ ord("P") ^ ord("G") ^ ord("G") ^ ord("A")
+
+
+@pytest.mark.parametrize("checksum", [None, "xor", "crc16"])
+def test_frames_round_trip(checksum):
+    data = parse_frame(format_frame(UPLOAD, checksum).encode())
+    assert data["device_id"] == "t-7" and data["seq"] == "12"
+    assert float(data["latitude"]) == 12.9692 and int(data["rssi"]) == -61
+
+
+def test_corrupted_frame_fails_its_checksum():
+    frame = format_frame(UPLOAD, "crc16")
+    with pytest.raises(ChecksumError):
+        parse_frame(frame.replace("LAT:12.9692", "LAT:12.9693").encode())
+    with pytest.raises(ChecksumError):
+        parse_frame(format_frame(UPLOAD, None).encode(), require_checksum=True)
+
+
+def test_prefixes_noise_and_json_frames():
+    frame = format_frame(UPLOAD, "xor")
+    assert parse_frame(f"Raw: {frame}\r\n".encode())["device_id"] == "t-7"
+    assert parse_frame(b"LoRa receiver ready") is None
+    assert parse_frame(b'{"latitude": 1.5, "longitude": 2.5}') == {"latitude": 1.5, "longitude": 2.5}
+    with pytest.raises(ValueError):
+        parse_frame(b"LAT:1,LON:2,FOO:3")
@@ -0,0 +1,48 @@
+"""Features that must hold across worker processes with LIVE_STATE_SHARED (two instances stand in for two workers)"""
+from gateways import DUPLICATE, NEW, DedupCache
+from ingest import build_packet
+from recent import RecentHistory
+from shared_state import SharedLiveState
+
+
+def test_recent_history_reloads_after_another_process_inserts():
+    db = [{"id": 1, "timestamp": "2024-01-01T00:00:01", "device_id": "a"}]
+    loads = []
+
+    def loader(device_id, limit):
+        loads.append(device_id)
+        return sorted(db, key=lambda r: r["id"], reverse=True)[:limit]
+
+    history = RecentHistory(loader, capacity=10, latest_id=lambda: max(r["id"] for r in db))
+    assert [r["id"] for r in history.get(5)] == [1]
+    db.append({"id": 2, "timestamp": "2024-01-01T00:00:02", "device_id": "a"})  # other worker
+    assert [r["id"] for r in history.get(5)] == [2, 1]
+    assert history.get(5) and len(loads) == 2  # unchanged DB: served from memory
+
+
+def test_gateway_copies_are_deduplicated_across_workers(app_module):
+    worker_a = DedupCache(lambda updates: None, shared=True)
+    worker_b = DedupCache(lambda updates: None, shared=True)
+    copy = dict(device_id="shared-1", seq=3, latitude=12.97, longitude=79.15)
+    first = build_packet(dict(copy, receiver_id="gw-a", rssi=-80))
+    assert worker_a.offer(first)[0] == NEW
+    assert worker_b.offer(build_packet(dict(copy, receiver_id="gw-b", rssi=-90)))[0] == DUPLICATE
+
+    worker_a.discard([first])  # refused by worker A's writer: the retry may land anywhere
+    assert worker_b.offer(build_packet(dict(copy, receiver_id="gw-a", rssi=-80)))[0] == NEW
+
+
+def test_other_workers_updates_reach_on_change(app_module):
+    changes = []
+    worker_a = SharedLiveState()
+    worker_b = SharedLiveState(on_change=lambda updates, settings: changes.append((updates, settings)))
+    try:
+        packet = build_packet({"device_id": "shared-2", "latitude": 12.97, "longitude": 79.15})
+        worker_a.update(packet, "hardware")
+        worker_a.flush()
+        worker_b.sync(force=True)
+        assert changes[-1][0] == [("hardware", packet)]
+        assert worker_b.get("shared-2") == packet
+    finally:
+        worker_a.stop()
+        worker_b.stop()
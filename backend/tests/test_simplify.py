@@ -0,0 +1,89 @@
+import numpy as np
+
+from db import PACKET_COLUMNS
+from simplify import douglas_peucker, lttb, simplify_rows
+
+COLUMNS = PACKET_COLUMNS.split(", ")
+
+
+def row(i, device_id, lat, lon, rssi=-70):
+    values = {"id": i, "device_id": device_id, "timestamp": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}",
+              "latitude": lat, "longitude": lon, "rssi": rssi}
+    return tuple(values.get(c) for c in COLUMNS)
+
+
+def test_douglas_peucker_drops_collinear_points():
+    lat = np.linspace(12.0, 12.01, 50)
+    assert douglas_peucker(lat, np.full(50, 79.0), tolerance=1.0).tolist() == [0, 49]
+
+
+def test_douglas_peucker_keeps_the_most_significant_corner_first():
+    lat = np.array([0.0, 0.001, 0.002, 0.003, 0.004])
+    lon = np.array([0.0, 0.0, 0.003, 0.0, 0.0])  # a spike at index 2
+    assert douglas_peucker(lat, lon, max_points=3).tolist() == [0, 2, 4]
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[37] = 50.0
+    kept = lttb(x, y, 10)
+    assert len(kept) == 10
+    assert kept[0] == 0 and kept[-1] == 99 and 37 in kept
+
+
+def test_lttb_skips_missing_readings():
+    # A run of missing readings must not pull the series to 0 and get kept as a dip
+    x = np.arange(100, dtype=float)
+    y = np.full(100, -70.0)
+    y[40:60] = np.nan
+    y[0] = np.nan
+    y[80] = -20.0
+    kept = lttb(x, y, 10)
+    assert len(kept) == 10
+    assert kept[0] == 1 and kept[-1] == 99 and 80 in kept
+    assert not np.isnan(y[kept]).any()
+
+
+def test_devices_are_simplified_separately():
+    # Two parallel straight tracks, interleaved in time: as one line they zigzag
+    rows = []
+    for i in range(40):
+        rows.append(row(2 * i, "a", 12.0 + i * 1e-4, 79.0))
+        rows.append(row(2 * i + 1, "b", 12.0 + i * 1e-4, 79.01))
+    kept = simplify_rows(rows, COLUMNS, tolerance=1.0)
+    device = COLUMNS.index("device_id")
+    assert [(r[device], r[0]) for r in kept] == [("a", 0), ("b", 1), ("a", 78), ("b", 79)]
+
+
+def test_max_points_applies_per_device_for_time_series():
+    rows = [row(i, "a" if i % 2 else "b", 12.0, 79.0, rssi=-60 - i % 7) for i in range(100)]
+    kept = simplify_rows(rows, COLUMNS, series="rssi", max_points=5)
+    device = COLUMNS.index("device_id")
+    assert sorted(r[device] for r in kept) == ["a"] * 5 + ["b"] * 5
+    assert [r[0] for r in kept] == sorted(r[0] for r in kept)  # input order kept
+
+
+def test_history_endpoint_simplifies_per_device(logged_in):
+    from db import save_packets
+    from ingest import build_packet
+    save_packets([build_packet({"device_id": device, "latitude": 13.0 + i * 1e-4, "longitude": lon,
+                                "timestamp": f"2021-06-01T00:00:{i:02d}"}, keep_timestamp=True)
+                  for i in range(30) for device, lon in (("simp-a", 79.0), ("simp-b", 79.01))])
+    response = logged_in.get("/history?since=2021-06-01T00:00:00&until=2021-06-02T00:00:00&tolerance=1")
+    assert response.status_code == 200
+    assert sorted(p["device_id"] for p in response.get_json()) == ["simp-a"] * 2 + ["simp-b"] * 2
+
+
+def test_history_tolerance_alone_is_capped(logged_in, app_module, monkeypatch):
+    from db import save_packets
+    from ingest import build_packet
+    # A zigzag: every point is a corner, so a tolerance alone would keep them all
+    save_packets([build_packet({"device_id": "simp-cap", "latitude": 13.0 + i * 1e-4,
+                                "longitude": 79.0 + (i % 2) * 1e-3,
+                                "timestamp": f"2021-07-01T00:00:{i:02d}"}, keep_timestamp=True)
+                  for i in range(30)])
+    monkeypatch.setattr(app_module, "HISTORY_MAX_LIMIT", 8)
+    response = logged_in.get("/history?device=simp-cap&since=2021-07-01T00:00:00&tolerance=0.1")
+    assert response.status_code == 200
+    assert len(response.get_json()) == 8
@@ -0,0 +1,80 @@
+"""Start main.py the way the README does (debug server with reloader) and check it stays up"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from importlib.util import find_spec
+
+import pytest
+
+from conftest import BACKEND
+
+STARTUP_TIMEOUT = 20
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def port_in_use(port):
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    if port_in_use(5000):
+        pytest.skip("port 5000 is in use")
+    workdir = tmp_path_factory.mktemp("server")
+    async_port = free_port()
+    master, slave = os.openpty()  # stands in for the receiver's USB serial port
+    env = dict(os.environ, PYTHONUNBUFFERED="1", ASYNC_INGEST_PORT=str(async_port),
+               SERIAL_ENABLED=str(find_spec("serial") is not None), SERIAL_PORT=os.ttyname(slave))
+    log = open(workdir / "server.log", "w+")
+    proc = subprocess.Popen([sys.executable, os.path.join(BACKEND, "main.py")], cwd=workdir, env=env,
+                            stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline and proc.poll() is None:
+        if port_in_use(5000) and port_in_use(async_port):
+            break
+        time.sleep(0.2)
+    time.sleep(2)  # give a second (reloader) process time to trip over the ports
+    yield proc, async_port, log
+    try:
+        os.killpg(proc.pid, 9)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+    log.close()
+    os.close(master)
+    os.close(slave)
+
+
+def output(log):
+    log.seek(0)
+    return log.read()
+
+
+def test_debug_server_with_async_ingest_stays_up(server):
+    """Regression: the reloader parent and child both bound ASYNC_INGEST_PORT and the child died"""
+    proc, async_port, log = server
+    assert proc.poll() is None, output(log)
+    assert output(log).count("Async ingest listening") == 1
+
+    request = urllib.request.Request(f"http://127.0.0.1:{async_port}/api/upload", method="POST",
+                                     data=json.dumps({"latitude": 12.97, "longitude": 79.15}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        assert json.load(response)["success"] is True
+
+
+def test_serial_port_is_opened_once(server):
+    """Two readers on one port would split the receiver's lines between processes"""
+    pytest.importorskip("serial")
+    proc, _, log = server
+    assert output(log).count("Serial ingest connected") == 1
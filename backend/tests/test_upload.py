@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from ingest import IngestWriter
+
+
+@pytest.fixture
+def full_writer(app_module, monkeypatch):
+    """Swap in a stopped writer whose one-slot queue is already full"""
+    writer = IngestWriter(max_queue=1, overflow="reject")
+    writer.submit({"device_id": "filler"}, ack="queued")
+    monkeypatch.setattr(app_module, "ingest_writer", writer)
+    return writer
+
+
+def upload(device_id, **fields):
+    return dict({"device_id": device_id, "latitude": 12.97, "longitude": 79.15, "rssi": -70}, **fields)
+
+
+def test_refused_upload_is_not_published(app_module, full_writer):
+    body, status = app_module.accept_upload(upload("refused-1"), ack="queued")
+    assert status == 503
+    assert app_module.live_state.get("refused-1") is None
+
+
+def test_accepted_upload_is_published(app_module):
+    body, status = app_module.accept_upload(upload("accepted-1"), ack="committed")
+    assert (status, body) == (200, {"success": True})
+    assert app_module.live_state.get("accepted-1")["latitude"] == 12.97
+
+
+def test_batch_goes_through_the_writer(app_module, full_writer):
+    body, status = app_module.accept_batch(json.dumps([upload("refused-batch", receiver_id="gw-a")]))
+    assert status == 503
+    assert app_module.live_state.get("refused-batch") is None
+    # Refused, not remembered: the gateway's retry is not a duplicate
+    full_writer._items.clear()
+    full_writer.start()
+    try:
+        body, status = app_module.accept_batch(json.dumps([upload("refused-batch", receiver_id="gw-a")]))
+    finally:
+        full_writer.stop()
+    assert (status, body["accepted"]) == (200, 1)
+    assert full_writer.written == 1
+
+
+def test_commit_timeout_is_reported_as_queued(app_module, monkeypatch):
+    stalled = IngestWriter()  # never started: nothing gets committed
+    monkeypatch.setattr(app_module, "ingest_writer", stalled)
+    monkeypatch.setattr("ingest.INGEST_ACK_TIMEOUT", 0.05)
+    body, status = app_module.accept_upload(upload("stalled-1", receiver_id="gw-a"), ack="committed")
+    assert (status, body) == (202, {"success": True, "queued": True})
+    assert stalled.depth() == 1
+    assert app_module.live_state.get("stalled-1") is not None
+    # Still queued, so the same packet from another gateway is a copy
+    assert not app_module.ingest_packets([app_module.build_packet(upload("stalled-1", receiver_id="gw-b"))])
@@ -0,0 +1,158 @@
+"""
+Running per-device trip statistics, maintained at ingest time.
+
+Each committed packet updates its device's aggregate in O(1): cumulative
+haversine distance, moving and idle time, max speed and battery drain.
+Aggregates are upserted into `trip_stats` after every write batch and loaded
+back at startup, so /api/stats never has to scan `packets`.
+"""
+import math
+import os
+import threading
+from datetime import datetime
+
+from db import connection
+
+TRIP_MOVING_SPEED = float(os.getenv("TRIP_MOVING_SPEED", "0.3"))  # m/s between fixes counted as moving
+TRIP_MAX_GAP = float(os.getenv("TRIP_MAX_GAP", "300"))  # seconds; longer gaps count as neither moving nor idle
+TRIP_MAX_SPEED = float(os.getenv("TRIP_MAX_SPEED", "50"))  # m/s; faster jumps are GPS glitches, not distance
+EARTH_RADIUS_M = 6371000.0
+
+FIELDS = ("device_id", "packet_count", "first_timestamp", "last_timestamp", "last_latitude", "last_longitude",
+          "distance_m", "moving_seconds", "idle_seconds", "max_speed", "first_battery", "last_battery")
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _seconds(ts):
+    return datetime.fromisoformat(ts).timestamp()
+
+
+def init_trip_stats():
+    with connection() as conn, conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS trip_stats (
+            device_id TEXT PRIMARY KEY,
+            packet_count INTEGER NOT NULL,
+            first_timestamp TEXT,
+            last_timestamp TEXT,
+            last_latitude REAL,
+            last_longitude REAL,
+            distance_m REAL NOT NULL DEFAULT 0,
+            moving_seconds REAL NOT NULL DEFAULT 0,
+            idle_seconds REAL NOT NULL DEFAULT 0,
+            max_speed REAL,
+            first_battery REAL,
+            last_battery REAL
+        );
+        """)
+
+
+class TripStats:
+    def __init__(self):
+        self._stats = {}  # device_id -> dict of FIELDS
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Restore the aggregates; the first start on an existing database rebuilds them once"""
+        with connection() as conn:
+            rows = conn.execute(f"SELECT {', '.join(FIELDS)} FROM trip_stats").fetchall()
+        if not rows:
+            self.rebuild()
+            return
+        with self._lock:
+            self._stats = {r[0]: dict(zip(FIELDS, r)) for r in rows}
+
+    def rebuild(self):
+        """Recompute every device's aggregate from the packets table in one streaming pass"""
+        keys = ("timestamp", "device_id", "latitude", "longitude", "speed", "battery")
+        with self._lock:
+            self._stats = {}
+            with connection() as conn:
+                for r in conn.execute(f"SELECT {', '.join(keys)} FROM packets ORDER BY timestamp, id"):
+                    self._update(dict(zip(keys, r)))
+            rows = [tuple(s[f] for f in FIELDS) for s in self._stats.values()]
+        self._save(rows)
+
+    def _update(self, packet):
+        device_id = packet.get("device_id") or ""
+        ts = packet["timestamp"]
+        lat, lon = packet.get("latitude"), packet.get("longitude")
+        speed, battery = packet.get("speed"), packet.get("battery")
+        s = self._stats.get(device_id)
+        if s is None:
+            self._stats[device_id] = {
+                "device_id": device_id, "packet_count": 1, "first_timestamp": ts, "last_timestamp": ts,
+                "last_latitude": lat, "last_longitude": lon, "distance_m": 0.0, "moving_seconds": 0.0,
+                "idle_seconds": 0.0, "max_speed": speed, "first_battery": battery, "last_battery": battery
+            }
+            return
+        s["packet_count"] += 1
+        if speed is not None and (s["max_speed"] is None or speed > s["max_speed"]):
+            s["max_speed"] = speed
+        if ts <= s["last_timestamp"]:
+            return  # late/backfilled fix: counted, but the track only advances forward in time
+
+        dt = _seconds(ts) - _seconds(s["last_timestamp"])
+        if dt > 0 and None not in (lat, lon, s["last_latitude"], s["last_longitude"]):
+            step = haversine(s["last_latitude"], s["last_longitude"], lat, lon)
+            if step / dt > TRIP_MAX_SPEED:
+                step = 0.0  # position jump: re-anchor at the new fix without counting it
+            s["distance_m"] += step
+            if dt <= TRIP_MAX_GAP:
+                if step / dt >= TRIP_MOVING_SPEED:
+                    s["moving_seconds"] += dt
+                else:
+                    s["idle_seconds"] += dt
+        s["last_timestamp"] = ts
+        s["last_latitude"], s["last_longitude"] = lat, lon
+        if battery is not None:
+            s["last_battery"] = battery
+            if s["first_battery"] is None:
+                s["first_battery"] = battery
+
+    def add(self, packets):
+        """Fold committed packets into the aggregates and persist the touched devices"""
+        with self._lock:
+            for packet in packets:
+                self._update(packet)
+            touched = {p.get("device_id") or "" for p in packets}
+            rows = [tuple(self._stats[d][f] for f in FIELDS) for d in touched]
+        self._save(rows)
+
+    @staticmethod
+    def _save(rows):
+        with connection() as conn, conn:
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO trip_stats ({', '.join(FIELDS)})
+                VALUES ({', '.join('?' * len(FIELDS))})
+            """, rows)
+
+    def get(self, device_id=None, now=None):
+        """Stats for one device (None if unknown) or a dict of all devices, with derived rates"""
+        now = (now or datetime.utcnow()).timestamp()
+        with self._lock:
+            if device_id is not None:
+                s = self._stats.get(device_id)
+                return self._summary(s, now) if s else None
+            return {d: self._summary(s, now) for d, s in self._stats.items()}
+
+    @staticmethod
+    def _summary(s, now):
+        out = dict(s)
+        elapsed = _seconds(s["last_timestamp"]) - _seconds(s["first_timestamp"])
+        moving = s["moving_seconds"]
+        out["elapsed_seconds"] = elapsed
+        out["avg_speed"] = s["distance_m"] / moving if moving else 0.0  # m/s while moving
+        drain = None
+        if s["first_battery"] is not None and s["last_battery"] is not None and elapsed > 0:
+            drain = (s["first_battery"] - s["last_battery"]) / (elapsed / 3600)
+        out["battery_drain_per_hour"] = drain
+        out["seconds_since_last_fix"] = now - _seconds(s["last_timestamp"])
+        return out
@@ -19,6 +19,8 @@ let dataHistory = {
   timestamps: []
 };
 let locationHistory = [];
+let eventSource = null;
+let pollTimer = null;
 
 // ======================== HAVERSINE DISTANCE CALCULATION ========================
 /**
@@ -422,34 +424,37 @@ async function fetchBaseStationLocation() {
     if (!response.ok) throw new Error('Failed to fetch base station location');
     
     const data = await response.json();
-    
-    if (data.latitude && data.longitude) {
-      baseStationLocation = [data.latitude, data.longitude];
-      
-      // Update base station marker
-      if (baseStationMarker) {
-        baseStationMarker.setLatLng(baseStationLocation);
-        baseStationMarker.setPopupContent(
-          `<strong>📡 Base Station</strong><br>
-           ${hardwareMode ? 'Hardware Location' : 'VIT Vellore, SJT'}<br>
-           ${data.latitude.toFixed(6)}°N, ${data.longitude.toFixed(6)}°E`
-        );
-      }
-      
-      // Update base station card
-      document.getElementById('baseCoords').textContent = 
-        `${data.latitude.toFixed(6)}°N, ${data.longitude.toFixed(6)}°E`;
-      
-      if (hardwareMode) {
-        addLog(`📡 Base station updated: ${data.latitude.toFixed(6)}, ${data.longitude.toFixed(6)}`);
-      }
-    }
+    applyBaseStationLocation(data);
   } catch (error) {
     console.error('Error fetching base station location:', error);
     // Keep using default VIT_SJT location
   }
 }
 
+function applyBaseStationLocation(data) {
+  if (data.latitude && data.longitude) {
+    baseStationLocation = [data.latitude, data.longitude];
+    
+    // Update base station marker
+    if (baseStationMarker) {
+      baseStationMarker.setLatLng(baseStationLocation);
+      baseStationMarker.setPopupContent(
+        `<strong>📡 Base Station</strong><br>
+         ${hardwareMode ? 'Hardware Location' : 'VIT Vellore, SJT'}<br>
+         ${data.latitude.toFixed(6)}°N, ${data.longitude.toFixed(6)}°E`
+      );
+    }
+    
+    // Update base station card
+    document.getElementById('baseCoords').textContent = 
+      `${data.latitude.toFixed(6)}°N, ${data.longitude.toFixed(6)}°E`;
+    
+    if (hardwareMode) {
+      addLog(`📡 Base station updated: ${data.latitude.toFixed(6)}, ${data.longitude.toFixed(6)}`);
+    }
+  }
+}
+
 async function fetchData() {
   try {
     let data;
@@ -501,6 +506,47 @@ async function fetchData() {
   }
 }
 
+// ======================== LIVE STREAM ========================
+function startPolling() {
+  if (pollTimer) return;
+  pollTimer = setInterval(fetchData, UPDATE_INTERVAL);
+  fetchData(); // Initial fetch
+}
+
+function connectStream() {
+  // Server pushes one event per real update instead of us polling every interval
+  eventSource = new EventSource(API_BASE + '/stream', { withCredentials: true });
+  const mode = hardwareMode ? 'live' : 'simulated';
+
+  eventSource.addEventListener(hardwareMode ? 'hardware' : 'data', (e) => {
+    const data = JSON.parse(e.data);
+    data.mode = mode;
+    updateConnectionStatus(mode);
+    updateDashboard(data);
+  });
+
+  if (hardwareMode) {
+    eventSource.addEventListener('base_station', (e) => {
+      applyBaseStationLocation(JSON.parse(e.data));
+    });
+  }
+
+  eventSource.onerror = () => {
+    if (eventSource.readyState === EventSource.CLOSED) {
+      // Stream refused (e.g. proxy without SSE support): fall back to polling
+      eventSource = null;
+      addLog('⚠️ Live stream unavailable, falling back to polling');
+      startPolling();
+    } else {
+      // Browser reconnects on its own and resumes from the last event id
+      const statusDot = document.querySelector('.status-dot');
+      const statusText = document.querySelector('.status-text');
+      statusDot.className = 'status-dot offline';
+      statusText.textContent = 'Reconnecting...';
+    }
+  };
+}
+
 // ======================== LOGGING ========================
 function addLog(message) {
   const logs = document.getElementById('logs');
@@ -570,9 +616,12 @@ async function init() {
     addLog(`🔄 Using simulated data for testing`);
   }
   
-  // Start data polling
-  setInterval(fetchData, UPDATE_INTERVAL);
-  fetchData(); // Initial fetch
+  // Start live updates (push stream when supported, polling otherwise)
+  if (typeof EventSource !== 'undefined') {
+    connectStream();
+  } else {
+    startPolling();
+  }
   
   addLog('✅ Dashboard ready');
   showToast(`Dashboard initialized in ${currentSource} mode`, 'success');